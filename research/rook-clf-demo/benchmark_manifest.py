@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Conversion manifest for the benchmark JSON files.
+
+Every converter records what it was built from in benchmarks/manifest.json:
+input content hashes, converter name/version and the conversion parameters.
+On the next run a converter can ask whether its output is still up to date
+and skip the whole source read (decompression, PGN replay, legality checks).
+
+Input hashes are cached by (size, mtime) so an unchanged multi-GB source is
+not re-hashed on every run either.
+
+Usage
+  python benchmark_manifest.py            # show manifest status
+  python benchmark_manifest.py --verify   # re-hash inputs and outputs
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from pathlib import Path
+
+MANIFEST_PATH = Path('benchmarks/manifest.json')
+MANIFEST_VERSION = 1
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def load_manifest(path=MANIFEST_PATH):
+    """Load the manifest, returning an empty one if it does not exist yet."""
+    path = Path(path)
+    if not path.exists():
+        return {"version": MANIFEST_VERSION, "outputs": {}}
+    with open(path, 'r') as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        # Unknown layout: start over rather than trusting stale entries
+        return {"version": MANIFEST_VERSION, "outputs": {}}
+    manifest.setdefault("outputs", {})
+    return manifest
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    """Write the manifest atomically (temp file + rename)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix('.json.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def file_sha256(path):
+    """Streamed sha256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint(path, previous=None):
+    """Return {"path", "size", "mtime_ns", "sha256"} for a file.
+
+    If `previous` describes the same path with identical size and mtime, its
+    hash is reused instead of reading the file again.
+    """
+    path = str(path)
+    stat = os.stat(path)
+    if (previous and previous.get("path") == path
+            and previous.get("size") == stat.st_size
+            and previous.get("mtime_ns") == stat.st_mtime_ns):
+        return dict(previous)
+    return {
+        "path": path,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": file_sha256(path),
+    }
+
+
+def fingerprint_inputs(inputs, entry=None):
+    """Fingerprint all input files, reusing cached hashes from a manifest entry."""
+    previous = {fp["path"]: fp for fp in (entry or {}).get("inputs", [])}
+    return [fingerprint(p, previous.get(str(p))) for p in inputs]
+
+
+def _same_content(a, b):
+    return [fp["sha256"] for fp in a] == [fp["sha256"] for fp in b]
+
+
+def check_output(output, converter, version, inputs, params, manifest=None):
+    """Compare an output against its manifest entry.
+
+    Returns (status, entry, input_fingerprints) where status is one of:
+      "up_to_date" - same converter/version/params/input content, output untouched
+      "inputs_changed" - only the input content changed (append candidates)
+      "stale" - anything else; the output has to be rebuilt from scratch
+    """
+    manifest = manifest if manifest is not None else load_manifest()
+    entry = manifest["outputs"].get(str(output))
+    fingerprints = fingerprint_inputs(inputs, entry)
+
+    if entry is None or not Path(output).exists():
+        return "stale", entry, fingerprints
+    if (entry.get("converter") != converter
+            or entry.get("converter_version") != version
+            or entry.get("params") != params):
+        return "stale", entry, fingerprints
+    if entry.get("output_sha256") != fingerprint(output, entry.get("output")).get("sha256"):
+        # Output was edited or regenerated by something else
+        return "stale", entry, fingerprints
+    if not _same_content(entry.get("inputs", []), fingerprints):
+        return "inputs_changed", entry, fingerprints
+    return "up_to_date", entry, fingerprints
+
+
+def record_output(output, converter, version, input_fingerprints, params, count,
+                  manifest=None, extra=None):
+    """Record a freshly written output in the manifest and save it."""
+    manifest = manifest if manifest is not None else load_manifest()
+    output_fp = fingerprint(output)
+    entry = {
+        "converter": converter,
+        "converter_version": version,
+        "params": params,
+        "inputs": input_fingerprints,
+        "output": output_fp,
+        "output_sha256": output_fp["sha256"],
+        "positions": count,
+    }
+    if extra:
+        entry.update(extra)
+    manifest["outputs"][str(output)] = entry
+    save_manifest(manifest)
+    return entry
+
+
+def load_existing_positions(output):
+    """Positions and puzzle ids already present in an output file.
+
+    Used by append-only sources (Lichess dumps) to skip puzzles that were
+    converted by a previous run.
+    """
+    if not Path(output).exists():
+        return [], set()
+    with open(output, 'r') as f:
+        data = json.load(f)
+    positions = data.get("positions", [])
+    puzzle_ids = {p["metadata"]["puzzle_id"] for p in positions if "puzzle_id" in p.get("metadata", {})}
+    return positions, puzzle_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show benchmark conversion manifest status")
+    parser.add_argument("--manifest", default=str(MANIFEST_PATH), help="Path to manifest.json")
+    parser.add_argument("--verify", action="store_true", help="Re-hash inputs and outputs instead of trusting size/mtime")
+    args = parser.parse_args()
+
+    manifest = load_manifest(args.manifest)
+    if not manifest["outputs"]:
+        print("Manifest is empty - run the converters first")
+        return
+
+    for output, entry in sorted(manifest["outputs"].items()):
+        print(f"{output}: {entry['positions']} positions ({entry['converter']} v{entry['converter_version']})")
+        for fp in entry["inputs"]:
+            if not os.path.exists(fp["path"]):
+                state = "missing"
+            else:
+                current = fingerprint(fp["path"], None if args.verify else fp)
+                state = "ok" if current["sha256"] == fp["sha256"] else "changed"
+            print(f"  input  {fp['path']} [{state}]")
+        if os.path.exists(output):
+            current = fingerprint(output, None if args.verify else entry["output"])
+            state = "ok" if current["sha256"] == entry["output_sha256"] else "modified"
+        else:
+            state = "missing"
+        print(f"  output [{state}]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Stratified sampling of puzzle benchmarks from the full Lichess / ChessBench dumps.
+
+The converters take the first N puzzles in file order, which skews the rating and
+theme distribution. This tool makes a single streaming pass over a full dump and keeps,
+for every stratum (rating bucket x theme x popularity bucket), a bottom-k reservoir of
+puzzles ordered by a hash-derived random key. Memory is bounded by
+strata x --per-stratum rows no matter how large the dump is.
+
+The reservoirs plus the population counts are written to an index file. Any later
+subset (balanced or proportional, any size up to the reservoir capacity) is drawn from
+the index without rescanning: the k smallest keys of a stratum are a uniform sample of
+that stratum, so every prefix of a reservoir is itself a valid sample.
+
+Keys are derived from (seed, puzzle id), so they do not depend on file order and an
+appended dump keeps the keys of existing puzzles.
+
+Usage
+  # One pass over the full dump -> index
+  python benchmark_sampler.py build \
+      --source lichess \
+      --input /path/to/lichess_db_puzzle.csv.zst \
+      --index benchmarks/index/lichess_sampler.json \
+      --strata rating,theme,popularity --per-stratum 200 --min-popularity 50
+
+  # Draw a balanced 1000-puzzle benchmark from the index
+  python benchmark_sampler.py draw \
+      --index benchmarks/index/lichess_sampler.json \
+      --size 1000 --mode balanced \
+      --output benchmarks/lichess_balanced.json
+"""
+
+import argparse
+import contextlib
+import csv
+import hashlib
+import heapq
+import json
+import subprocess
+from collections import Counter
+from pathlib import Path
+
+from convert_lichess import get_difficulty_from_rating, puzzle_eval_positions
+
+INDEX_VERSION = 1
+STRATA_FIELDS = ("rating", "theme", "popularity")
+
+# Theme strata, in priority order: a puzzle is assigned the first theme it has.
+# Lichess themes are unordered tags (length, phase and motifs mixed), so using the
+# first tag in the row would bias towards alphabetical order.
+DEFAULT_THEMES = [
+    "mateIn1", "mateIn2", "mateIn3", "fork", "pin", "skewer", "discoveredAttack",
+    "doubleCheck", "hangingPiece", "trappedPiece", "sacrifice", "deflection",
+    "attraction", "promotion", "zugzwang", "endgame",
+]
+
+# Lichess popularity is in [-100, 100]
+POPULARITY_EDGES = (0, 80, 90)
+
+SOURCES = {
+    "lichess": {
+        "name": "Lichess Puzzle Benchmark (stratified)",
+        "description": "Stratified sample of Lichess.org puzzles, evaluated at model turns",
+        "target_accuracy": 65.0,
+        "citation": "Lichess.org puzzle database",
+        "source_url": "https://database.lichess.org/",
+    },
+    "chessbench": {
+        "name": "ChessBench Puzzles (stratified)",
+        "description": "Stratified sample of ChessBench puzzles, evaluated at every model turn",
+        "target_accuracy": 49.0,
+        "citation": "Ruoss et al. 2024. Grandmaster-level chess without search. arXiv:2402.04494",
+        "source_url": "https://github.com/google-deepmind/searchless_chess",
+    },
+}
+
+
+@contextlib.contextmanager
+def open_source_csv(path):
+    """Yield a csv.DictReader over a plain or .zst-compressed CSV file."""
+    if str(path).endswith('.zst'):
+        proc = subprocess.Popen(['zstd', '-d', '-c', str(path)], stdout=subprocess.PIPE, text=True)
+        try:
+            yield csv.DictReader(proc.stdout)
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+            proc.wait()
+    else:
+        with open(path, 'r') as f:
+            yield csv.DictReader(f)
+
+
+def puzzle_key(seed, puzzle_id):
+    """Deterministic uniform key in [0, 1) for a puzzle."""
+    digest = hashlib.blake2b(f"{seed}:{puzzle_id}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') / 2.0 ** 64
+
+
+def rating_bucket(rating, width=None):
+    """Difficulty category by default, fixed-width rating bucket if `width` is given."""
+    if not width:
+        return get_difficulty_from_rating(rating)
+    low = (rating // width) * width
+    return f"{low}-{low + width - 1}"
+
+
+def popularity_bucket(popularity):
+    if popularity < POPULARITY_EDGES[0]:
+        return "negative"
+    for low, high in zip(POPULARITY_EDGES, POPULARITY_EDGES[1:]):
+        if popularity < high:
+            return f"{low}-{high - 1}"
+    return f"{POPULARITY_EDGES[-1]}+"
+
+
+def theme_bucket(themes, theme_order):
+    tags = set(themes)
+    for theme in theme_order:
+        if theme in tags:
+            return theme
+    return "other"
+
+
+def parse_row(row):
+    """Normalize a Lichess or ChessBench CSV row (ChessBench has no themes/popularity)."""
+    rating = int(row['Rating']) if row.get('Rating', '').isdigit() else 1500
+    popularity = row.get('Popularity', '')
+    return {
+        "puzzle_id": row['PuzzleId'],
+        "fen": row['FEN'],
+        "moves": row['Moves'].split(),
+        "rating": rating,
+        "themes": row.get('Themes', '').split(),
+        "popularity": int(popularity) if popularity.lstrip('-').isdigit() else 0,
+    }
+
+
+def passes_filters(puzzle, args):
+    if len(puzzle["moves"]) < 2:
+        return False
+    if args.min_rating is not None and puzzle["rating"] < args.min_rating:
+        return False
+    if args.max_rating is not None and puzzle["rating"] > args.max_rating:
+        return False
+    if args.min_popularity is not None and puzzle["popularity"] < args.min_popularity:
+        return False
+    if args.require_themes and not set(args.require_themes) <= set(puzzle["themes"]):
+        return False
+    if args.exclude_themes and set(args.exclude_themes) & set(puzzle["themes"]):
+        return False
+    return True
+
+
+def stratum_of(puzzle, strata, theme_order, rating_width):
+    parts = []
+    for field in strata:
+        if field == "rating":
+            parts.append(rating_bucket(puzzle["rating"], rating_width))
+        elif field == "theme":
+            parts.append(theme_bucket(puzzle["themes"], theme_order))
+        elif field == "popularity":
+            parts.append(popularity_bucket(puzzle["popularity"]))
+    return "|".join(parts)
+
+
+def build_index(args):
+    """Single streaming pass: per-stratum bottom-k reservoirs + population counts."""
+    strata = [s for s in args.strata.split(',') if s]
+    unknown = set(strata) - set(STRATA_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown strata fields: {sorted(unknown)} (choose from {STRATA_FIELDS})")
+    theme_order = args.themes.split(',') if args.themes else DEFAULT_THEMES
+
+    # stratum -> max-heap of (-key, row, puzzle) holding the k smallest keys
+    reservoirs = {}
+    population = Counter()
+    rows = filtered = 0
+
+    with open_source_csv(args.input) as reader:
+        for row in reader:
+            rows += 1
+            try:
+                puzzle = parse_row(row)
+            except (KeyError, ValueError):
+                continue
+            if not passes_filters(puzzle, args):
+                continue
+            filtered += 1
+
+            stratum = stratum_of(puzzle, strata, theme_order, args.rating_width)
+            population[stratum] += 1
+            key = puzzle_key(args.seed, puzzle["puzzle_id"])
+            heap = reservoirs.setdefault(stratum, [])
+            # Row number breaks key ties so puzzles themselves are never compared
+            if len(heap) < args.per_stratum:
+                heapq.heappush(heap, (-key, rows, puzzle))
+            elif key < -heap[0][0]:
+                heapq.heapreplace(heap, (-key, rows, puzzle))
+
+            if rows % 500000 == 0:
+                print(f"Scanned {rows} rows, {filtered} pass filters, {len(population)} strata")
+
+    index = {
+        "version": INDEX_VERSION,
+        "source": args.source,
+        "input": str(args.input),
+        "seed": args.seed,
+        "strata_fields": strata,
+        "theme_order": theme_order,
+        "rating_width": args.rating_width,
+        "per_stratum": args.per_stratum,
+        "filters": {
+            "min_rating": args.min_rating,
+            "max_rating": args.max_rating,
+            "min_popularity": args.min_popularity,
+            "require_themes": args.require_themes,
+            "exclude_themes": args.exclude_themes,
+        },
+        "rows_scanned": rows,
+        "rows_matching": filtered,
+        "population": dict(population),
+        "reservoirs": {
+            stratum: [dict(p, key=-neg_key) for neg_key, _, p in sorted(heap, reverse=True)]
+            for stratum, heap in reservoirs.items()
+        },
+    }
+
+    Path(args.index).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.index, 'w') as f:
+        json.dump(index, f)
+
+    print(f"Scanned {rows} rows, {filtered} matched filters")
+    print(f"Index with {len(reservoirs)} strata, {sum(len(h) for h in reservoirs.values())} reservoir puzzles -> {args.index}")
+    return index
+
+
+def allocate(available, population, size, mode):
+    """Split `size` draws over strata.
+
+    balanced: equal share per stratum; strata that run out hand their remainder to the
+    others (water-filling). proportional: share follows the population counts.
+    Never allocates more than a stratum's reservoir holds.
+    """
+    strata = sorted(available)
+    alloc = dict.fromkeys(strata, 0)
+    remaining = min(size, sum(available.values()))
+
+    while remaining > 0:
+        open_strata = [s for s in strata if alloc[s] < available[s]]
+        if mode == "proportional":
+            total = sum(population[s] for s in open_strata)
+            shares = {s: remaining * population[s] / total for s in open_strata}
+        else:
+            shares = {s: remaining / len(open_strata) for s in open_strata}
+
+        granted = 0
+        for s in open_strata:
+            take = min(int(shares[s]), available[s] - alloc[s])
+            alloc[s] += take
+            granted += take
+        if granted == 0:
+            # Fewer draws left than open strata: hand out the rest one by one,
+            # largest fractional share first
+            for s in sorted(open_strata, key=lambda s: shares[s] - int(shares[s]), reverse=True)[:remaining]:
+                alloc[s] += 1
+                granted += 1
+        remaining -= granted
+    return alloc
+
+
+def draw_subset(index, size, mode="balanced", skip=0):
+    """Puzzles for a subset of `size` puzzles from an index.
+
+    `skip` drops the first `skip` puzzles of every reservoir, giving a disjoint subset
+    from the same index (e.g. a held-out set).
+    """
+    reservoirs = {s: rows[skip:] for s, rows in index["reservoirs"].items()}
+    available = {s: len(rows) for s, rows in reservoirs.items()}
+    alloc = allocate(available, index["population"], size, mode)
+    puzzles = []
+    for stratum, count in alloc.items():
+        for puzzle in reservoirs[stratum][:count]:
+            puzzles.append(dict(puzzle, stratum=stratum))
+    # Interleave strata deterministically instead of grouping them
+    puzzles.sort(key=lambda p: p["key"])
+    return puzzles, alloc
+
+
+def puzzles_to_positions(puzzles, source):
+    """Evaluation positions for sampled puzzles (model turns, like the converters)."""
+    positions = []
+    for p in puzzles:
+        puzzle_positions = puzzle_eval_positions(p["puzzle_id"], p["fen"], p["moves"], p["rating"],
+                                                 p["themes"], p["popularity"])
+        for position in puzzle_positions:
+            metadata = position["metadata"]
+            metadata["stratum"] = p["stratum"]
+            if source == "chessbench":
+                metadata["puzzle_type"] = "tactical_sequence"
+                metadata["source"] = "gdm_searchless"
+                del metadata["themes"], metadata["popularity"]
+        positions.extend(puzzle_positions)
+    return positions
+
+
+def draw_benchmark(args):
+    with open(args.index, 'r') as f:
+        index = json.load(f)
+    if index.get("version") != INDEX_VERSION:
+        raise ValueError(f"Unsupported index version {index.get('version')}")
+
+    puzzles, alloc = draw_subset(index, args.size, args.mode, args.skip)
+    if len(puzzles) < args.size:
+        print(f"Warning: index only holds {len(puzzles)} puzzles for this draw (asked for {args.size})")
+    positions = puzzles_to_positions(puzzles, index["source"])
+
+    benchmark_data = dict(SOURCES[index["source"]])
+    benchmark_data.update({
+        "evaluation_methodology": "Evaluates every other move in puzzle sequences (when model is to play)",
+        "sampling": {
+            "mode": args.mode,
+            "seed": index["seed"],
+            "strata_fields": index["strata_fields"],
+            "filters": index["filters"],
+            "puzzles": len(puzzles),
+            "skip": args.skip,
+            "allocation": {s: n for s, n in alloc.items() if n},
+        },
+        "positions": positions,
+    })
+
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(benchmark_data, f, indent=2)
+
+    difficulty = Counter(p["metadata"]["difficulty"] for p in positions)
+    print(f"Drew {len(puzzles)} puzzles ({len(positions)} eval positions) from {sum(1 for n in alloc.values() if n)} strata")
+    print(f"Difficulty distribution: {dict(difficulty)}")
+    print(f"Saved to {args.output}")
+    return len(positions)
+
+
+def show_index(args):
+    with open(args.index, 'r') as f:
+        index = json.load(f)
+    print(f"Source: {index['source']} ({index['input']})")
+    print(f"Rows scanned: {index['rows_scanned']}, matching filters: {index['rows_matching']}")
+    print(f"Strata ({', '.join(index['strata_fields'])}): {len(index['population'])}")
+    for stratum, count in sorted(index["population"].items(), key=lambda x: -x[1]):
+        print(f"  {stratum:40s} population {count:8d}  reservoir {len(index['reservoirs'][stratum]):5d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stratified benchmark sampling from full puzzle dumps")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="Scan a dump once and write a stratified reservoir index")
+    build.add_argument("--source", choices=sorted(SOURCES), default="lichess")
+    build.add_argument("--input", required=True, help="Lichess .csv/.csv.zst or ChessBench puzzles CSV")
+    build.add_argument("--index", required=True, help="Path to write the index JSON")
+    build.add_argument("--strata", default="rating,theme,popularity", help="Comma-separated subset of rating,theme,popularity")
+    build.add_argument("--themes", default=None, help="Comma-separated theme priority list (default: common motifs)")
+    build.add_argument("--rating-width", type=int, default=None, help="Fixed rating bucket width (default: difficulty categories)")
+    build.add_argument("--per-stratum", type=int, default=200, help="Reservoir capacity per stratum")
+    build.add_argument("--seed", type=int, default=0)
+    build.add_argument("--min-rating", type=int, default=None)
+    build.add_argument("--max-rating", type=int, default=None)
+    build.add_argument("--min-popularity", type=int, default=None)
+    build.add_argument("--require-themes", nargs="*", default=None, help="Keep only puzzles tagged with all of these")
+    build.add_argument("--exclude-themes", nargs="*", default=None, help="Drop puzzles tagged with any of these")
+
+    draw = sub.add_parser("draw", help="Draw a benchmark subset from an index (no rescan)")
+    draw.add_argument("--index", required=True)
+    draw.add_argument("--size", type=int, required=True, help="Number of puzzles to draw")
+    draw.add_argument("--mode", choices=["balanced", "proportional"], default="balanced")
+    draw.add_argument("--skip", type=int, default=0, help="Skip the first N puzzles of every stratum (disjoint subsets)")
+    draw.add_argument("--output", required=True, help="Benchmark JSON to write")
+
+    show = sub.add_parser("show", help="Print strata and reservoir fill of an index")
+    show.add_argument("--index", required=True)
+
+    args = parser.parse_args()
+    if args.command == "build":
+        build_index(args)
+    elif args.command == "draw":
+        draw_benchmark(args)
+    else:
+        show_index(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Reproducible inference benchmarks for ROOK-CLF and the ROOK-LM / RookWorld-LM exports.
+
+Each variant is a model kind and an ONNX file, optionally named:
+
+  --variant int8=clf:model/ROOK-CLF-9m-transformersjs/model.quant.onnx
+  --variant fp32=clf:model/ROOK-CLF-9m-transformersjs/model.onnx
+  --variant rookworld:../rookworld-demo/assets/model_rookworld.onnx
+  --variant rook-lm:../rookworld-demo/assets/model_rook.onnx
+
+Prompts are the first --limit FENs of the position files (chess_positions.json and
+benchmarks/*.json), so every run sees the same inputs. Every variant runs in a fresh
+spawned process (its peak RSS is its own) with a fixed thread count, and reports:
+
+  session_create_ms     median InferenceSession creation time
+  peak_rss_mb           peak resident memory of the variant's process
+  clf:  latency_ms      median batch-1 call (IOBindingClassifier)
+        throughput_bN   positions/s at batch size N
+  LMs:  first_token_ms  median prefill + argmax of one prompt (IOBindingDecoder)
+        per_token_ms    median decode step after the prefill
+        throughput_bN   generated tokens/s at batch size N (--new-tokens per row)
+
+Results are written as JSON with environment metadata (platform, CPU, library
+versions, git commit, model hashes, settings). --compare BASELINE CURRENT flags every
+metric that got worse by more than --threshold (relative) and exits with status 1 if
+any did, so two exports, thread counts or machines can be compared run against run.
+
+Usage
+  python benchmark_suite.py --variant clf:model/ROOK-CLF-9m-transformersjs/model.quant.onnx \
+      --variant rookworld:../rookworld-demo/assets/model_rookworld.onnx --output benchmarks/results/run.json
+  python benchmark_suite.py --compare benchmarks/results/base.json benchmarks/results/run.json --threshold 0.1
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmark_manifest import file_sha256
+
+RESULTS_VERSION = 1
+KINDS = ("clf", "rook-lm", "rookworld")
+DEFAULT_POSITIONS = ["chess_positions.json", "benchmarks/lichess_puzzles.json"]
+LM_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "rookworld-demo")
+
+
+def parse_variant(spec):
+    """[name=]kind:path -> dict."""
+    name, _, rest = spec.rpartition("=")
+    kind, _, path = rest.partition(":")
+    if kind not in KINDS or not path:
+        raise argparse.ArgumentTypeError(f"Variant {spec!r} is not [name=]{{{','.join(KINDS)}}}:path")
+    return {"name": name or f"{kind}:{os.path.basename(path)}", "kind": kind, "path": path}
+
+
+def load_fens(paths, limit):
+    """First `limit` FENs of the position files, in order."""
+    fens = []
+    for path in paths:
+        with open(path, "r") as f:
+            data = json.load(f)
+        positions = data["positions"] if isinstance(data, dict) else data
+        fens.extend(p["fen"] for p in positions)
+        if len(fens) >= limit:
+            break
+    return fens[:limit]
+
+
+def session_options(threads):
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = threads
+    options.inter_op_num_threads = 1
+    return options
+
+
+def time_session_create(path, threads, repeats):
+    import onnxruntime as ort
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        ort.InferenceSession(path, sess_options=session_options(threads), providers=["CPUExecutionProvider"])
+        times.append(time.perf_counter() - start)
+    return float(np.median(times) * 1000)
+
+
+def bench_classifier(variant, fens, settings):
+    from fen_encoder import clamp_counters, encode_fens
+    from iobinding_classifier import IOBindingClassifier
+
+    input_ids = encode_fens([clamp_counters(fen) for fen in fens])[0]
+    metrics = {}
+    classifier = IOBindingClassifier(variant["path"], max_batch=1, session_options=session_options(settings["threads"]))
+    classifier.run(input_ids[:1])
+    latencies = []
+    for row in input_ids[:settings["latency_samples"]]:
+        start = time.perf_counter()
+        classifier.run(row[None])
+        latencies.append(time.perf_counter() - start)
+    metrics["latency_ms"] = float(np.median(latencies) * 1000)
+
+    for batch_size in settings["batch_sizes"]:
+        classifier = IOBindingClassifier(variant["path"], max_batch=batch_size,
+                                         session_options=session_options(settings["threads"]))
+        classifier.run(input_ids[:batch_size])
+        runs = []
+        for _ in range(settings["repeats"]):
+            start = time.perf_counter()
+            for offset in range(0, len(input_ids), batch_size):
+                classifier.run(input_ids[offset:offset + batch_size])
+            runs.append(time.perf_counter() - start)
+        metrics[f"throughput_b{batch_size}"] = len(input_ids) / float(np.median(runs))
+    return metrics
+
+
+def bench_lm(variant, fens, settings):
+    sys.path.insert(0, LM_DIR)
+    from iobinding_decoder import IOBindingDecoder
+    from transformers import AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(settings["tokenizer"])
+    prefix = "P: " if variant["kind"] == "rookworld" else ""
+    prompts = [tokenizer(prefix + fen, add_special_tokens=False).input_ids for fen in fens]
+    new_tokens = settings["new_tokens"]
+    max_length = max(len(p) for p in prompts) + new_tokens + 1
+    options = session_options(settings["threads"])
+
+    metrics = {}
+    decoder = IOBindingDecoder(variant["path"], max_length=max_length, session_options=options)
+    decoder.generate([prompts[0]], 2)
+    first, steps = [], []
+    for prompt in prompts[:settings["latency_samples"]]:
+        decoder.reset([prompt])
+        start = time.perf_counter()
+        tokens = decoder.next_tokens(decoder.forward())
+        first.append(time.perf_counter() - start)
+        for _ in range(new_tokens - 1):
+            start = time.perf_counter()
+            decoder.append(tokens)
+            tokens = decoder.next_tokens(decoder.forward())
+            steps.append(time.perf_counter() - start)
+    metrics["first_token_ms"] = float(np.median(first) * 1000)
+    metrics["per_token_ms"] = float(np.median(steps) * 1000) if steps else None
+
+    for batch_size in settings["batch_sizes"]:
+        batch = [prompts[i % len(prompts)] for i in range(batch_size)]
+        decoder = IOBindingDecoder(variant["path"], max_length=max_length, batch_size=batch_size,
+                                   session_options=options)
+        decoder.generate(batch, 2)
+        runs = []
+        for _ in range(settings["repeats"]):
+            start = time.perf_counter()
+            generated = decoder.generate(batch, new_tokens)
+            runs.append(time.perf_counter() - start)
+        metrics[f"throughput_b{batch_size}"] = sum(len(g) for g in generated) / float(np.median(runs))
+    return metrics
+
+
+def run_variant(variant, fens, settings):
+    """Benchmark one variant; runs in its own process."""
+    metrics = {"session_create_ms": time_session_create(variant["path"], settings["threads"],
+                                                        settings["create_repeats"])}
+    if variant["kind"] == "clf":
+        metrics.update(bench_classifier(variant, fens, settings))
+    else:
+        metrics.update(bench_lm(variant, fens, settings))
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    metrics["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20
+    return metrics
+
+
+def environment():
+    import onnxruntime as ort
+
+    cpu = platform.processor()
+    if os.path.exists("/proc/cpuinfo"):
+        with open("/proc/cpuinfo", "r") as f:
+            cpu = next((line.split(":", 1)[1].strip() for line in f if line.startswith("model name")), cpu)
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "onnxruntime": ort.__version__,
+        "providers": ort.get_available_providers(),
+        "cpu": cpu,
+        "cpu_count": os.cpu_count(),
+        "git_commit": commit,
+    }
+
+
+def run_suite(args):
+    variants = args.variant
+    if not variants:
+        variants = [parse_variant(f"clf:{path}") for path in ("model/ROOK-CLF-9m-transformersjs/model.quant.onnx",)
+                    if os.path.exists(path)]
+        for kind, name in (("rook-lm", "model_rook.onnx"), ("rookworld", "model_rookworld.onnx")):
+            path = os.path.join(LM_DIR, "assets", name)
+            if os.path.exists(path):
+                variants.append(parse_variant(f"{kind}:{path}"))
+    if not variants:
+        raise SystemExit("No models found; pass --variant [name=]kind:path")
+
+    fens = load_fens(args.positions, args.limit)
+    settings = {
+        "threads": args.threads,
+        "batch_sizes": args.batch_sizes,
+        "repeats": args.repeats,
+        "create_repeats": args.create_repeats,
+        "latency_samples": args.latency_samples,
+        "new_tokens": args.new_tokens,
+        "tokenizer": args.tokenizer,
+        "positions": args.positions,
+        "limit": len(fens),
+    }
+    print(f"Benchmarking {len(variants)} variant(s) on {len(fens)} positions, {args.threads} thread(s)")
+
+    results = {"version": RESULTS_VERSION, "environment": environment(), "settings": settings, "variants": {}}
+    context = multiprocessing.get_context("spawn")
+    for variant in variants:
+        with context.Pool(1) as pool:
+            metrics = pool.apply(run_variant, (variant, fens, settings))
+        results["variants"][variant["name"]] = {
+            "kind": variant["kind"],
+            "model": os.path.abspath(variant["path"]),
+            "sha256": file_sha256(variant["path"]),
+            "metrics": metrics,
+        }
+        print(f"  {variant['name']}")
+        for metric, value in metrics.items():
+            print(f"    {metric:<18} {value:12.2f}" if value is not None else f"    {metric:<18} {'-':>12}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+def higher_is_better(metric):
+    return metric.startswith("throughput")
+
+
+def compare(baseline_path, current_path, threshold):
+    """Print relative changes per variant/metric; returns the regressions beyond threshold."""
+    with open(baseline_path, "r") as f:
+        baseline = json.load(f)
+    with open(current_path, "r") as f:
+        current = json.load(f)
+    for key in ("cpu", "onnxruntime", "git_commit"):
+        before, after = baseline["environment"].get(key), current["environment"].get(key)
+        if before != after:
+            print(f"Note: {key} differs ({before} -> {after})")
+
+    regressions = []
+    for name, variant in current["variants"].items():
+        if name not in baseline["variants"]:
+            print(f"  {name}: not in baseline")
+            continue
+        if variant["sha256"] != baseline["variants"][name]["sha256"]:
+            print(f"  {name}: model file changed")
+        print(f"  {name}")
+        before_metrics = baseline["variants"][name]["metrics"]
+        for metric, after in variant["metrics"].items():
+            before = before_metrics.get(metric)
+            if before is None or after is None or before == 0:
+                continue
+            change = (after - before) / before
+            worse = -change if higher_is_better(metric) else change
+            flag = "REGRESSION" if worse > threshold else ""
+            print(f"    {metric:<18} {before:12.2f} -> {after:12.2f} {change * 100:+7.1f}% {flag}")
+            if flag:
+                regressions.append((name, metric, before, after))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inference benchmark suite for ROOK-CLF and the LMs")
+    parser.add_argument("--variant", action="append", type=parse_variant, default=[],
+                        help="[name=]kind:path with kind in clf, rook-lm, rookworld (repeatable)")
+    parser.add_argument("--positions", nargs="+", default=DEFAULT_POSITIONS, help="Position files for the prompts")
+    parser.add_argument("--limit", type=int, default=256, help="Number of positions")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 64])
+    parser.add_argument("--threads", type=int, default=1, help="intra_op_num_threads of every session")
+    parser.add_argument("--repeats", type=int, default=3, help="Throughput repetitions (median)")
+    parser.add_argument("--create-repeats", type=int, default=3, help="Session creations to time (median)")
+    parser.add_argument("--latency-samples", type=int, default=32, help="Prompts for the latency metrics")
+    parser.add_argument("--new-tokens", type=int, default=32, help="Generated tokens per LM prompt")
+    parser.add_argument("--tokenizer", default=os.path.join(LM_DIR, "assets"))
+    parser.add_argument("--output", default="benchmarks/results/benchmark.json")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"),
+                        help="Compare two result files instead of running")
+    parser.add_argument("--threshold", type=float, default=0.05,
+                        help="Relative change that counts as a regression (default 0.05)")
+    args = parser.parse_args()
+
+    if args.compare:
+        regressions = compare(*args.compare, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.threshold * 100:.0f}%")
+            sys.exit(1)
+        print("No regressions")
+        return
+    run_suite(args)
+
+
+if __name__ == "__main__":
+    main()
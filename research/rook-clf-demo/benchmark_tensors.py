@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Pre-tokenized tensors for benchmark files.
+
+Every consumer used to re-tokenize each FEN before evaluation. This writes, next to a
+benchmark JSON, a single memory-mappable file with everything an evaluation loop feeds
+to the ONNX sessions:
+
+  clf_input_ids          int32 [N, 78]    ROOK-CLF tokens (77 FEN chars + [CLS], fen_encoder.py)
+  labels                 int32 [N]        ROOK-CLF label id of correct_move (-1 if not a label)
+  rook_lm_prompt_ids     int32 [N, L]     ROOK-LM prompt (raw FEN), right-padded with eos
+  rook_lm_prompt_lengths int32 [N]
+  rookworld_prompt_ids   int32 [N, L]     RookWorld-LM prompt ("P: <fen>"), right-padded
+  rookworld_prompt_lengths int32 [N]
+
+The LM arrays are only written when a GPT-2 tokenizer directory is given.
+
+File layout: 8-byte magic, uint32 header length, JSON header (array names, dtypes,
+shapes, byte offsets, tokenizer/config hashes), then 64-byte aligned raw arrays.
+`load_benchmark_tensors` returns np.memmap views, so evaluation does no per-position
+Python work: slice a batch of rows and pass it to session.run.
+
+Usage
+  python benchmark_tensors.py benchmarks/lichess_puzzles.json \
+      --lm-tokenizer ../rookworld-demo/assets
+  # -> benchmarks/lichess_puzzles.tensors.bin
+"""
+
+import argparse
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+
+from fen_encoder import check_vocab_alignment, encode_fens
+
+MAGIC = b'ROOKTEN1'
+ALIGN = 64
+MODEL_DIR = Path('model/ROOK-CLF-9m-transformersjs')
+
+
+def _sha256(path):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def tensors_path(benchmark_path):
+    """benchmarks/foo.json -> benchmarks/foo.tensors.bin"""
+    benchmark_path = Path(benchmark_path)
+    return benchmark_path.with_name(benchmark_path.stem + '.tensors.bin')
+
+
+def load_label2id(model_dir=MODEL_DIR):
+    with open(Path(model_dir) / 'config.json', 'r') as f:
+        return json.load(f)['label2id']
+
+
+def encode_lm_prompts(prompts, tokenizer):
+    """Right-padded prompt ids and their lengths."""
+    encoded = [tokenizer(p, add_special_tokens=False).input_ids for p in prompts]
+    lengths = np.array([len(e) for e in encoded], dtype=np.int32)
+    ids = np.full((len(prompts), int(lengths.max(initial=1))), tokenizer.eos_token_id, dtype=np.int32)
+    for row, e in enumerate(encoded):
+        ids[row, :len(e)] = e
+    return ids, lengths
+
+
+def write_tensor_file(path, arrays, meta):
+    """Write named arrays plus JSON metadata in the aligned single-file layout."""
+    entries = {}
+    offset = 0
+    for name, array in arrays.items():
+        offset = -(-offset // ALIGN) * ALIGN
+        entries[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += array.nbytes
+    header = json.dumps(dict(meta, arrays=entries)).encode()
+    data_start = -(-(len(MAGIC) + 4 + len(header)) // ALIGN) * ALIGN
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(4, 'little'))
+        f.write(header)
+        for name, array in arrays.items():
+            f.write(b'\0' * (data_start + entries[name]["offset"] - f.tell()))
+            f.write(np.ascontiguousarray(array).tobytes())
+
+
+def load_benchmark_tensors(path):
+    """Return (arrays, header) with arrays as read-only np.memmap views."""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a benchmark tensor file")
+        header_len = int.from_bytes(f.read(4), 'little')
+        header = json.loads(f.read(header_len))
+    data_start = -(-(len(MAGIC) + 4 + header_len) // ALIGN) * ALIGN
+    arrays = {}
+    for name, entry in header["arrays"].items():
+        arrays[name] = np.memmap(path, dtype=np.dtype(entry["dtype"]), mode='r',
+                                 offset=data_start + entry["offset"], shape=tuple(entry["shape"]))
+    return arrays, header
+
+
+def export_benchmark_tensors(benchmark_path, output=None, model_dir=MODEL_DIR, lm_tokenizer=None):
+    """Tokenize a benchmark JSON once and write its tensor file."""
+    with open(benchmark_path, 'r') as f:
+        positions = json.load(f)["positions"]
+    fens = [p["fen"] for p in positions]
+
+    check_vocab_alignment(model_dir)
+    label2id = load_label2id(model_dir)
+    arrays = {
+        "clf_input_ids": encode_fens(fens)[0],
+        "labels": np.array([label2id.get(p["correct_move"], -1) for p in positions], dtype=np.int32),
+    }
+    meta = {
+        "version": 1,
+        "benchmark": str(benchmark_path),
+        "benchmark_sha256": _sha256(benchmark_path),
+        "positions": len(positions),
+        "clf_tokenizer_sha256": _sha256(Path(model_dir) / 'tokenizer.json'),
+        "clf_config_sha256": _sha256(Path(model_dir) / 'config.json'),
+    }
+
+    if lm_tokenizer:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(lm_tokenizer)
+        ids, lengths = encode_lm_prompts(fens, tokenizer)
+        arrays["rook_lm_prompt_ids"], arrays["rook_lm_prompt_lengths"] = ids, lengths
+        ids, lengths = encode_lm_prompts([f"P: {fen}" for fen in fens], tokenizer)
+        arrays["rookworld_prompt_ids"], arrays["rookworld_prompt_lengths"] = ids, lengths
+        meta["lm_tokenizer_sha256"] = _sha256(Path(lm_tokenizer) / 'tokenizer.json')
+        meta["lm_pad_token_id"] = tokenizer.eos_token_id
+
+    output = output or tensors_path(benchmark_path)
+    write_tensor_file(output, arrays, meta)
+    missing = int((arrays["labels"] < 0).sum())
+    print(f"Wrote {len(positions)} tokenized positions ({', '.join(arrays)}) -> {output}"
+          + (f" [{missing} correct moves not in label set]" if missing else ""))
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write pre-tokenized tensors for benchmark JSON files")
+    parser.add_argument("benchmarks", nargs="+", help="Benchmark JSON files")
+    parser.add_argument("--model-dir", default=str(MODEL_DIR), help="ROOK-CLF tokenizer/config directory")
+    parser.add_argument("--lm-tokenizer", default=None, help="GPT-2 tokenizer dir for LM prompts (e.g. ../rookworld-demo/assets)")
+    args = parser.parse_args()
+
+    for path in args.benchmarks:
+        export_benchmark_tensors(path, model_dir=args.model_dir, lm_tokenizer=args.lm_tokenizer)
+
+
+if __name__ == "__main__":
+    main()
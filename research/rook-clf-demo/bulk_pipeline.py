@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Staged producer/consumer pipeline for bulk ROOK-CLF scoring.
+
+Scoring positions one batch at a time runs FEN parsing, encoding, legal-move masks,
+session.run and result formatting back to back in one thread, so the model waits for
+Python work and the other way around. Pipeline runs every stage in its own worker
+threads, connected by bounded queues:
+
+  source -> prepare (encode_fens + legal masks) -> infer (ONNX) -> postprocess -> sink
+
+Each Stage has its own number of workers. Stages with processes=True hand every item to a
+process pool, so Python-heavy work no longer shares the GIL with the inference thread
+(ONNX Runtime and most NumPy kernels release it anyway). The bounded queues keep at most
+queue_size batches in flight between two stages. Batches carry their sequence number,
+so with several workers per stage results may reach the sink out of order.
+
+Pipeline.stats() reports per stage: items, busy time, utilization (busy / (workers x
+wall time)), time spent waiting for input (starved) and blocked on a full output queue
+(backpressure). With --serial the same stage functions run back to back, for comparison.
+
+Usage
+  python bulk_pipeline.py --model model/ROOK-CLF-9m-transformersjs/model.quant.onnx \
+      --benchmark benchmarks/lichess_puzzles.json benchmarks/gdm_searchless.json \
+      --batch-size 256 --prepare-workers 2 --output scores.jsonl
+  python bulk_pipeline.py --benchmark benchmarks/lichess_puzzles.json --serial
+"""
+
+import argparse
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from fen_encoder import MODEL_DIR, clamp_counters, encode_fens
+from legal_masks import LegalMaskGenerator, masked_logits
+
+MODEL_PATH = MODEL_DIR / 'model.quant.onnx'
+_END = object()
+
+
+class Stage:
+    """One pipeline step: fn(item) -> item (None drops it), run by `workers` threads."""
+
+    def __init__(self, name, fn, workers=1, processes=False):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.processes = processes
+        self.items = 0
+        self.busy = 0.0
+        self.starved = 0.0
+        self.blocked = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, busy, starved, blocked):
+        with self._lock:
+            self.items += 1
+            self.busy += busy
+            self.starved += starved
+            self.blocked += blocked
+
+
+class Pipeline:
+    """source iterable -> stages -> sink(item), every stage in its own threads."""
+
+    def __init__(self, source, stages, sink, queue_size=4):
+        self.source = source
+        self.stages = stages
+        self.sink = Stage("sink", sink)
+        self.queue_size = queue_size
+        self.wall = 0.0
+        self.errors = []
+
+    def _worker(self, stage, inbox, outbox, remaining, executor):
+        while True:
+            start = time.perf_counter()
+            item = inbox.get()
+            got = time.perf_counter()
+            if item is _END:
+                inbox.put(_END)  # let the other workers of this stage see it
+                with stage._lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last and outbox is not None:
+                    outbox.put(_END)
+                return
+            try:
+                result = executor.submit(stage.fn, item).result() if executor else stage.fn(item)
+            except Exception as e:  # keep draining so upstream stages do not block forever
+                self.errors.append((stage.name, e))
+                result = None
+            done = time.perf_counter()
+            if result is not None and outbox is not None:
+                outbox.put(result)
+            stage.record(done - got, got - start, time.perf_counter() - done)
+
+    def run(self):
+        stages = self.stages + [self.sink]
+        queues = [queue.Queue(self.queue_size) for _ in stages]
+        executors = [ProcessPoolExecutor(stage.workers) if stage.processes else None for stage in stages]
+        threads = []
+        start = time.perf_counter()
+        for i, stage in enumerate(stages):
+            outbox = queues[i + 1] if i + 1 < len(stages) else None
+            remaining = [stage.workers]
+            for _ in range(stage.workers):
+                thread = threading.Thread(target=self._worker, args=(stage, queues[i], outbox, remaining, executors[i]),
+                                          daemon=True)
+                thread.start()
+                threads.append(thread)
+        source = Stage("source", None)
+        produced = time.perf_counter()
+        for item in self.source:
+            ready = time.perf_counter()
+            queues[0].put(item)
+            source.record(ready - produced, 0.0, time.perf_counter() - ready)
+            produced = time.perf_counter()
+        queues[0].put(_END)
+        for thread in threads:
+            thread.join()
+        self.wall = time.perf_counter() - start
+        for executor in executors:
+            if executor:
+                executor.shutdown()
+        self.stages_run = [source] + stages
+        if self.errors:
+            stage, error = self.errors[0]
+            raise RuntimeError(f"{len(self.errors)} item(s) failed, first in stage {stage!r}") from error
+
+    def stats(self):
+        rows = []
+        for stage in self.stages_run:
+            rows.append({
+                "stage": stage.name,
+                "workers": stage.workers,
+                "items": stage.items,
+                "busy_s": stage.busy,
+                "utilization": stage.busy / (stage.workers * self.wall) if self.wall else 0.0,
+                "starved_s": stage.starved,
+                "blocked_s": stage.blocked,
+            })
+        return rows
+
+    def print_stats(self):
+        print(f"{'stage':<12} {'workers':>7} {'items':>6} {'busy s':>8} {'util':>6} {'starved s':>10} {'blocked s':>10}")
+        for row in self.stats():
+            print(f"{row['stage']:<12} {row['workers']:>7} {row['items']:>6} {row['busy_s']:8.2f} "
+                  f"{row['utilization'] * 100:5.0f}% {row['starved_s']:10.2f} {row['blocked_s']:10.2f}")
+
+
+# Stage functions of the ROOK-CLF scoring pipeline (top level, so they can run in a process pool)
+
+_mask_generator = None
+
+
+def read_batches(paths, batch_size, limit=None):
+    """Source: batches of {"index", "fens", "moves"} from benchmark JSON files."""
+    positions = []
+    for path in paths:
+        with open(path, "r") as f:
+            positions.extend(json.load(f)["positions"])
+    positions = positions[:limit]
+    for index, start in enumerate(range(0, len(positions), batch_size)):
+        chunk = positions[start:start + batch_size]
+        yield {"index": index, "fens": [p["fen"] for p in chunk], "moves": [p.get("correct_move") for p in chunk]}
+
+
+def prepare(batch):
+    """FENs -> input ids and legal masks (move counters clamped to the encoder's fields)."""
+    global _mask_generator
+    if _mask_generator is None:
+        _mask_generator = LegalMaskGenerator()
+    fens = [clamp_counters(fen) for fen in batch["fens"]]
+    batch["input_ids"], batch["valid"] = encode_fens(fens, strict=False)
+    batch["legal"] = _mask_generator.masks(fens, strict=False)
+    return batch
+
+
+class Inference:
+    """Infer stage: one IOBindingClassifier per worker thread; adds top-k label ids and scores."""
+
+    def __init__(self, model_path, max_batch, topk=5):
+        self.model_path = model_path
+        self.max_batch = max_batch
+        self.topk = topk
+        self._local = threading.local()
+
+    def __call__(self, batch):
+        from iobinding_classifier import IOBindingClassifier
+
+        classifier = getattr(self._local, "classifier", None)
+        if classifier is None:
+            classifier = self._local.classifier = IOBindingClassifier(self.model_path, max_batch=self.max_batch)
+        out = classifier.predict(batch.pop("input_ids"), batch["legal"])
+        if classifier.topk:
+            batch["top_ids"], batch["top_scores"] = out[0][:, :self.topk], out[1][:, :self.topk]
+        else:
+            logits = masked_logits(out, batch["legal"])
+            top = np.argpartition(-logits, self.topk - 1, axis=1)[:, :self.topk]
+            order = np.argsort(-np.take_along_axis(logits, top, axis=1), axis=1)
+            batch["top_ids"] = np.take_along_axis(top, order, axis=1)
+            batch["top_scores"] = np.take_along_axis(logits, batch["top_ids"], axis=1)
+        return batch
+
+
+class Postprocess:
+    """Label ids -> UCI moves, one record per position."""
+
+    def __init__(self, id2label):
+        self.id2label = id2label
+
+    def __call__(self, batch):
+        records = []
+        for row, (fen, move) in enumerate(zip(batch["fens"], batch["moves"])):
+            legal = batch["legal"][row]
+            ids = [int(i) for i in batch["top_ids"][row] if legal[i]]
+            moves = [self.id2label[str(i)] for i in ids]
+            records.append({
+                "fen": fen,
+                "valid": bool(batch["valid"][row]),
+                "top_moves": moves,
+                "scores": [round(float(s), 4) for i, s in zip(batch["top_ids"][row], batch["top_scores"][row])
+                           if legal[i]],
+                "correct_move": move,
+                "correct": bool(moves) and moves[0] == move if move else None,
+            })
+        return {"index": batch["index"], "records": records}
+
+
+class Sink:
+    """Collects records (optionally written as JSONL) and accuracy."""
+
+    def __init__(self, output=None):
+        self.file = open(output, "w") if output else None
+        self.positions = 0
+        self.correct = 0
+        self.labelled = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, result):
+        with self._lock:
+            for record in result["records"]:
+                self.positions += 1
+                if record["correct"] is not None:
+                    self.labelled += 1
+                    self.correct += record["correct"]
+                if self.file:
+                    self.file.write(json.dumps(record) + "\n")
+
+    def close(self):
+        if self.file:
+            self.file.close()
+
+
+def run_serial(source, stages, sink):
+    """The same stage functions back to back in one thread."""
+    start = time.perf_counter()
+    for item in source:
+        for stage in stages:
+            item = stage.fn(item)
+        sink(item)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pipelined bulk scoring with ROOK-CLF")
+    parser.add_argument("--model", default=str(MODEL_PATH))
+    parser.add_argument("--benchmark", nargs="+", default=["benchmarks/lichess_puzzles.json"])
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--topk", type=int, default=5)
+    parser.add_argument("--prepare-workers", type=int, default=2)
+    parser.add_argument("--prepare-processes", action="store_true", help="Run prepare in a process pool")
+    parser.add_argument("--infer-workers", type=int, default=1, help="Inference threads (one session each)")
+    parser.add_argument("--post-workers", type=int, default=1)
+    parser.add_argument("--queue-size", type=int, default=4, help="Batches buffered between two stages")
+    parser.add_argument("--output", default=None, help="Write one JSON record per position")
+    parser.add_argument("--serial", action="store_true", help="Run the stages back to back instead")
+    args = parser.parse_args()
+
+    with open(MODEL_DIR / 'config.json', 'r') as f:
+        id2label = json.load(f)["id2label"]
+    stages = [
+        Stage("prepare", prepare, args.prepare_workers, processes=args.prepare_processes),
+        Stage("infer", Inference(args.model, args.batch_size, args.topk), args.infer_workers),
+        Stage("postprocess", Postprocess(id2label), args.post_workers),
+    ]
+    sink = Sink(args.output)
+    source = read_batches(args.benchmark, args.batch_size, args.limit)
+
+    if args.serial:
+        wall = run_serial(source, stages, sink)
+    else:
+        pipeline = Pipeline(source, stages, sink, args.queue_size)
+        pipeline.run()
+        wall = pipeline.wall
+        pipeline.print_stats()
+    sink.close()
+
+    print(f"{sink.positions} positions in {wall:.2f}s ({sink.positions / wall:.0f} positions/s)")
+    if sink.labelled:
+        print(f"Top-1 accuracy: {sink.correct / sink.labelled * 100:.2f}% ({sink.labelled} labelled positions)")
+    if args.output:
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,13 +8,37 @@ import csv
 import chess
 import chess.pgn
 import io
+import argparse
+import subprocess
 from pathlib import Path
 
-def convert_bigbench_checkmate():
+from benchmark_manifest import check_output, record_output, load_existing_positions
+from position_index import update_position_index
+
+DATA_DIR = '/home/jrahn/dev/public/rook/src/data'
+BIGBENCH_JSON = f'{DATA_DIR}/checkmate.json'
+SEARCHLESS_CSV = f'{DATA_DIR}/searchless_puzzles.csv'
+LICHESS_ZST = f'{DATA_DIR}/lichess_db_puzzle.csv.zst'
+CONVERTER_VERSION = 2
+
+def skip_if_up_to_date(output, converter, inputs, params, force):
+    """Return (skip, status, input_fingerprints) for a converter run."""
+    status, _, input_fps = check_output(output, converter, CONVERTER_VERSION, inputs, params)
+    if status == "up_to_date" and not force:
+        print(f"{output} is up to date, skipping (use --force to rebuild)")
+        return True, status, input_fps
+    return False, status, input_fps
+
+def convert_bigbench_checkmate(force=False):
     """Convert Big-Bench checkmate data to our format."""
     
+    output = 'benchmarks/bigbench_checkmate.json'
+    skip, _, input_fps = skip_if_up_to_date(output, "bigbench_checkmate", [BIGBENCH_JSON], {}, force)
+    if skip:
+        return None
+    
     # Load the Big-Bench data
-    with open('/home/jrahn/dev/public/rook/src/data/checkmate.json', 'r') as f:
+    with open(BIGBENCH_JSON, 'r') as f:
         data = json.load(f)
     
     positions = []
@@ -60,19 +84,26 @@ def convert_bigbench_checkmate():
     }
     
     # Save to our benchmark directory
-    with open('benchmarks/bigbench_checkmate.json', 'w') as f:
+    with open(output, 'w') as f:
         json.dump(benchmark_data, f, indent=2)
+    record_output(output, "bigbench_checkmate", CONVERTER_VERSION, input_fps, {}, len(positions))
     
     print(f"Converted {len(positions)} Big-Bench checkmate positions")
     return len(positions)
 
-def convert_gdm_puzzles():
+def convert_gdm_puzzles(force=False):
     """Convert ChessBench (Google DeepMind) puzzles to our format."""
     
+    output = 'benchmarks/gdm_searchless.json'
+    params = {"position_limit": 1000}
+    skip, _, input_fps = skip_if_up_to_date(output, "gdm_puzzles", [SEARCHLESS_CSV], params, force)
+    if skip:
+        return None
+    
     positions = []
     
     # Read the CSV file
-    with open('/home/jrahn/dev/public/rook/src/data/searchless_puzzles.csv', 'r') as f:
+    with open(SEARCHLESS_CSV, 'r') as f:
         reader = csv.DictReader(f)
         
         for i, row in enumerate(reader):
@@ -125,89 +156,94 @@ def convert_gdm_puzzles():
     }
     
     # Save to our benchmark directory
-    with open('benchmarks/gdm_searchless.json', 'w') as f:
+    with open(output, 'w') as f:
         json.dump(benchmark_data, f, indent=2)
+    record_output(output, "gdm_puzzles", CONVERTER_VERSION, input_fps, params, len(positions))
     
     print(f"Converted {len(positions)} ChessBench positions")
     return len(positions)
 
-def convert_lichess_puzzles():
-    """Convert Lichess puzzle data to our format."""
+def convert_lichess_puzzles(force=False):
+    """Convert Lichess puzzle data to our format.
+    
+    The Lichess dump is append-only: when only the input changed, puzzles that are
+    already in the output are kept and their rows skipped without re-validation.
+    """
     
-    import subprocess
-    import tempfile
-    import os
+    output = 'benchmarks/lichess_puzzles.json'
+    params = {"position_limit": 1000}
+    skip, status, input_fps = skip_if_up_to_date(output, "lichess_puzzles", [LICHESS_ZST], params, force)
+    if skip:
+        return None
     
     positions = []
+    known_puzzles = set()
+    if status == "inputs_changed" and not force:
+        positions, known_puzzles = load_existing_positions(output)
+        print(f"Input changed, keeping {len(positions)} known positions")
     
-    # Decompress the zst file to a temporary file
-    print("Decompressing Lichess puzzle data...")
-    with tempfile.NamedTemporaryFile(mode='w+', suffix='.csv', delete=False) as temp_file:
-        temp_filename = temp_file.name
+    # Stream-decompress the zst file; we stop reading after the first 1000 positions
+    print("Streaming Lichess puzzle data...")
+    proc = subprocess.Popen(['zstd', '-d', '-c', LICHESS_ZST], stdout=subprocess.PIPE, text=True)
     
     try:
-        # Decompress using zstd
-        subprocess.run([
-            'zstd', '-d', '-f', '/home/jrahn/dev/public/rook/src/data/lichess_db_puzzle.csv.zst', 
-            '-o', temp_filename
-        ], check=True)
+        reader = csv.DictReader(proc.stdout)
         
-        print("Reading decompressed Lichess data...")
-        with open(temp_filename, 'r') as f:
-            reader = csv.DictReader(f)
+        for i, row in enumerate(reader):
+            # Limit to first 1000 for demo performance
+            if len(positions) >= 1000:
+                break
             
-            for i, row in enumerate(reader):
-                try:
-                    # Lichess format: PuzzleId,FEN,Moves,Rating,RatingDeviation,Popularity,NbPlays,Themes,GameUrl,OpeningTags
-                    fen = row['FEN']
-                    moves = row['Moves'].split()
-                    
-                    # First move is the correct solution
-                    if moves:
-                        correct_move = moves[0]
-                        
-                        # Validate the position and move
-                        board = chess.Board(fen)
-                        try:
-                            move = chess.Move.from_uci(correct_move)
-                            if move in board.legal_moves:
-                                rating = int(row['Rating']) if row['Rating'].isdigit() else 1500
-                                themes = row.get('Themes', '').split()
-                                
-                                position = {
-                                    "fen": fen,
-                                    "correct_move": correct_move,
-                                    "metadata": {
-                                        "puzzle_id": row['PuzzleId'],
-                                        "rating": rating,
-                                        "puzzle_type": "lichess_puzzle",
-                                        "difficulty": get_difficulty_from_rating(rating),
-                                        "source": "lichess",
-                                        "themes": themes[:3],  # Limit themes for size
-                                        "popularity": int(row.get('Popularity', 0)) if row.get('Popularity', '').isdigit() else 0
-                                    }
-                                }
-                                positions.append(position)
-                        except:
-                            continue
-                            
-                except Exception as e:
-                    if i < 10:  # Only print first few errors
-                        print(f"Error processing row {i}: {e}")
+            try:
+                # Lichess format: PuzzleId,FEN,Moves,Rating,RatingDeviation,Popularity,NbPlays,Themes,GameUrl,OpeningTags
+                if row['PuzzleId'] in known_puzzles:
                     continue
+                fen = row['FEN']
+                moves = row['Moves'].split()
                 
-                # Limit to first 1000 for demo performance
-                if len(positions) >= 1000:
-                    break
-                
-                # Progress indicator
-                if i % 10000 == 0:
-                    print(f"Processed {i} rows, found {len(positions)} valid positions")
+                # First move is the correct solution
+                if moves:
+                    correct_move = moves[0]
+                    
+                    # Validate the position and move
+                    board = chess.Board(fen)
+                    try:
+                        move = chess.Move.from_uci(correct_move)
+                        if move in board.legal_moves:
+                            rating = int(row['Rating']) if row['Rating'].isdigit() else 1500
+                            themes = row.get('Themes', '').split()
+                            
+                            position = {
+                                "fen": fen,
+                                "correct_move": correct_move,
+                                "metadata": {
+                                    "puzzle_id": row['PuzzleId'],
+                                    "rating": rating,
+                                    "puzzle_type": "lichess_puzzle",
+                                    "difficulty": get_difficulty_from_rating(rating),
+                                    "source": "lichess",
+                                    "themes": themes[:3],  # Limit themes for size
+                                    "popularity": int(row.get('Popularity', 0)) if row.get('Popularity', '').isdigit() else 0
+                                }
+                            }
+                            positions.append(position)
+                    except:
+                        continue
+                        
+            except Exception as e:
+                if i < 10:  # Only print first few errors
+                    print(f"Error processing row {i}: {e}")
+                continue
+            
+            # Progress indicator
+            if i % 10000 == 0:
+                print(f"Processed {i} rows, found {len(positions)} valid positions")
     
     finally:
-        # Clean up temp file
-        if os.path.exists(temp_filename):
-            os.unlink(temp_filename)
+        # Stop the decompressor if we broke out early
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
     
     # Create the benchmark file
     benchmark_data = {
@@ -220,8 +256,9 @@ def convert_lichess_puzzles():
     }
     
     # Save to our benchmark directory
-    with open('benchmarks/lichess_puzzles.json', 'w') as f:
+    with open(output, 'w') as f:
         json.dump(benchmark_data, f, indent=2)
+    record_output(output, "lichess_puzzles", CONVERTER_VERSION, input_fps, params, len(positions))
     
     print(f"Converted {len(positions)} Lichess puzzle positions")
     return len(positions)
@@ -240,23 +277,38 @@ def get_difficulty_from_rating(rating):
         return "expert"
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert benchmark data to the demo JSON format")
+    parser.add_argument("--force", action="store_true", help="Rebuild outputs even if benchmarks/manifest.json says they are up to date")
+    parser.add_argument("--tensors", action="store_true", help="Also write pre-tokenized tensors next to the JSON (see benchmark_tensors.py)")
+    parser.add_argument("--lm-tokenizer", default=None, help="GPT-2 tokenizer dir for LM prompt tensors (e.g. ../rookworld-demo/assets)")
+    args = parser.parse_args()
+    
     print("Converting benchmark data...")
     
     # Ensure benchmark directory exists
     Path('benchmarks').mkdir(exist_ok=True)
     
-    # Convert all three benchmarks
+    # Convert all three benchmarks (None = skipped, output up to date)
     print("\n1. Converting Big-Bench Checkmate data...")
-    bigbench_count = convert_bigbench_checkmate()
+    bigbench_count = convert_bigbench_checkmate(force=args.force)
     
     print("\n2. Converting ChessBench data...")
-    gdm_count = convert_gdm_puzzles()
+    gdm_count = convert_gdm_puzzles(force=args.force)
     
     print("\n3. Converting Lichess Puzzle data...")
-    lichess_count = convert_lichess_puzzles()
+    lichess_count = convert_lichess_puzzles(force=args.force)
     
+    counts = {"Big-Bench Checkmate": bigbench_count, "ChessBench": gdm_count, "Lichess Puzzles": lichess_count}
     print(f"\nConversion complete:")
-    print(f"- Big-Bench Checkmate: {bigbench_count} positions")
-    print(f"- ChessBench: {gdm_count} positions")
-    print(f"- Lichess Puzzles: {lichess_count} positions")
-    print(f"\nTotal: {bigbench_count + gdm_count + lichess_count} benchmark positions")
+    for name, count in counts.items():
+        print(f"- {name}: {'up to date' if count is None else f'{count} positions'}")
+    print(f"\nTotal converted: {sum(c for c in counts.values() if c)} benchmark positions")
+    
+    # Keep the cross-benchmark position index in sync with the JSON files
+    if any(counts.values()):
+        update_position_index()
+    
+    if args.tensors:
+        from benchmark_tensors import export_benchmark_tensors
+        for output in ['benchmarks/bigbench_checkmate.json', 'benchmarks/gdm_searchless.json', 'benchmarks/lichess_puzzles.json']:
+            export_benchmark_tensors(output, lm_tokenizer=args.lm_tokenizer)
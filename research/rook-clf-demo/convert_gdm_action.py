@@ -7,14 +7,28 @@ This creates simple FEN → move pairs, not puzzle sequences.
 import json
 import csv
 import chess
+import argparse
 from pathlib import Path
 
-def convert_gdm_action():
+from benchmark_manifest import check_output, record_output
+from position_index import update_position_index
+
+SEARCHLESS_CSV = '/home/jrahn/dev/public/rook/src/data/searchless_puzzles.csv'
+OUTPUT_PATH = 'benchmarks/gdm_action.json'
+CONVERTER_VERSION = 1
+
+def convert_gdm_action(force=False):
     """Convert ChessBench puzzles to simple action format: FEN + single best move."""
     
+    params = {"position_limit": 1000}
+    status, _, input_fps = check_output(OUTPUT_PATH, "convert_gdm_action", CONVERTER_VERSION, [SEARCHLESS_CSV], params)
+    if status == "up_to_date" and not force:
+        print(f"{OUTPUT_PATH} is up to date, skipping (use --force to rebuild)")
+        return None
+    
     positions = []
     
-    with open('/home/jrahn/dev/public/rook/src/data/searchless_puzzles.csv', 'r') as f:
+    with open(SEARCHLESS_CSV, 'r') as f:
         reader = csv.DictReader(f)
         
         for i, row in enumerate(reader):
@@ -74,8 +88,9 @@ def convert_gdm_action():
     
     # Save to our benchmark directory
     Path('benchmarks').mkdir(exist_ok=True)
-    with open('benchmarks/gdm_action.json', 'w') as f:
+    with open(OUTPUT_PATH, 'w') as f:
         json.dump(benchmark_data, f, indent=2)
+    record_output(OUTPUT_PATH, "convert_gdm_action", CONVERTER_VERSION, input_fps, params, len(positions))
     
     print(f"Converted {len(positions)} ChessBench action accuracy positions")
     return len(positions)
@@ -94,4 +109,13 @@ def get_difficulty_from_rating(rating):
         return "expert"
 
 if __name__ == "__main__":
-    convert_gdm_action()
+    parser = argparse.ArgumentParser(description="Convert ChessBench puzzles to benchmarks/gdm_action.json")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the manifest says the output is up to date")
+    parser.add_argument("--tensors", action="store_true", help="Also write pre-tokenized tensors next to the JSON (see benchmark_tensors.py)")
+    parser.add_argument("--lm-tokenizer", default=None, help="GPT-2 tokenizer dir for LM prompt tensors (e.g. ../rookworld-demo/assets)")
+    args = parser.parse_args()
+    if convert_gdm_action(force=args.force):
+        update_position_index()
+    if args.tensors:
+        from benchmark_tensors import export_benchmark_tensors
+        export_benchmark_tensors(OUTPUT_PATH, lm_tokenizer=args.lm_tokenizer)
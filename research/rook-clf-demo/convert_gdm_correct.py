@@ -10,8 +10,16 @@ import csv
 import chess
 import chess.pgn
 import io
+import argparse
 from pathlib import Path
 
+from benchmark_manifest import check_output, record_output
+from position_index import update_position_index
+
+SEARCHLESS_CSV = '/home/jrahn/dev/public/rook/src/data/searchless_puzzles.csv'
+OUTPUT_PATH = 'benchmarks/gdm_searchless.json'
+CONVERTER_VERSION = 1
+
 def process_fen_rook_style(fen):
     """Match the exact FEN processing from the research code."""
     position, turn, castling, en_passant, halfmove, fullmove = fen.split(" ")
@@ -35,13 +43,19 @@ def process_fen_rook_style(fen):
     
     return "".join([position, turn, castling, en_passant, halfmove, fullmove])
 
-def convert_gdm_puzzles_correct():
+def convert_gdm_puzzles_correct(force=False):
     """Convert ChessBench puzzles following the research evaluation methodology."""
     
+    params = {"puzzle_limit": 1000}
+    status, _, input_fps = check_output(OUTPUT_PATH, "convert_gdm_correct", CONVERTER_VERSION, [SEARCHLESS_CSV], params)
+    if status == "up_to_date" and not force:
+        print(f"{OUTPUT_PATH} is up to date, skipping (use --force to rebuild)")
+        return None
+    
     positions = []
     seen_puzzles = set()
     
-    with open('/home/jrahn/dev/public/rook/src/data/searchless_puzzles.csv', 'r') as f:
+    with open(SEARCHLESS_CSV, 'r') as f:
         reader = csv.DictReader(f)
         
         for i, row in enumerate(reader):
@@ -134,8 +148,9 @@ def convert_gdm_puzzles_correct():
     
     # Save to our benchmark directory
     Path('benchmarks').mkdir(exist_ok=True)
-    with open('benchmarks/gdm_searchless.json', 'w') as f:
+    with open(OUTPUT_PATH, 'w') as f:
         json.dump(benchmark_data, f, indent=2)
+    record_output(OUTPUT_PATH, "convert_gdm_correct", CONVERTER_VERSION, input_fps, params, len(positions))
     
     print(f"Converted {len(positions)} ChessBench evaluation positions across {len(seen_puzzles)} puzzles using research methodology")
     return len(positions)
@@ -154,4 +169,13 @@ def get_difficulty_from_rating(rating):
         return "expert"
 
 if __name__ == "__main__":
-    convert_gdm_puzzles_correct()
+    parser = argparse.ArgumentParser(description="Convert ChessBench puzzles to benchmarks/gdm_searchless.json")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the manifest says the output is up to date")
+    parser.add_argument("--tensors", action="store_true", help="Also write pre-tokenized tensors next to the JSON (see benchmark_tensors.py)")
+    parser.add_argument("--lm-tokenizer", default=None, help="GPT-2 tokenizer dir for LM prompt tensors (e.g. ../rookworld-demo/assets)")
+    args = parser.parse_args()
+    if convert_gdm_puzzles_correct(force=args.force):
+        update_position_index()
+    if args.tensors:
+        from benchmark_tensors import export_benchmark_tensors
+        export_benchmark_tensors(OUTPUT_PATH, lm_tokenizer=args.lm_tokenizer)
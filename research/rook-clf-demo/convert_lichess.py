@@ -6,11 +6,17 @@ try:
     HAVE_CHESS = True
 except Exception:
     HAVE_CHESS = False
+import argparse
 import subprocess
-import tempfile
-import os
 from pathlib import Path
 
+from benchmark_manifest import check_output, record_output, load_existing_positions
+
+LICHESS_ZST = '/home/jrahn/dev/public/rook/src/data/lichess_db_puzzle.csv.zst'
+OUTPUT_PATH = 'benchmarks/lichess_puzzles.json'
+CONVERTER_VERSION = 2
+PUZZLE_LIMIT = 1000
+
 def get_difficulty_from_rating(rating):
     """Convert chess puzzle rating to difficulty category."""
     if rating < 1000:
@@ -24,14 +30,69 @@ def get_difficulty_from_rating(rating):
     else:
         return "expert"
 
-def convert_lichess_puzzles():
+def puzzle_eval_positions(puzzle_id, fen, moves, rating, themes, popularity):
+    """Evaluation positions of one Lichess puzzle at model turns (i % 2 == 1).
+    Requires python-chess. Returns an empty list for broken puzzles.
+    """
+    positions = []
+    try:
+        board = chess.Board(fen)
+        for idx, mv in enumerate(moves):
+            # CORRECTED: Use same logic as rook code puzzle evaluation
+            # Evaluate at i % 2 == 1 (matches rook eval.py line 83)
+            if idx % 2 == 1:
+                try:
+                    move_obj = chess.Move.from_uci(mv)
+                    if move_obj in board.legal_moves:
+                        positions.append({
+                            "fen": board.fen(),
+                            "correct_move": mv,
+                            "metadata": {
+                                "puzzle_id": puzzle_id,
+                                "rating": rating,
+                                "puzzle_type": "lichess_puzzle",
+                                "difficulty": get_difficulty_from_rating(rating),
+                                "source": "lichess",
+                                "themes": themes[:3],
+                                "popularity": popularity,
+                                "solution_sequence": moves,
+                                "move_index_in_sequence": idx,
+                                "total_moves_in_sequence": len(moves)
+                            }
+                        })
+                except Exception:
+                    pass
+            # advance position
+            try:
+                board.push(chess.Move.from_uci(mv))
+            except Exception:
+                break
+    except Exception:
+        return []
+    return positions
+
+def convert_lichess_puzzles(force=False):
     """Convert Lichess puzzle data to our format with sequential evaluation.
     Emits evaluation positions at model turns (i % 2 == 1), like the GDM benchmark
     and the rook reference evaluation.
+
+    Skipped when benchmarks/manifest.json shows the output is up to date. The dump is
+    append-only, so if only the input changed, puzzles already in the output are kept
+    and their rows are skipped without re-validation.
     """
 
+    params = {"puzzle_limit": PUZZLE_LIMIT, "have_chess": HAVE_CHESS}
+    status, _, input_fps = check_output(OUTPUT_PATH, "convert_lichess", CONVERTER_VERSION, [LICHESS_ZST], params)
+    if status == "up_to_date" and not force:
+        print(f"{OUTPUT_PATH} is up to date, skipping (use --force to rebuild)")
+        return None
+
     positions = []
     seen_puzzles = set()
+    if status == "inputs_changed" and not force:
+        positions, seen_puzzles = load_existing_positions(OUTPUT_PATH)
+        print(f"Input changed, keeping {len(positions)} positions from {len(seen_puzzles)} known puzzles")
+    known_puzzles = set(seen_puzzles)
 
     def is_plausible_uci(mv: str) -> bool:
         if not mv or len(mv) not in (4, 5):
@@ -44,115 +105,77 @@ def convert_lichess_puzzles():
         promos = set('nbrq')
         return (frm[0] in files and frm[1] in ranks and to[0] in files and to[1] in ranks and (promo == '' or promo in promos))
 
-    # Decompress the zst file to a temporary file
-    print("Decompressing Lichess puzzle data (this may take a while)...")
-    with tempfile.NamedTemporaryFile(mode='w+', suffix='.csv', delete=False) as temp_file:
-        temp_filename = temp_file.name
+    # Stream-decompress instead of writing the full CSV to a temp file:
+    # we stop after the first PUZZLE_LIMIT puzzles anyway.
+    print("Streaming Lichess puzzle data...")
+    proc = subprocess.Popen(['zstd', '-d', '-c', LICHESS_ZST], stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, text=True)
 
     try:
-        # Decompress using zstd with force flag
-        result = subprocess.run([
-            'zstd', '-d', '-f', '/home/jrahn/dev/public/rook/src/data/lichess_db_puzzle.csv.zst',
-            '-o', temp_filename
-        ], capture_output=True, text=True)
-
-        if result.returncode != 0:
-            print(f"zstd error: {result.stderr}")
-            return 0
+        reader = csv.DictReader(proc.stdout)
 
-        print("Reading decompressed Lichess data...")
-        with open(temp_filename, 'r') as f:
-            reader = csv.DictReader(f)
+        for i, row in enumerate(reader):
+            if len(seen_puzzles) >= PUZZLE_LIMIT:
+                break
 
-            for i, row in enumerate(reader):
-                try:
-                    # Lichess format: PuzzleId,FEN,Moves,Rating,RatingDeviation,Popularity,NbPlays,Themes,GameUrl,OpeningTags
-                    fen = row['FEN']
-                    moves = row['Moves'].split()
-                    if not moves:
-                        continue
-
-                    rating = int(row['Rating']) if row['Rating'].isdigit() else 1500
-                    themes = row.get('Themes', '').split()
-                    popularity = int(row.get('Popularity', 0)) if row.get('Popularity', '').isdigit() else 0
-                    puzzle_id = row['PuzzleId']
-
-                    # Sequential evaluation at model turns
-                    if HAVE_CHESS:
-                        try:
-                            board = chess.Board(fen)
-                            puzzle_positions = []
-                            for idx, mv in enumerate(moves):
-                                # CORRECTED: Use same logic as rook code puzzle evaluation
-                                # Evaluate at i % 2 == 1 (matches rook eval.py line 83)
-                                if idx % 2 == 1:
-                                    try:
-                                        move_obj = chess.Move.from_uci(mv)
-                                        if move_obj in board.legal_moves:
-                                            puzzle_positions.append({
-                                                "fen": board.fen(),
-                                                "correct_move": mv,
-                                                "metadata": {
-                                                    "puzzle_id": puzzle_id,
-                                                    "rating": rating,
-                                                    "puzzle_type": "lichess_puzzle",
-                                                    "difficulty": get_difficulty_from_rating(rating),
-                                                    "source": "lichess",
-                                                    "themes": themes[:3],
-                                                    "popularity": popularity,
-                                                    "solution_sequence": moves,
-                                                    "move_index_in_sequence": idx,
-                                                    "total_moves_in_sequence": len(moves)
-                                                }
-                                            })
-                                    except Exception:
-                                        pass
-                                # advance position
-                                try:
-                                    board.push(chess.Move.from_uci(mv))
-                                except Exception:
-                                    break
-                            if puzzle_positions:
-                                positions.extend(puzzle_positions)
-                                seen_puzzles.add(puzzle_id)
-                        except Exception:
-                            pass
-                    else:
-                        # Fallback: without python-chess, emit only first-move positions (best-effort)
-                        first_move = moves[0]
-                        if is_plausible_uci(first_move):
-                            positions.append({
-                                "fen": fen,
-                                "correct_move": first_move,
-                                "metadata": {
-                                    "puzzle_id": puzzle_id,
-                                    "rating": rating,
-                                    "puzzle_type": "lichess_puzzle",
-                                    "difficulty": get_difficulty_from_rating(rating),
-                                    "source": "lichess",
-                                    "themes": themes[:3],
-                                    "popularity": popularity
-                                }
-                            })
-                            seen_puzzles.add(puzzle_id)
-
-                except Exception as e:
-                    if i < 10:  # Only print first few errors
-                        print(f"Error processing row {i}: {e}")
+            try:
+                # Lichess format: PuzzleId,FEN,Moves,Rating,RatingDeviation,Popularity,NbPlays,Themes,GameUrl,OpeningTags
+                puzzle_id = row['PuzzleId']
+                if puzzle_id in known_puzzles:
                     continue
 
-                # Limit to first 1000 puzzles for demo performance
-                if len(seen_puzzles) >= 1000:
-                    break
+                fen = row['FEN']
+                moves = row['Moves'].split()
+                if not moves:
+                    continue
 
-                # Progress indicator
-                if i % 50000 == 0:
-                    print(f"Processed {i} rows, found {len(positions)} eval positions")
+                rating = int(row['Rating']) if row['Rating'].isdigit() else 1500
+                themes = row.get('Themes', '').split()
+                popularity = int(row.get('Popularity', 0)) if row.get('Popularity', '').isdigit() else 0
+
+                # Sequential evaluation at model turns
+                if HAVE_CHESS:
+                    puzzle_positions = puzzle_eval_positions(puzzle_id, fen, moves, rating, themes, popularity)
+                    if puzzle_positions:
+                        positions.extend(puzzle_positions)
+                        seen_puzzles.add(puzzle_id)
+                else:
+                    # Fallback: without python-chess, emit only first-move positions (best-effort)
+                    first_move = moves[0]
+                    if is_plausible_uci(first_move):
+                        positions.append({
+                            "fen": fen,
+                            "correct_move": first_move,
+                            "metadata": {
+                                "puzzle_id": puzzle_id,
+                                "rating": rating,
+                                "puzzle_type": "lichess_puzzle",
+                                "difficulty": get_difficulty_from_rating(rating),
+                                "source": "lichess",
+                                "themes": themes[:3],
+                                "popularity": popularity
+                            }
+                        })
+                        seen_puzzles.add(puzzle_id)
+
+            except Exception as e:
+                if i < 10:  # Only print first few errors
+                    print(f"Error processing row {i}: {e}")
+                continue
+
+            # Progress indicator
+            if i % 50000 == 0:
+                print(f"Processed {i} rows, found {len(positions)} eval positions")
 
     finally:
-        # Clean up temp file
-        if os.path.exists(temp_filename):
-            os.unlink(temp_filename)
+        # Stop the decompressor early if we broke out of the loop
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+
+    if proc.returncode not in (0, -9) and not positions:
+        print(f"zstd error: {proc.stderr.read()}")
+        return 0
 
     # Create the benchmark file
     benchmark_data = {
@@ -166,11 +189,23 @@ def convert_lichess_puzzles():
 
     # Save to our benchmark directory
     Path('benchmarks').mkdir(exist_ok=True)
-    with open('benchmarks/lichess_puzzles.json', 'w') as f:
+    with open(OUTPUT_PATH, 'w') as f:
         json.dump(benchmark_data, f, indent=2)
+    record_output(OUTPUT_PATH, "convert_lichess", CONVERTER_VERSION, input_fps, params, len(positions))
 
     print(f"Converted {len(positions)} Lichess evaluation positions across {len(seen_puzzles)} puzzles")
     return len(positions)
 
 if __name__ == "__main__":
-    convert_lichess_puzzles()
+    parser = argparse.ArgumentParser(description="Convert Lichess puzzles to benchmarks/lichess_puzzles.json")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the manifest says the output is up to date")
+    parser.add_argument("--tensors", action="store_true", help="Also write pre-tokenized tensors next to the JSON (see benchmark_tensors.py)")
+    parser.add_argument("--lm-tokenizer", default=None, help="GPT-2 tokenizer dir for LM prompt tensors (e.g. ../rookworld-demo/assets)")
+    args = parser.parse_args()
+    count = convert_lichess_puzzles(force=args.force)
+    if count and HAVE_CHESS:
+        from position_index import update_position_index
+        update_position_index()
+    if args.tensors:
+        from benchmark_tensors import export_benchmark_tensors
+        export_benchmark_tensors(OUTPUT_PATH, lm_tokenizer=args.lm_tokenizer)
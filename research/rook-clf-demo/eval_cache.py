@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Bounded, thread-safe result cache for model evaluations, keyed by Zobrist hash.
+
+Search, self-play and puzzle sequences reach the same position again and again
+(transpositions, repeated puzzle prefixes), and every visit used to cost a fresh ONNX
+call. EvalCache maps a position to whatever the caller computed for it, e.g. ROOK-CLF
+top-k label ids / probabilities (policy_search.py) or the parsed M:/E:/B: lists of an
+LM policy decode (../rookworld-demo/mcts.py).
+
+Keys are Polyglot Zobrist hashes (python-chess, as in position_index.py): pieces, side
+to move, castling rights and legal en passant squares. With ignore_counters=False the
+halfmove clock and fullmove number are mixed into the key; ROOK-CLF sees the counters,
+so they can change its output.
+
+Eviction (capacity entries):
+  "clock"  second chance: a hit only sets a reference bit, the hand clears bits until
+           it finds an unreferenced slot (no reordering on hits)
+  "lru"    least recently used (OrderedDict, reordered on every hit)
+
+`save` / `load` persist the entries as JSON together with a tag (model_tag(): model
+path, size and mtime), so a cache file written for another model is ignored. Values
+must be JSON serializable for persistence. hits / misses / evictions are counted.
+
+Usage
+  python eval_cache.py stats benchmarks/cache/rook_clf.json
+"""
+
+import argparse
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import chess
+import chess.polyglot
+
+CACHE_VERSION = 1
+MASK64 = (1 << 64) - 1
+
+
+def model_tag(model_path):
+    """Identifies a model file version (path, size, mtime) without hashing its contents."""
+    stat = os.stat(model_path)
+    return f"{os.path.abspath(model_path)}:{stat.st_size}:{int(stat.st_mtime)}"
+
+
+def position_key(position, ignore_counters=True):
+    """Zobrist key of a chess.Board or FEN; optionally including the move counters."""
+    board = position if isinstance(position, chess.Board) else chess.Board(position)
+    key = chess.polyglot.zobrist_hash(board)
+    if not ignore_counters:
+        key ^= (board.halfmove_clock * 0x9E3779B97F4A7C15 + board.fullmove_number * 0xC2B2AE3D27D4EB4F) & MASK64
+    return key
+
+
+class EvalCache:
+    """Position -> evaluation result, bounded to capacity entries with CLOCK or LRU eviction."""
+
+    def __init__(self, capacity=100_000, ignore_counters=True, policy="clock", tag=None):
+        if policy not in ("clock", "lru"):
+            raise ValueError(f"Unknown eviction policy {policy!r}")
+        self.capacity = capacity
+        self.ignore_counters = ignore_counters
+        self.policy = policy
+        self.tag = tag
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # lru: key -> value; clock: key -> slot
+        # CLOCK ring
+        self._keys = [None] * capacity if policy == "clock" else None
+        self._values = [None] * capacity if policy == "clock" else None
+        self._referenced = bytearray(capacity) if policy == "clock" else None
+        self._hand = 0
+
+    def key(self, position):
+        return position_key(position, self.ignore_counters)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, position, default=None):
+        """Cached value of a position (chess.Board, FEN or precomputed key)."""
+        key = position if isinstance(position, int) else self.key(position)
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self.hits += 1
+            if self.policy == "lru":
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            slot = self._entries[key]
+            self._referenced[slot] = 1
+            return self._values[slot]
+
+    def put(self, position, value):
+        key = position if isinstance(position, int) else self.key(position)
+        with self._lock:
+            if self.policy == "lru":
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+                if len(self._entries) > self.capacity:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+                return
+            slot = self._entries.get(key)
+            if slot is None:
+                # New entries start unreferenced: only a hit earns the second chance
+                slot = self._free_slot()
+                self._entries[key] = slot
+                self._keys[slot] = key
+                self._referenced[slot] = 0
+            self._values[slot] = value
+
+    def _free_slot(self):
+        """Advance the CLOCK hand to an unreferenced slot, evicting its entry."""
+        while True:
+            slot = self._hand
+            self._hand = (self._hand + 1) % self.capacity
+            if self._keys[slot] is None:
+                return slot
+            if self._referenced[slot]:
+                self._referenced[slot] = 0
+                continue
+            del self._entries[self._keys[slot]]
+            self._keys[slot] = self._values[slot] = None
+            self.evictions += 1
+            return slot
+
+    def items(self):
+        with self._lock:
+            if self.policy == "lru":
+                return list(self._entries.items())
+            return [(key, self._values[slot]) for key, slot in self._entries.items()]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self.policy == "clock":
+                self._keys = [None] * self.capacity
+                self._values = [None] * self.capacity
+                self._referenced = bytearray(self.capacity)
+                self._hand = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        payload = {
+            "version": CACHE_VERSION,
+            "tag": self.tag,
+            "ignore_counters": self.ignore_counters,
+            "entries": [[f"{key:016x}", value] for key, value in self.items()],
+        }
+        with open(path + ".tmp", "w") as f:
+            json.dump(payload, f)
+        os.replace(path + ".tmp", path)
+
+    def load(self, path):
+        """Add the entries of a saved cache; returns how many were loaded (0 if incompatible)."""
+        if not os.path.exists(path):
+            return 0
+        with open(path, "r") as f:
+            payload = json.load(f)
+        if payload.get("version") != CACHE_VERSION or payload.get("tag") != self.tag \
+                or payload.get("ignore_counters") != self.ignore_counters:
+            print(f"Warning: ignoring cache {path} (written for {payload.get('tag')}, "
+                  f"ignore_counters={payload.get('ignore_counters')})")
+            return 0
+        for key, value in payload["entries"][-self.capacity:]:
+            self.put(int(key, 16), value)
+        return min(len(payload["entries"]), self.capacity)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect a persisted evaluation cache")
+    sub = parser.add_subparsers(dest="command", required=True)
+    stats = sub.add_parser("stats", help="Entries and tag of a saved cache")
+    stats.add_argument("path")
+    args = parser.parse_args()
+
+    with open(args.path, "r") as f:
+        payload = json.load(f)
+    print(f"{args.path}: {len(payload['entries'])} entries, version {payload['version']}, "
+          f"ignore_counters={payload['ignore_counters']}")
+    print(f"  tag: {payload['tag']}")
+
+
+if __name__ == "__main__":
+    main()
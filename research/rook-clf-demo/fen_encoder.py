@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Vectorized FEN <-> ROOK-CLF token encoder.
+
+`process_fen_rook_style` (convert_gdm_correct.py) and `tokenizeRookFen` (model-utils.js)
+build the 77-character ROOK-CLF string one FEN at a time with a regex and several string
+operations. For millions of positions that Python work dominates. This encoder does the
+same mapping for a whole batch with NumPy lookup tables over the FEN bytes:
+
+  1. FENs are packed into a zero-padded uint8 matrix.
+  2. Field numbers come from a cumulative sum over spaces.
+  3. In the board field, a byte LUT gives how many squares each byte covers (digit d -> d,
+     piece -> 1, '/' -> 0); the running sum is the target column of every piece.
+     Empty squares are simply the '.' default of the output.
+  4. The remaining fields are scattered to fixed columns (turn 64, castling 65-68,
+     en passant 69-70, halfmove 71-72 + '.', fullmove 74-76), padded with '.'.
+  5. A second LUT maps characters to token ids; [CLS] (34) is appended.
+
+`decode_fens` inverts the mapping. `python fen_encoder.py --self-test` asserts that the
+vocabulary matches model/ROOK-CLF-9m-transformersjs/tokenizer.json and that every
+benchmark FEN encodes exactly like the reference implementation and round-trips.
+"""
+
+import argparse
+import json
+import re
+import time
+from pathlib import Path
+
+import numpy as np
+
+MODEL_DIR = Path('model/ROOK-CLF-9m-transformersjs')
+
+# Research vocab from const.py (ids 0-31), special tokens from tokenizer.json
+RESEARCH_VOCAB = ["-", ".", "0", "1", "2", "3", "4", "5", "6", "7", "8", "9", "B", "K", "N", "P", "Q", "R",
+                  "a", "b", "c", "d", "e", "f", "g", "h", "k", "n", "p", "q", "r", "w"]
+SPECIAL_TOKENS = {"[SEP]": 32, "[PAD]": 33, "[CLS]": 34, "[MASK]": 35}
+CLS_TOKEN_ID = SPECIAL_TOKENS["[CLS]"]
+SEQ_LEN = 78
+
+# (field number, first output column, width) for the fields after the board
+TAIL_FIELDS = [(1, 64, 1), (2, 65, 4), (3, 69, 2), (4, 71, 2), (5, 74, 3)]
+NUM_FIELDS = 6
+
+DOT = ord('.')
+SPACE = ord(' ')
+
+# byte -> token id (-1 = not in vocab)
+CHAR_TO_ID = np.full(256, -1, dtype=np.int32)
+for _id, _ch in enumerate(RESEARCH_VOCAB):
+    CHAR_TO_ID[ord(_ch)] = _id
+# token id -> byte (only the 32 character tokens)
+ID_TO_CHAR = np.frombuffer(''.join(RESEARCH_VOCAB).encode(), dtype=np.uint8)
+
+# board byte -> number of squares it covers (-1 = invalid in the board field)
+SQUARE_COUNT = np.full(256, -1, dtype=np.int32)
+for _ch in "pnbrqkPNBRQK":
+    SQUARE_COUNT[ord(_ch)] = 1
+for _d in range(1, 9):
+    SQUARE_COUNT[ord(str(_d))] = _d
+SQUARE_COUNT[ord('/')] = 0
+
+
+def _pack(fens):
+    """FEN strings -> zero-padded uint8 matrix [N, longest FEN] (no per-FEN encode calls)."""
+    codes = np.array(fens, dtype=np.str_)
+    width = max(codes.dtype.itemsize // 4, 1)
+    raw = codes.view(np.uint32).reshape(len(fens), width)
+    # Non-ASCII characters map to 0xFF, which is not in any lookup table
+    return np.where(raw < 128, raw, 0xFF).astype(np.uint8)
+
+
+# tail field number -> first output column / width (field 0 is the board)
+FIELD_FIRST_COL = np.zeros(NUM_FIELDS + 1, dtype=np.int16)
+FIELD_WIDTH = np.zeros(NUM_FIELDS + 1, dtype=np.int16)
+for _number, _first_col, _width in TAIL_FIELDS:
+    FIELD_FIRST_COL[_number] = _first_col
+    FIELD_WIDTH[_number] = _width
+
+
+def clamp_counters(fen):
+    """FEN with the move counters clamped to the ROOK-CLF fields (halfmove <= 99, fullmove <= 999).
+
+    FENs without six fields or with non-numeric counters are returned unchanged, so that
+    encode_fens(strict=False) flags them instead of the caller raising.
+    """
+    fields = fen.split(" ")
+    if len(fields) == NUM_FIELDS and fields[4].isdigit() and fields[5].isdigit():
+        fields[4] = str(min(int(fields[4]), 99))
+        fields[5] = str(min(int(fields[5]), 999))
+    return " ".join(fields)
+
+
+def encode_fens(fens, strict=True):
+    """Encode FENs to ROOK-CLF ids, int32 [N, 78].
+
+    Returns (ids, valid). Rows that do not form a well-formed FEN for this encoding
+    (bad characters, board not 64 squares, halfmove > 99, fullmove > 999 ...) are
+    all-zero and flagged False in `valid`; with strict=True they raise instead.
+    """
+    n = len(fens)
+    if n == 0:
+        return np.zeros((0, SEQ_LEN), dtype=np.int32), np.zeros(0, dtype=bool)
+    raw = _pack(fens)
+    width = raw.shape[1]
+
+    is_space = raw == SPACE
+    content = ~is_space & (raw != 0)
+    spaces_before = np.cumsum(is_space, axis=1, dtype=np.int8)
+    field = np.minimum(spaces_before - is_space, NUM_FIELDS)  # field number of every byte
+    valid = spaces_before[:, -1] == NUM_FIELDS - 1
+
+    chars = np.full((n, SEQ_LEN - 1), DOT, dtype=np.uint8)
+    row_base = (np.arange(n, dtype=np.int64) * (SEQ_LEN - 1))[:, None]
+
+    # Board: running square count gives each piece's column
+    board = content & (field == 0)
+    counts = np.where(board, SQUARE_COUNT[raw], 0).astype(np.int16)
+    valid &= ~(counts < 0).any(axis=1)
+    end_square = np.cumsum(np.maximum(counts, 0), axis=1, dtype=np.int16)
+    valid &= end_square[:, -1] == 64
+    pieces = board & (counts == 1) & (raw > ord('9'))
+    piece_col = np.minimum(end_square - 1, 63)
+    chars.ravel()[(row_base + piece_col)[pieces]] = raw[pieces]
+
+    # Tail fields: position inside the field -> fixed column
+    cols = np.arange(width, dtype=np.int16)
+    field_start = np.maximum.accumulate(np.where(is_space, cols + 1, 0).astype(np.int16), axis=1)
+    pos_in_field = cols - field_start
+    tail = content & (field > 0)
+    valid &= ~(tail & (pos_in_field >= FIELD_WIDTH[field])).any(axis=1)
+    for number, _, _ in TAIL_FIELDS:
+        # every field needs at least one character
+        valid &= (tail & (field == number) & (pos_in_field == 0)).any(axis=1)
+    tail &= pos_in_field < FIELD_WIDTH[field]
+    chars.ravel()[(row_base + FIELD_FIRST_COL[field] + pos_in_field)[tail]] = raw[tail]
+
+    ids = np.empty((n, SEQ_LEN), dtype=np.int32)
+    ids[:, :-1] = CHAR_TO_ID[chars]
+    ids[:, -1] = CLS_TOKEN_ID
+    valid &= (ids[:, :-1] >= 0).all(axis=1)
+
+    if strict and not valid.all():
+        bad = int(np.flatnonzero(~valid)[0])
+        raise ValueError(f"Cannot encode FEN {fens[bad]!r} ({int((~valid).sum())} invalid rows)")
+    ids[~valid] = 0
+    return ids, valid
+
+
+def decode_fens(ids):
+    """ROOK-CLF ids [N, 78] (or [N, 77] without [CLS]) back to FEN strings."""
+    ids = np.asarray(ids)[:, :SEQ_LEN - 1]
+    if (ids < 0).any() or (ids >= len(ID_TO_CHAR)).any():
+        raise ValueError("ids contain special or out-of-vocabulary tokens")
+    text = ID_TO_CHAR[ids]
+    fens = []
+    for row in text:
+        s = row.tobytes().decode('ascii')
+        ranks = [re.sub(r'\.+', lambda m: str(len(m.group())), s[r * 8:(r + 1) * 8]) for r in range(8)]
+        fens.append(' '.join([
+            '/'.join(ranks),
+            s[64],
+            s[65:69].rstrip('.'),
+            s[69:71].rstrip('.'),
+            s[71:73].rstrip('.'),
+            s[74:77].rstrip('.'),
+        ]))
+    return fens
+
+
+def check_vocab_alignment(model_dir=MODEL_DIR):
+    """Assert the encoder tables agree with the shipped tokenizer.json."""
+    with open(Path(model_dir) / 'tokenizer.json', 'r') as f:
+        tokenizer = json.load(f)
+    vocab = tokenizer['model']['vocab']
+    expected = {ch: i for i, ch in enumerate(RESEARCH_VOCAB)}
+    assert vocab == expected, f"tokenizer.json vocab differs from research vocab: {set(vocab.items()) ^ set(expected.items())}"
+    added = {t['content']: t['id'] for t in tokenizer.get('added_tokens', [])}
+    for token, token_id in SPECIAL_TOKENS.items():
+        assert added.get(token) == token_id, f"{token} is {added.get(token)} in tokenizer.json, expected {token_id}"
+    return vocab
+
+
+def self_test(benchmark_dir='benchmarks', model_dir=MODEL_DIR):
+    from convert_gdm_correct import process_fen_rook_style
+
+    vocab = check_vocab_alignment(model_dir)
+    print(f"Vocab alignment with {model_dir}/tokenizer.json: OK ({len(vocab)} chars + {len(SPECIAL_TOKENS)} special)")
+
+    fens = []
+    for path in sorted(Path(benchmark_dir).glob('*.json')):
+        if path.name == 'manifest.json':
+            continue
+        with open(path, 'r') as f:
+            fens.extend(p["fen"] for p in json.load(f)["positions"])
+    if not fens:
+        raise SystemExit(f"No benchmark FENs found in {benchmark_dir}")
+
+    start = time.perf_counter()
+    reference = np.array([[vocab[ch] for ch in process_fen_rook_style(fen)] + [CLS_TOKEN_ID] for fen in fens],
+                         dtype=np.int32)
+    reference_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ids, _ = encode_fens(fens)
+    encode_time = time.perf_counter() - start
+
+    mismatched = np.flatnonzero((ids != reference).any(axis=1))
+    assert len(mismatched) == 0, f"{len(mismatched)} FENs encode differently, first: {fens[mismatched[0]]}"
+
+    start = time.perf_counter()
+    decoded = decode_fens(ids)
+    decode_time = time.perf_counter() - start
+    broken = [(a, b) for a, b in zip(fens, decoded) if a != b]
+    assert not broken, f"{len(broken)} FENs do not round-trip, first: {broken[0]}"
+
+    print(f"Encoded {len(fens)} benchmark FENs: identical to process_fen_rook_style, round-trip OK")
+    print(f"  reference: {reference_time * 1e6 / len(fens):.2f} us/FEN")
+    print(f"  vectorized: {encode_time * 1e6 / len(fens):.2f} us/FEN ({reference_time / encode_time:.1f}x)")
+    print(f"  decode: {decode_time * 1e6 / len(fens):.2f} us/FEN")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vectorized FEN <-> ROOK-CLF token encoder")
+    parser.add_argument("fens", nargs="*", help="FENs to encode")
+    parser.add_argument("--self-test", action="store_true", help="Check vocab alignment and round-trip all benchmark FENs")
+    parser.add_argument("--benchmark-dir", default="benchmarks")
+    parser.add_argument("--model-dir", default=str(MODEL_DIR))
+    args = parser.parse_args()
+
+    if args.self_test:
+        self_test(args.benchmark_dir, args.model_dir)
+    for fen, row in zip(args.fens, encode_fens(args.fens)[0] if args.fens else []):
+        print(fen)
+        print(' '.join(map(str, row)))
+
+
+if __name__ == "__main__":
+    main()
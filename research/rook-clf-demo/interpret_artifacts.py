@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Offline interpretability artifacts for benchmark positions, memory-mapped by position key.
+
+The interpretability tab runs model.interpret.onnx in the browser and then computes
+everything from the raw attentions [L, 1, H, 78, 78] and hidden states [L+1, 1, 78, H]:
+attention rollout, the per-layer logit lens through classifier_weight (W_cls_T) and an
+occlusion map with one extra forward pass per occupied square. This batch job does the
+same work once for whole position sets and keeps only the compact results:
+
+  rollout        [77]      CLS row of the residual-corrected rollout (alpha, head mean)
+  cls_attention  [L, 77]   head-mean attention of the CLS token per layer
+  lens_ids       [L, k]    logit lens: top-k label ids of hidden_states[l] @ W_cls_T
+  lens_probs     [L, k]    and their softmax probabilities
+  attribution    [64]      occlusion: drop of the predicted label's logit when a square
+                           is emptied (0 for empty squares)
+  prediction               top-1 label id of the full model
+
+Values are quantized to uint8 after dividing by the row maximum, which is kept as a
+float16 scale; a position costs roughly (L + 3) * 80 bytes instead of the L*H*78*78*4
+bytes of its attentions alone. Rows are sorted
+by key and stored in one file (benchmarks/interpret_artifacts.bin: magic, JSON header
+with the array layout, 64-byte aligned arrays), so ArtifactStore memory-maps it and a
+lookup is a binary search over the keys plus a few small reads.
+
+Keys are Zobrist hashes with the move counters mixed in (eval_cache.position_key with
+ignore_counters=False), since ROOK-CLF sees the counters. The header records the model's
+sha256, so artifacts of another model can be told apart.
+
+Usage
+  python interpret_artifacts.py build                                   # benchmarks/*.json
+  python interpret_artifacts.py build --benchmark benchmarks/lichess_puzzles.json --no-attribution
+  python interpret_artifacts.py lookup "<fen>"
+  python interpret_artifacts.py info
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from benchmark_manifest import file_sha256
+from eval_cache import position_key
+from fen_encoder import MODEL_DIR, RESEARCH_VOCAB, SEQ_LEN, clamp_counters, encode_fens
+from position_index import benchmark_files
+
+MODEL_PATH = MODEL_DIR / 'model.interpret.onnx'
+ARTIFACTS_PATH = Path('benchmarks/interpret_artifacts.bin')
+MAGIC = b'ROOKIAX1'
+HEADER_ALIGN = 64
+ARTIFACTS_VERSION = 1
+EMPTY_ID = RESEARCH_VOCAB.index('.')
+CLS = SEQ_LEN - 1
+
+
+def attention_rollout(attentions, alpha=0.2):
+    """CLS rows of the residual-corrected rollout; attentions [L, B, H, S, S] -> [B, S]."""
+    rollout = None
+    for layer in attentions:
+        a = layer.mean(axis=1)
+        a = a / np.maximum(a.sum(axis=-1, keepdims=True), 1e-9)
+        a = (1 - alpha) * a + alpha * np.eye(a.shape[-1], dtype=a.dtype)
+        rollout = a if rollout is None else rollout @ a
+    return rollout[:, CLS]
+
+
+def logit_lens(hidden_states, classifier_weight, topk):
+    """Top-k label ids and probabilities per layer; hidden_states [L+1, B, S, H] -> [B, L, k]."""
+    logits = np.einsum("lbh,hc->blc", hidden_states[1:, :, CLS], classifier_weight)
+    logits -= logits.max(axis=-1, keepdims=True)
+    probs = np.exp(logits)
+    probs /= probs.sum(axis=-1, keepdims=True)
+    ids = np.argpartition(-probs, topk - 1, axis=-1)[..., :topk]
+    order = np.argsort(-np.take_along_axis(probs, ids, axis=-1), axis=-1)
+    ids = np.take_along_axis(ids, order, axis=-1)
+    return ids, np.take_along_axis(probs, ids, axis=-1)
+
+
+def quantize_rows(values):
+    """Divide by the maximum over the last axis (clamped at 0); uint8 values and float16 scales."""
+    values = np.maximum(values, 0)
+    scale = values.max(axis=-1, keepdims=True)
+    q = np.round(values / np.where(scale > 0, scale, 1) * 255)
+    return q.astype(np.uint8), scale[..., 0].astype(np.float16)
+
+
+class InterpretRunner:
+    """Batched forward passes of the interpretability export."""
+
+    def __init__(self, model_path, alpha=0.2, topk=5, attribution=True):
+        import onnxruntime as ort
+
+        self.session = ort.InferenceSession(str(model_path), providers=["CPUExecutionProvider"])
+        self.dtype = np.int32 if "int32" in self.session.get_inputs()[0].type else np.int64
+        self.alpha = alpha
+        self.topk = topk
+        self.attribution = attribution
+
+    def _run(self, ids, outputs=None):
+        ids = ids.astype(self.dtype)
+        return self.session.run(outputs, {"input_ids": ids, "attention_mask": np.ones_like(ids)})
+
+    def __call__(self, ids):
+        logits, _, classifier_weight, attentions, hidden_states = self._run(ids)
+        rollout, rollout_scale = quantize_rows(attention_rollout(attentions, self.alpha)[:, :CLS])
+        cls_attention, cls_scale = quantize_rows(attentions.mean(axis=2)[:, :, CLS, :CLS].transpose(1, 0, 2))
+        lens_ids, lens_probs = logit_lens(hidden_states, classifier_weight, self.topk)
+        lens_probs, lens_scale = quantize_rows(lens_probs)
+        prediction = logits.argmax(axis=-1)
+        result = {
+            "rollout": rollout,
+            "rollout_scale": rollout_scale,
+            "cls_attention": cls_attention,
+            "cls_attention_scale": cls_scale,
+            "lens_ids": lens_ids.astype(np.uint16),
+            "lens_probs": lens_probs,
+            "lens_probs_scale": lens_scale,
+            "prediction": prediction.astype(np.uint16),
+        }
+        if self.attribution:
+            result["attribution"], result["attribution_scale"] = quantize_rows(self.occlusion(ids, logits, prediction))
+        return result
+
+    def occlusion(self, ids, logits, prediction):
+        """Drop of the predicted logit per emptied square, all occupied squares in one batch."""
+        rows, squares = np.nonzero(ids[:, :64] != EMPTY_ID)
+        occluded = np.repeat(ids, np.bincount(rows, minlength=len(ids)), axis=0)
+        occluded[np.arange(len(rows)), squares] = EMPTY_ID
+        drops = np.zeros((len(ids), 64), dtype=np.float32)
+        if len(rows):
+            scores = self._run(occluded, ["logits"])[0][np.arange(len(rows)), prediction[rows]]
+            drops[rows, squares] = logits[rows, prediction[rows]] - scores
+        return drops
+
+
+def array_layout(count, layers, topk, attribution):
+    shapes = {
+        "keys": ("<u8", (count,)),
+        "prediction": ("<u2", (count,)),
+        "rollout": ("u1", (count, CLS)),
+        "rollout_scale": ("<f2", (count,)),
+        "cls_attention": ("u1", (count, layers, CLS)),
+        "cls_attention_scale": ("<f2", (count, layers)),
+        "lens_ids": ("<u2", (count, layers, topk)),
+        "lens_probs": ("u1", (count, layers, topk)),
+        "lens_probs_scale": ("<f2", (count, layers)),
+    }
+    if attribution:
+        shapes["attribution"] = ("u1", (count, 64))
+        shapes["attribution_scale"] = ("<f2", (count,))
+    return shapes
+
+
+def load_positions(benchmarks, fens_file=None, limit=None):
+    """Unique FENs (by key) sorted by key; returns (keys, fens)."""
+    fens = []
+    for path in benchmarks:
+        with open(path, "r") as f:
+            data = json.load(f)
+        fens.extend(p["fen"] for p in (data if isinstance(data, list) else data["positions"]))
+    if fens_file:
+        with open(fens_file, "r") as f:
+            fens.extend(line.strip() for line in f if line.strip())
+    by_key = {}
+    for fen in fens[:limit]:
+        try:
+            by_key.setdefault(position_key(fen, ignore_counters=False), fen)
+        except ValueError:
+            continue
+    keys = np.array(sorted(by_key), dtype=np.uint64)
+    return keys, [by_key[int(k)] for k in keys]
+
+
+def build_artifacts(model_path=MODEL_PATH, benchmarks=None, fens_file=None, output=ARTIFACTS_PATH, batch_size=32,
+                    alpha=0.2, topk=5, attribution=True, limit=None):
+    """Run the interpretability model over all positions and write the artifact file."""
+    keys, fens = load_positions(benchmarks if benchmarks is not None else benchmark_files(), fens_file, limit)
+    ids, valid = encode_fens([clamp_counters(fen) for fen in fens], strict=False)
+    keys, ids = keys[valid], ids[valid]
+    runner = InterpretRunner(model_path, alpha, topk, attribution)
+    layers = runner.session.get_outputs()[3].shape[0]
+    if not isinstance(layers, int):
+        layers = runner(ids[:1])["cls_attention"].shape[1]
+
+    layout = array_layout(len(keys), layers, topk, attribution)
+    header = {
+        "version": ARTIFACTS_VERSION,
+        "model": str(model_path),
+        "model_sha256": file_sha256(model_path),
+        "count": len(keys),
+        "layers": layers,
+        "topk": topk,
+        "alpha": alpha,
+        "arrays": {},
+    }
+    offset = 0
+    for name, (dtype, shape) in layout.items():
+        header["arrays"][name] = {"dtype": dtype, "shape": list(shape), "offset": offset}
+        offset += -(-int(np.prod(shape)) * np.dtype(dtype).itemsize // HEADER_ALIGN) * HEADER_ALIGN
+    header_bytes = json.dumps(header).encode()
+    data_offset = -(-(len(MAGIC) + 4 + len(header_bytes)) // HEADER_ALIGN) * HEADER_ALIGN
+
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output.with_suffix(output.suffix + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC + len(header_bytes).to_bytes(4, 'little') + header_bytes)
+        f.truncate(data_offset + max(offset, 1))
+    arrays = {name: np.memmap(tmp_path, dtype=spec["dtype"], mode='r+', offset=data_offset + spec["offset"],
+                              shape=tuple(spec["shape"]))
+              for name, spec in header["arrays"].items()}
+    arrays["keys"][:] = keys
+    for start in range(0, len(keys), batch_size):
+        for name, values in runner(ids[start:start + batch_size]).items():
+            arrays[name][start:start + batch_size] = values
+        if (start // batch_size) % 20 == 0:
+            print(f"  {min(start + batch_size, len(keys))}/{len(keys)} positions")
+    for array in arrays.values():
+        array.flush()
+    del arrays
+    os.replace(tmp_path, output)
+    return header
+
+
+class ArtifactStore:
+    """Memory-mapped, read-only view of an artifact file."""
+
+    def __init__(self, path=ARTIFACTS_PATH):
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not an interpretability artifact file")
+            header_len = int.from_bytes(f.read(4), 'little')
+            self.header = json.loads(f.read(header_len))
+        data_offset = -(-(len(MAGIC) + 4 + header_len) // HEADER_ALIGN) * HEADER_ALIGN
+        self.arrays = {name: np.memmap(path, dtype=spec["dtype"], mode='r', offset=data_offset + spec["offset"],
+                                       shape=tuple(spec["shape"]))
+                       for name, spec in self.header["arrays"].items()}
+        self.keys = self.arrays["keys"]
+        self._id2label = None
+
+    def __len__(self):
+        return self.header["count"]
+
+    def row(self, fen):
+        """Row number of a position (FEN or key), or None."""
+        key = np.uint64(position_key(fen, ignore_counters=False) if isinstance(fen, str) else fen)
+        i = int(np.searchsorted(self.keys, key))
+        return i if i < len(self.keys) and self.keys[i] == key else None
+
+    def __contains__(self, fen):
+        return self.row(fen) is not None
+
+    def lookup(self, fen):
+        """Dequantized artifacts of a position as a dict, or None if it was not precomputed."""
+        i = self.row(fen)
+        if i is None:
+            return None
+        if self._id2label is None:
+            with open(MODEL_DIR / 'config.json', 'r') as f:
+                self._id2label = json.load(f)["id2label"]
+        a = self.arrays
+        rollout = a["rollout"][i] / 255 * np.float32(a["rollout_scale"][i])
+        result = {
+            "prediction": self._id2label[str(int(a["prediction"][i]))],
+            "rollout_board": rollout[:64].reshape(8, 8),
+            "rollout_meta": rollout[64:],
+            "cls_attention": a["cls_attention"][i] / 255 * a["cls_attention_scale"][i][:, None].astype(np.float32),
+            "logit_lens": [[(self._id2label[str(int(c))], p / 255 * float(scale)) for c, p in zip(ids, probs)]
+                           for ids, probs, scale in zip(a["lens_ids"][i], a["lens_probs"][i],
+                                                        a["lens_probs_scale"][i])],
+        }
+        if "attribution" in a:
+            result["attribution"] = (a["attribution"][i] / 255 * np.float32(a["attribution_scale"][i])).reshape(8, 8)
+        return result
+
+
+def print_board(values):
+    peak = values.max() or 1.0
+    shades = " .:-=+*#%@"
+    for rank, row in zip(range(8, 0, -1), values):
+        print(f"  {rank} " + " ".join(shades[int(v / peak * (len(shades) - 1))] for v in row))
+    print("    a b c d e f g h")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precomputed ROOK-CLF interpretability artifacts")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Run the interpretability model over position sets")
+    build.add_argument("--model", default=str(MODEL_PATH))
+    build.add_argument("--benchmark", nargs="+", default=None, help="Benchmark JSONs (default: benchmarks/*.json)")
+    build.add_argument("--fens", default=None, help="Extra text file with one FEN per line")
+    build.add_argument("--output", default=str(ARTIFACTS_PATH))
+    build.add_argument("--batch-size", type=int, default=32)
+    build.add_argument("--alpha", type=float, default=0.2, help="Residual weight of the rollout")
+    build.add_argument("--topk", type=int, default=5, help="Logit lens moves per layer")
+    build.add_argument("--no-attribution", action="store_true", help="Skip the occlusion maps (~30x fewer passes)")
+    build.add_argument("--limit", type=int, default=None)
+    lookup = commands.add_parser("lookup", help="Show the artifacts of a position")
+    lookup.add_argument("fen")
+    lookup.add_argument("--artifacts", default=str(ARTIFACTS_PATH))
+    info = commands.add_parser("info", help="Show the header of an artifact file")
+    info.add_argument("--artifacts", default=str(ARTIFACTS_PATH))
+    args = parser.parse_args()
+
+    if args.command == "build":
+        header = build_artifacts(args.model, args.benchmark, args.fens, args.output, args.batch_size, args.alpha,
+                                 args.topk, not args.no_attribution, args.limit)
+        size = os.path.getsize(args.output)
+        print(f"Wrote {header['count']} positions ({header['layers']} layers) to {args.output} "
+              f"({size / 1e6:.1f} MB, {size / max(header['count'], 1):.0f} bytes/position)")
+    elif args.command == "lookup":
+        store = ArtifactStore(args.artifacts)
+        result = store.lookup(args.fen)
+        if result is None:
+            print("Position not in the artifact file")
+            return
+        print(f"Prediction: {result['prediction']}")
+        print("Attention rollout (CLS):")
+        print_board(result["rollout_board"])
+        if "attribution" in result:
+            print("Occlusion attribution:")
+            print_board(result["attribution"])
+        print("Logit lens:")
+        for layer, moves in enumerate(result["logit_lens"], 1):
+            print(f"  L{layer}: " + "  ".join(f"{move} {p * 100:.1f}%" for move, p in moves))
+    else:
+        header = ArtifactStore(args.artifacts).header
+        print(json.dumps({k: v for k, v in header.items() if k != "arrays"}, indent=2))
+        for name, spec in header["arrays"].items():
+            print(f"  {name:<20} {spec['dtype']:<4} {spec['shape']}")
+
+
+if __name__ == "__main__":
+    main()
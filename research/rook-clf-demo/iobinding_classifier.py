@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+ROOK-CLF inference on ONNX Runtime IOBinding with preallocated, reused buffers.
+
+For a 9M-parameter classifier the model itself is cheap, so the per-call work around
+session.run (building input_ids / attention_mask arrays, allocating the [batch, 1968]
+logits output) is a large share of every batch. IOBindingClassifier allocates the
+inputs and the logits buffer once for max_batch rows:
+
+  input_ids       [max_batch, 78]    int64 or int32, whatever the export declares
+  attention_mask  [max_batch, 78]    all ones (ROOK-CLF inputs have a fixed length)
+  logits          [max_batch, 1968]  float32
+
+Each call copies the batch into the input buffer (no allocation) and rebinds the row
+prefix [:n] of the same memory, so the only per-call cost left is the model.
+
+Input ids come from fen_encoder.encode_fens or from the clf_input_ids array of a
+benchmark tensor file (benchmark_tensors.py).
+
+Usage
+  python iobinding_classifier.py --model model/ROOK-CLF-9m-transformersjs/model.quant.onnx \
+      --tensors benchmarks/lichess_puzzles.tensors.bin --batch-size 64
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import onnxruntime as ort
+
+from fen_encoder import MODEL_DIR, SEQ_LEN, encode_fens
+from legal_masks import LegalMaskGenerator, masked_logits
+
+MODEL_PATH = Path('model/ROOK-CLF-9m-transformersjs/model.quant.onnx')
+ORT_TO_NUMPY = {"tensor(int64)": np.int64, "tensor(int32)": np.int32, "tensor(float)": np.float32,
+                "tensor(bool)": np.bool_}
+
+
+class IOBindingClassifier:
+    """ROOK-CLF outputs for batches of encoded FENs without per-call allocations.
+
+    Works with plain exports (`logits`) and with --topk exports (`top_ids`, `top_probs`,
+    optional `legal_mask` input) of scripts/export_classifier_onnx.py.
+    """
+
+    def __init__(self, model_path=MODEL_PATH, max_batch=256, providers=None, session_options=None):
+        self.session = ort.InferenceSession(str(model_path), sess_options=session_options,
+                                            providers=providers or ["CPUExecutionProvider"])
+        inputs = {i.name: i for i in self.session.get_inputs()}
+        self.input_dtype = ORT_TO_NUMPY[inputs["input_ids"].type]
+        self.mask_dtype = ORT_TO_NUMPY[inputs["attention_mask"].type]
+        self.max_batch = max_batch
+
+        self.input_ids = np.zeros((max_batch, SEQ_LEN), dtype=self.input_dtype)
+        self.attention_mask = np.ones((max_batch, SEQ_LEN), dtype=self.mask_dtype)
+        self.legal_mask = None
+        if "legal_mask" in inputs:
+            self.legal_mask = np.ones((max_batch, inputs["legal_mask"].shape[-1]), dtype=np.bool_)
+
+        # One preallocated buffer per output: logits [B, 1968] or top_ids / top_probs [B, K]
+        self.outputs = {}
+        for output in self.session.get_outputs():
+            if output.name in ("logits", "top_ids", "top_probs"):
+                self.outputs[output.name] = np.full((max_batch, output.shape[-1]), 0,
+                                                    dtype=ORT_TO_NUMPY[output.type])
+        self.topk = "top_ids" in self.outputs
+        self.num_labels = self.legal_mask.shape[1] if self.legal_mask is not None else (
+            None if self.topk else self.outputs["logits"].shape[1])
+        self.binding = self.session.io_binding()
+        self._bound_rows = None
+
+    def _bind(self, rows):
+        if rows == self._bound_rows:
+            return
+        self.binding.bind_input("input_ids", "cpu", 0, self.input_dtype, [rows, SEQ_LEN],
+                                self.input_ids.ctypes.data)
+        self.binding.bind_input("attention_mask", "cpu", 0, self.mask_dtype, [rows, SEQ_LEN],
+                                self.attention_mask.ctypes.data)
+        if self.legal_mask is not None:
+            self.binding.bind_input("legal_mask", "cpu", 0, np.bool_, [rows, self.legal_mask.shape[1]],
+                                    self.legal_mask.ctypes.data)
+        for name, buffer in self.outputs.items():
+            self.binding.bind_output(name, "cpu", 0, buffer.dtype, [rows, buffer.shape[1]], buffer.ctypes.data)
+        self._bound_rows = rows
+
+    def run(self, input_ids, legal_mask=None):
+        """Outputs for at most max_batch rows, as views valid until the next call.
+
+        Returns logits [n, 1968], or (top_ids, top_probs) [n, K] for --topk exports.
+        legal_mask ([n, 1968] bool) is used by exports with a legal_mask input; without
+        it every label counts as legal.
+        """
+        rows = len(input_ids)
+        if not 0 < rows <= self.max_batch:
+            raise ValueError(f"Batch of {rows} rows does not fit max_batch {self.max_batch}")
+        np.copyto(self.input_ids[:rows], input_ids, casting='same_kind')
+        if self.legal_mask is not None:
+            if legal_mask is None:
+                self.legal_mask[:rows] = True
+            else:
+                np.copyto(self.legal_mask[:rows], legal_mask)
+        self._bind(rows)
+        self.session.run_with_iobinding(self.binding)
+        if self.topk:
+            return self.outputs["top_ids"][:rows], self.outputs["top_probs"][:rows]
+        return self.outputs["logits"][:rows]
+
+    def predict(self, input_ids, legal_mask=None):
+        """Outputs for any number of rows, computed max_batch rows at a time."""
+        results = []
+        for start in range(0, len(input_ids), self.max_batch):
+            chunk = input_ids[start:start + self.max_batch]
+            mask = None if legal_mask is None else legal_mask[start:start + self.max_batch]
+            out = self.run(chunk, mask)
+            results.append(tuple(o.copy() for o in out) if self.topk else out.copy())
+        if self.topk:
+            return tuple(np.concatenate(parts) for parts in zip(*results))
+        return np.concatenate(results)
+
+    def best_labels(self, input_ids, legal_mask=None):
+        """Most probable (legal, if legal_mask is given) label id per row for either export type.
+
+        Logits exports are masked here with masked_logits. --topk exports without a
+        legal_mask input return the first legal label of their top K, or the top label
+        if none of the K is legal.
+        """
+        out = self.predict(input_ids, legal_mask)
+        if not self.topk:
+            return (out if legal_mask is None else masked_logits(out, legal_mask)).argmax(axis=-1)
+        top_ids = out[0]
+        if legal_mask is None or self.legal_mask is not None:
+            return top_ids[:, 0]
+        legal = np.take_along_axis(np.asarray(legal_mask), top_ids, axis=1)
+        return top_ids[np.arange(len(top_ids)), legal.argmax(axis=1)]
+
+
+def benchmark(model_path, input_ids, labels, batch_size, repeats=3):
+    classifier = IOBindingClassifier(model_path, max_batch=batch_size)
+    session = classifier.session
+    output_names = list(classifier.outputs)
+
+    def naive():
+        out = []
+        for start in range(0, len(input_ids), batch_size):
+            chunk = np.asarray(input_ids[start:start + batch_size])
+            feeds = {
+                "input_ids": chunk.astype(classifier.input_dtype),
+                "attention_mask": np.ones(chunk.shape, dtype=classifier.mask_dtype),
+            }
+            if classifier.legal_mask is not None:
+                feeds["legal_mask"] = np.ones((len(chunk), classifier.num_labels), dtype=np.bool_)
+            out.append(session.run(output_names, feeds)[0])
+        return np.concatenate(out)
+
+    def bound():
+        out = classifier.predict(input_ids)
+        return out[0] if classifier.topk else out
+
+    results = {}
+    for name, fn in (("session.run", naive), ("IOBinding", bound)):
+        fn()  # warm up
+        start = time.perf_counter()
+        for _ in range(repeats):
+            first_output = fn()
+        results[name] = ((time.perf_counter() - start) / repeats, first_output)
+
+    (naive_time, naive_out), (bound_time, bound_out) = results.values()
+    print(f"{len(input_ids)} positions, batch size {batch_size}, outputs {output_names}, "
+          f"max |diff| {np.abs(naive_out.astype(np.float64) - bound_out).max():.2e}")
+    print(f"  session.run: {naive_time * 1e6 / len(input_ids):.1f} us/position")
+    print(f"  IOBinding:   {bound_time * 1e6 / len(input_ids):.1f} us/position ({naive_time / bound_time:.2f}x)")
+    if labels is not None:
+        known = labels >= 0
+        best = bound_out[:, 0] if classifier.topk else bound_out.argmax(axis=-1)
+        accuracy = (best[known] == labels[known]).mean()
+        print(f"  top-1 accuracy vs correct_move: {accuracy:.3f} ({int(known.sum())} labelled positions)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ROOK-CLF inference with ORT IOBinding")
+    parser.add_argument("--model", default=str(MODEL_PATH))
+    parser.add_argument("--tensors", default=None, help="Benchmark tensor file (benchmark_tensors.py) to score")
+    parser.add_argument("--fen", action="append", default=[],
+                        help="FEN(s) to score instead of --tensors (top legal moves)")
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    if args.tensors:
+        from benchmark_tensors import load_benchmark_tensors
+        arrays, _ = load_benchmark_tensors(args.tensors)
+        benchmark(args.model, arrays["clf_input_ids"], np.asarray(arrays["labels"]), args.batch_size)
+        return
+    if not args.fen:
+        parser.error("give --tensors or --fen")
+
+    with open(MODEL_DIR / 'config.json', 'r') as f:
+        id2label = json.load(f)["id2label"]
+    classifier = IOBindingClassifier(args.model, max_batch=len(args.fen))
+    legal = LegalMaskGenerator().masks(args.fen)
+    out = classifier.run(encode_fens(args.fen)[0], legal)
+    for row, fen in enumerate(args.fen):
+        if classifier.topk:
+            legal_top = legal[row][out[0][row]]  # top-k is padded with illegal labels (prob 0)
+            top, scores = out[0][row][legal_top], out[1][row][legal_top]
+        else:
+            logits = masked_logits(out[row], legal[row])
+            top = np.argsort(-logits)[:min(5, int(legal[row].sum()))]
+            scores = logits[top]
+        print(fen)
+        print("  " + ", ".join(f"{id2label[str(i)]} ({score:.2f})" for i, score in zip(top, scores)))
+
+
+if __name__ == "__main__":
+    main()
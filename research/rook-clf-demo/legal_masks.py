@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Batched legal-move masks over the 1968 ROOK-CLF move labels.
+
+Filtering classifier predictions to legal moves used to walk `board.legal_moves` for
+every position, format each move with `.uci()` and look the string up in the label2id
+table of config.json (~190 us per FEN). Here the whole batch is handled with NumPy:
+
+  1. FENs are parsed by fen_encoder.encode_fens into int8 boards [N, 64] (+1..+6 for
+     the side to move, -1..-6 for the opponent). Black-to-move rows are mirrored, so
+     move generation only deals with white moving up the board.
+  2. Pseudo-legal moves come from precomputed per-square tables: targets of every piece
+     type plus the squares in between for sliders, expanded for all pieces at once.
+     Pawn pushes, captures, promotions, en passant and castling are vectorized rules.
+  3. Only moves that can expose the king (king moves, moves while in check, moves of a
+     piece on a line with the king, en passant) are played on a copy of the board and
+     tested with an attack check that walks the rays of all boards together.
+  4. (row, from, to, promotion) map to label ids through a table indexed by integer move
+     codes (from | to << 6 | promotion << 12, the encoding of position_index.py), and
+     are scattered into the [batch, 1968] bool mask in one assignment.
+
+Rules follow python-chess for standard chess. The masks feed the `legal_mask` input of
+--legal-mask exports (scripts/export_classifier_onnx.py) or `masked_logits` for plain
+logits. `python legal_masks.py --benchmark` checks the masks against python-chess for
+all benchmark FENs plus random-playout positions (castling, en passant, promotions)
+and times both.
+
+Usage
+  python legal_masks.py "<fen>" ...                  # legal labels per FEN
+  python legal_masks.py --benchmark
+"""
+
+import argparse
+import json
+import random
+import time
+from pathlib import Path
+
+import chess
+import numpy as np
+
+from fen_encoder import ID_TO_CHAR, SEQ_LEN, encode_fens
+from position_index import PROMOTIONS, benchmark_files, encode_move
+
+MODEL_DIR = Path('model/ROOK-CLF-9m-transformersjs')
+CHUNK_SIZE = 4096
+EMPTY = 64  # extra always-empty square used to pad the tables
+
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(1, 7)
+PIECE_VALUE = np.zeros(256, dtype=np.int8)
+for _value, _ch in enumerate("PNBRQK", start=1):
+    PIECE_VALUE[ord(_ch)] = _value
+    PIECE_VALUE[ord(_ch.lower())] = -_value
+
+ORTHOGONAL = [(0, 1), (0, -1), (1, 0), (-1, 0)]
+DIAGONAL = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
+KNIGHT_STEPS = [(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)]
+MIRROR = np.arange(64) ^ 56  # square index -> same square seen from black (also FEN column -> square)
+
+
+def _square(file, rank):
+    return rank * 8 + file if 0 <= file < 8 and 0 <= rank < 8 else None
+
+
+def _steps(square, steps):
+    return [t for t in (_square(square % 8 + df, square // 8 + dr) for df, dr in steps) if t is not None]
+
+
+def _ray(square, direction):
+    return [t for t in (_square(square % 8 + direction[0] * i, square // 8 + direction[1] * i) for i in range(1, 8))
+            if t is not None]
+
+
+def _pad(rows, width):
+    """Ragged square lists -> int array [len(rows) + 1, width] padded with EMPTY (last row all EMPTY)."""
+    out = np.full((len(rows) + 1, width), EMPTY, dtype=np.int64)
+    for i, row in enumerate(rows):
+        out[i, :len(row)] = row
+    return out
+
+
+# Attack tables, indexed by square (row EMPTY = no king on the board)
+KNIGHT_TARGETS = _pad([_steps(s, KNIGHT_STEPS) for s in range(64)], 8)
+KING_TARGETS = _pad([_steps(s, ORTHOGONAL + DIAGONAL) for s in range(64)], 8)
+# Squares an opponent pawn (moving down) attacks the square from
+PAWN_ATTACKERS = _pad([_steps(s, [(-1, 1), (1, 1)]) for s in range(64)], 2)
+RAYS = np.stack([_pad([_ray(s, d) for s in range(64)], 7) for d in ORTHOGONAL + DIAGONAL], axis=1)
+ORTHOGONAL_RAY = np.arange(8) < 4
+
+# Piece moves as one flat table: for piece type t on square s, entries
+# MOVE_OFFSET[t, s] .. + MOVE_COUNT[t, s] hold the target and the squares in between
+_targets, _between = [], []
+MOVE_OFFSET = np.zeros((7, 64), dtype=np.int64)
+MOVE_COUNT = np.zeros((7, 64), dtype=np.int64)
+for _piece, _directions in ((BISHOP, DIAGONAL), (ROOK, ORTHOGONAL), (QUEEN, ORTHOGONAL + DIAGONAL)):
+    for _s in range(64):
+        MOVE_OFFSET[_piece, _s] = len(_targets)
+        for _d in _directions:
+            _line = _ray(_s, _d)
+            for _i, _t in enumerate(_line):
+                _targets.append(_t)
+                _between.append(_line[:_i])
+        MOVE_COUNT[_piece, _s] = len(_targets) - MOVE_OFFSET[_piece, _s]
+for _piece, _steps_of in ((KNIGHT, KNIGHT_STEPS), (KING, ORTHOGONAL + DIAGONAL)):
+    for _s in range(64):
+        MOVE_OFFSET[_piece, _s] = len(_targets)
+        for _t in _steps(_s, _steps_of):
+            _targets.append(_t)
+            _between.append([])
+        MOVE_COUNT[_piece, _s] = len(_targets) - MOVE_OFFSET[_piece, _s]
+MOVE_TARGET = np.array(_targets, dtype=np.int64)
+MOVE_BETWEEN = _pad(_between, 6)[:-1]
+
+# (right index, king target, rook square, squares that must be empty, squares that must not be attacked)
+CASTLING = [
+    (0, 6, 7, [5, 6], [4, 5, 6]),        # e1g1
+    (1, 2, 0, [1, 2, 3], [4, 3, 2]),     # e1c1
+]
+
+
+def load_label2id(model_dir=MODEL_DIR):
+    with open(Path(model_dir) / 'config.json', 'r') as f:
+        return json.load(f)['label2id']
+
+
+def move_label_table(label2id):
+    """int16 [5 * 4096] move code -> label id (-1 = move has no label)."""
+    table = np.full(len(PROMOTIONS) << 12, -1, dtype=np.int16)
+    for uci, label in label2id.items():
+        table[encode_move(uci)] = label
+    return table
+
+
+def attacked(boards, squares):
+    """bool [M]: is squares[i] attacked by the opponent (negative pieces) on boards[i] ([M, 65])?"""
+    rows = np.arange(len(boards))[:, None]
+    hit = (boards[rows, KNIGHT_TARGETS[squares]] == -KNIGHT).any(axis=1)
+    hit |= (boards[rows, KING_TARGETS[squares]] == -KING).any(axis=1)
+    hit |= (boards[rows, PAWN_ATTACKERS[squares]] == -PAWN).any(axis=1)
+    # First piece along each of the 8 rays (0 if the ray is empty)
+    along = boards[rows[:, :, None], RAYS[squares]]
+    first = np.take_along_axis(along, (along != 0).argmax(axis=2)[:, :, None], axis=2)[:, :, 0]
+    return hit | _slider_attack(first).any(axis=1)
+
+
+def _slider_attack(pieces):
+    """bool [M, 8]: does the opponent piece seen along each ray attack back along it?"""
+    return (pieces == -QUEEN) | (pieces == np.where(ORTHOGONAL_RAY, -ROOK, -BISHOP))
+
+
+def pinned(boards, king_square):
+    """bool [N, 65]: own pieces pinned to the king (first piece along a ray, opponent slider behind)."""
+    rows = np.arange(len(boards))[:, None, None]
+    squares = RAYS[king_square]
+    along = boards[rows, squares]
+    occupied = along != 0
+    first = occupied.argmax(axis=2)[:, :, None]
+    behind = occupied & (np.arange(7) > first)
+    second = np.take_along_axis(along, behind.argmax(axis=2)[:, :, None], axis=2)[:, :, 0]
+    pin = (np.take_along_axis(along, first, axis=2)[:, :, 0] > 0) & behind.any(axis=2) & _slider_attack(second)
+    out = np.zeros((len(boards), 65), dtype=bool)
+    pin_rows, pin_rays = np.nonzero(pin)
+    out[pin_rows, squares[pin_rows, pin_rays, first[pin_rows, pin_rays, 0]]] = True
+    return out
+
+
+def parse_boards(fens, strict=True):
+    """FENs -> (boards int8 [N, 65], black bool [N], castling bool [N, 2], ep int64 [N], valid).
+
+    Boards are seen from the side to move (black rows mirrored, colors swapped); column
+    64 is the always-empty padding square. Castling rights are (king side, queen side)
+    of the side to move and ep is the mirrored en passant square (-1 if none).
+    """
+    # Move counters do not change the moves (and may exceed the encoder's 2/3 digit fields)
+    ids, valid = encode_fens([' '.join(fen.split(' ', 4)[:4]) + ' 0 1' for fen in fens], strict=strict)
+    chars = ID_TO_CHAR[ids[:, :SEQ_LEN - 1]]
+    black = chars[:, 64] == ord('b')
+    boards = np.zeros((len(fens), 65), dtype=np.int8)
+    white_view = PIECE_VALUE[chars[:, MIRROR]]  # FEN column of square s is s ^ 56
+    boards[:, :64] = np.where(black[:, None], -white_view[:, MIRROR], white_view)
+
+    rights = chars[:, 65:69]
+    castling = np.stack([
+        np.where(black, (rights == ord('k')).any(axis=1), (rights == ord('K')).any(axis=1)),
+        np.where(black, (rights == ord('q')).any(axis=1), (rights == ord('Q')).any(axis=1)),
+    ], axis=1)
+    has_ep = chars[:, 69] != ord('.')
+    ep = (chars[:, 69].astype(np.int64) - ord('a')) + 8 * (chars[:, 70].astype(np.int64) - ord('1'))
+    ep = np.where(has_ep, np.where(black, ep ^ 56, ep), -1)
+    return boards, black, castling, ep, valid
+
+
+def _pawn_moves(boards, ep):
+    """(row, from, to, promotion, en_passant) of all pseudo-legal pawn moves."""
+    rows, squares = np.nonzero(boards[:, :64] == PAWN)
+    files = squares % 8
+    candidates = []
+
+    def target(to, ok):
+        return np.where(ok & (to < 64), to, EMPTY)
+
+    push = target(squares + 8, True)
+    push_ok = (push < 64) & (boards[rows, push] == 0)
+    candidates.append((push_ok, push, False))
+    double = target(squares + 16, (squares >= 8) & (squares < 16))
+    candidates.append((push_ok & (double < 64) & (boards[rows, double] == 0), double, False))
+    for step, edge in ((7, files > 0), (9, files < 7)):
+        to = target(squares + step, edge)
+        captures = (to < 64) & (boards[rows, to] < 0)
+        en_passant = (to < 64) & (to == ep[rows]) & (squares >= 32) & (squares < 40) & (boards[rows, to] == 0)
+        candidates.append((captures, to, False))
+        candidates.append((en_passant, to, True))
+
+    parts = []
+    for ok, to, is_ep in candidates:
+        r, f, t = rows[ok], squares[ok], to[ok]
+        promoting = t >= 56
+        # A pawn reaching the last rank has one move per promotion piece (PROMOTIONS[1:])
+        for promotion in range(len(PROMOTIONS)):
+            keep = promoting if promotion else ~promoting
+            parts.append((r[keep], f[keep], t[keep], np.full(keep.sum(), promotion), np.full(keep.sum(), is_ep)))
+    return [np.concatenate(column) for column in zip(*parts)]
+
+
+def _piece_moves(boards):
+    """(row, from, to) of all pseudo-legal knight, bishop, rook, queen and king moves."""
+    rows, squares = np.nonzero(boards[:, :64] >= KNIGHT)
+    pieces = boards[rows, squares]
+    counts = MOVE_COUNT[pieces, squares]
+    ends = np.cumsum(counts)
+    entry = np.repeat(MOVE_OFFSET[pieces, squares] - ends + counts, counts) + np.arange(ends[-1] if len(ends) else 0)
+    rows, squares = np.repeat(rows, counts), np.repeat(squares, counts)
+    to = MOVE_TARGET[entry]
+    ok = (boards[rows, to] <= 0) & (boards[rows[:, None], MOVE_BETWEEN[entry]] == 0).all(axis=1)
+    return rows[ok], squares[ok], to[ok]
+
+
+def legal_moves(boards, castling, ep):
+    """(row, from, to, promotion) of all legal moves, in the side-to-move frame of the boards."""
+    king = boards[:, :64] == KING
+    king_square = np.where(king.any(axis=1), king.argmax(axis=1), EMPTY)
+    in_check = attacked(boards, king_square)
+
+    pawn_rows, pawn_from, pawn_to, promotion, en_passant = _pawn_moves(boards, ep)
+    piece_rows, piece_from, piece_to = _piece_moves(boards)
+    rows = np.concatenate([pawn_rows, piece_rows])
+    frm = np.concatenate([pawn_from, piece_from])
+    to = np.concatenate([pawn_to, piece_to])
+    promotion = np.concatenate([promotion, np.zeros(len(piece_rows), dtype=np.int64)])
+    en_passant = np.concatenate([en_passant, np.zeros(len(piece_rows), dtype=bool)])
+    king_move = boards[rows, frm] == KING
+
+    # Only these moves can leave the king attacked; play them on board copies and check
+    risky = np.flatnonzero(in_check[rows] | king_move | pinned(boards, king_square)[rows, frm] | en_passant)
+    after = boards[rows[risky]]
+    index = np.arange(len(risky))
+    after[index, to[risky]] = after[index, frm[risky]]
+    after[index, frm[risky]] = 0
+    ep_index = np.flatnonzero(en_passant[risky])
+    after[ep_index, to[risky][ep_index] - 8] = 0
+    king_after = np.where(king_move[risky], to[risky], king_square[rows[risky]])
+    legal = np.ones(len(rows), dtype=bool)
+    legal[risky] = ~attacked(after, king_after)
+
+    moves = [(rows[legal], frm[legal], to[legal], promotion[legal])]
+    for right, king_to, rook_square, empty, safe in CASTLING:
+        ok = castling[:, right] & (boards[:, 4] == KING) & (boards[:, rook_square] == ROOK) & ~in_check
+        ok &= (boards[:, empty] == 0).all(axis=1)
+        castle_rows = np.flatnonzero(ok)
+        for square in safe[1:]:
+            castle_rows = castle_rows[~attacked(boards[castle_rows], np.full(len(castle_rows), square))]
+        moves.append((castle_rows, np.full(len(castle_rows), 4), np.full(len(castle_rows), king_to),
+                      np.zeros(len(castle_rows), dtype=np.int64)))
+    return [np.concatenate(parts) for parts in zip(*moves)]
+
+
+class LegalMaskGenerator:
+    """[batch, num_labels] bool masks of the legal moves of FENs."""
+
+    def __init__(self, label2id=None, chunk_size=CHUNK_SIZE):
+        label2id = label2id if label2id is not None else load_label2id()
+        self.num_labels = len(label2id)
+        self.table = move_label_table(label2id)
+        self.chunk_size = chunk_size
+        self.unlabelled = 0  # legal moves without a label (not expected for ROOK-CLF)
+
+    def legal_labels(self, fens, strict=True):
+        """(row, label id) pairs of all legal moves."""
+        boards, black, castling, ep, _ = parse_boards(fens, strict=strict)
+        rows, frm, to, promotion = legal_moves(boards, castling, ep)
+        flip = np.where(black[rows], 56, 0)
+        labels = self.table[(frm ^ flip) | ((to ^ flip) << 6) | (promotion << 12)]
+        self.unlabelled += int((labels < 0).sum())
+        return rows[labels >= 0], labels[labels >= 0]
+
+    def masks(self, fens, out=None, strict=True):
+        """bool [len(fens), num_labels]; `out` (a preallocated mask buffer) is reused if given.
+
+        Rows of FENs that cannot be parsed stay all False with strict=False.
+        """
+        n = len(fens)
+        if out is None:
+            out = np.zeros((n, self.num_labels), dtype=np.bool_)
+        else:
+            out = out[:n]
+            out[:] = False
+        for start in range(0, n, self.chunk_size):
+            rows, labels = self.legal_labels(fens[start:start + self.chunk_size], strict=strict)
+            out[start + rows, labels] = True
+        return out
+
+
+def masked_logits(logits, mask):
+    """Logits with illegal labels set to the dtype minimum (argmax / top-k stay legal)."""
+    return np.where(mask, logits, np.finfo(logits.dtype).min)
+
+
+def reference_masks(fens, label2id):
+    """The per-move string lookup this module replaces."""
+    out = np.zeros((len(fens), len(label2id)), dtype=np.bool_)
+    for row, fen in enumerate(fens):
+        for move in chess.Board(fen).legal_moves:
+            label = label2id.get(move.uci())
+            if label is not None:
+                out[row, label] = True
+    return out
+
+
+def random_playout_fens(games, seed=0):
+    """Positions from random games: castling, en passant and promotions are rare in benchmarks."""
+    rng = random.Random(seed)
+    fens = []
+    for _ in range(games):
+        board = chess.Board()
+        while not board.is_game_over() and board.ply() < 300:
+            board.push(rng.choice(list(board.legal_moves)))
+            fens.append(board.fen())
+    return fens
+
+
+def benchmark(benchmark_dir='benchmarks', games=100):
+    fens = []
+    for path in benchmark_files(benchmark_dir):
+        with open(path, 'r') as f:
+            fens.extend(p["fen"] for p in json.load(f)["positions"])
+    if not fens:
+        raise SystemExit(f"No benchmark FENs found in {benchmark_dir}")
+    label2id = load_label2id()
+    generator = LegalMaskGenerator(label2id)
+
+    for name, batch in (("benchmark", fens), ("random-playout", random_playout_fens(games))):
+        start = time.perf_counter()
+        reference = reference_masks(batch, label2id)
+        reference_time = time.perf_counter() - start
+        generator.masks(batch[:generator.chunk_size])  # warm up
+        start = time.perf_counter()
+        masks = generator.masks(batch)
+        batched_time = time.perf_counter() - start
+
+        mismatched = np.flatnonzero((masks != reference).any(axis=1))
+        assert len(mismatched) == 0, f"{len(mismatched)} masks differ, first: {batch[mismatched[0]]}"
+        print(f"{len(batch)} {name} FENs: masks identical to legal_moves + uci() + label2id "
+              f"({masks.sum(axis=1).mean():.1f} legal labels on average)")
+        print(f"  python-chess: {reference_time * 1e6 / len(batch):.1f} us/FEN")
+        print(f"  batched:      {batched_time * 1e6 / len(batch):.1f} us/FEN ({reference_time / batched_time:.1f}x)")
+    if generator.unlabelled:
+        print(f"Warning: {generator.unlabelled} legal moves have no ROOK-CLF label")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched legal-move masks over ROOK-CLF labels")
+    parser.add_argument("fens", nargs="*", help="FENs to print legal labels for")
+    parser.add_argument("--benchmark", action="store_true", help="Check and time masks for all benchmark FENs")
+    parser.add_argument("--benchmark-dir", default="benchmarks")
+    parser.add_argument("--games", type=int, default=100, help="Random games added to --benchmark")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.benchmark_dir, args.games)
+    if args.fens:
+        label2id = load_label2id()
+        id2label = {v: k for k, v in label2id.items()}
+        masks = LegalMaskGenerator(label2id).masks(args.fens)
+        for fen, row in zip(args.fens, masks):
+            print(fen)
+            print("  " + " ".join(id2label[i] for i in np.flatnonzero(row)))
+
+
+if __name__ == "__main__":
+    main()
@@ -16,8 +16,13 @@ ort.env.webgpu.powerPreference = 'high-performance'; // Use dedicated GPU if ava
 
 // Model caching using IndexedDB
 const MODEL_CACHE_DB = 'rook-clf-cache';
-const MODEL_CACHE_VERSION = 1;
+const MODEL_CACHE_VERSION = 2;
 const MODEL_STORE = 'models';
+const CHUNK_STORE = 'chunks'; // sha256 -> chunk of a package written by package_chunks.py
+
+// Chunked model package (../rookworld-demo/scripts/package_chunks.py); used instead of the single blob if present
+const CHUNK_MANIFEST_PATH = './model/ROOK-CLF-9m-transformersjs/package/model.quant.manifest.json';
+const CHUNK_FETCH_CONCURRENCY = 6;
 
 // Shared state - accessible across all components
 let session = null;
@@ -65,7 +70,7 @@ async function getBestExecutionProvider() {
 }
 
 // Create session with fallback support
-async function createSessionWithFallback(modelData, executionProviders) {
+async function createSessionWithFallback(modelData, executionProviders, sessionOptions = {}) {
   let actualProvider = null;
   
   for (let i = 0; i < executionProviders.length; i++) {
@@ -74,7 +79,8 @@ async function createSessionWithFallback(modelData, executionProviders) {
       console.log(`Attempting to create session with: ${provider}`);
       const session = await ort.InferenceSession.create(modelData, {
         executionProviders: [provider],
-        graphOptimizationLevel: 'all'
+        graphOptimizationLevel: 'all',
+        ...sessionOptions
       });
       console.log(`✅ Successfully created session with: ${provider}`);
       
@@ -112,6 +118,9 @@ async function openModelCache() {
       if (!db.objectStoreNames.contains(MODEL_STORE)) {
         db.createObjectStore(MODEL_STORE);
       }
+      if (!db.objectStoreNames.contains(CHUNK_STORE)) {
+        db.createObjectStore(CHUNK_STORE);
+      }
     };
   });
 }
@@ -152,6 +161,100 @@ async function cacheModel(modelPath, modelData) {
   }
 }
 
+async function getCachedChunk(digest) {
+  try {
+    const db = await openModelCache();
+    const store = db.transaction(CHUNK_STORE, 'readonly').objectStore(CHUNK_STORE);
+    return await new Promise((resolve, reject) => {
+      const request = store.get(digest);
+      request.onerror = () => reject(request.error);
+      request.onsuccess = () => resolve(request.result);
+    });
+  } catch (error) {
+    console.log('Chunk cache access failed:', error);
+    return null;
+  }
+}
+
+async function cacheChunk(digest, data) {
+  try {
+    const db = await openModelCache();
+    const store = db.transaction(CHUNK_STORE, 'readwrite').objectStore(CHUNK_STORE);
+    await new Promise((resolve, reject) => {
+      const request = store.put(data, digest);
+      request.onerror = () => reject(request.error);
+      request.onsuccess = () => resolve();
+    });
+  } catch (error) {
+    console.log('Chunk cache write failed:', error);
+  }
+}
+
+async function sha256Hex(data) {
+  const hash = await crypto.subtle.digest('SHA-256', data);
+  return Array.from(new Uint8Array(hash), b => b.toString(16).padStart(2, '0')).join('');
+}
+
+// Assemble a chunked package: chunks are fetched in parallel, verified against their sha256 and kept in
+// IndexedDB by hash, so a new model version only downloads the chunks that changed.
+// Returns { graph, data, dataPath, manifest } for InferenceSession.create(graph, { externalData }).
+export async function loadChunkedModel(manifestPath, onProgress = null) {
+  const response = await fetch(manifestPath);
+  if (!response.ok) throw new Error(`Package manifest not found: ${manifestPath}`);
+  const manifest = await response.json();
+  const base = manifestPath.slice(0, manifestPath.lastIndexOf('/') + 1) + 'chunks/';
+  const verify = !!globalThis.crypto?.subtle; // not available outside secure contexts
+  if (!verify) console.warn('crypto.subtle unavailable: package chunks are not verified');
+
+  const parts = { graph: new Uint8Array(manifest.graph.size), data: new Uint8Array(manifest.data.size) };
+  const placements = new Map(); // sha256 -> { size, at: [[part, offset], ...] }
+  for (const part of ['graph', 'data']) {
+    for (const chunk of manifest[part].chunks) {
+      if (!placements.has(chunk.sha256)) placements.set(chunk.sha256, { size: chunk.size, at: [] });
+      placements.get(chunk.sha256).at.push([part, chunk.offset]);
+    }
+  }
+  const total = [...placements.values()].reduce((sum, p) => sum + p.size, 0);
+  const pending = [...placements.keys()];
+  let loaded = 0;
+  let fetched = 0;
+
+  async function worker() {
+    while (pending.length) {
+      const digest = pending.shift();
+      let data = await getCachedChunk(digest);
+      if (data) {
+        data = new Uint8Array(data);
+        if (verify && await sha256Hex(data) !== digest) data = null;
+      }
+      if (!data) {
+        const chunkResponse = await fetch(base + digest);
+        if (!chunkResponse.ok) throw new Error(`Chunk ${digest} failed to download (${chunkResponse.status})`);
+        data = new Uint8Array(await chunkResponse.arrayBuffer());
+        if (verify && await sha256Hex(data) !== digest) throw new Error(`Chunk ${digest} failed verification`);
+        await cacheChunk(digest, data.buffer);
+        fetched += data.length;
+      }
+      for (const [part, offset] of placements.get(digest).at) parts[part].set(data, offset);
+      loaded += data.length;
+      if (onProgress) onProgress(loaded, total, fetched);
+    }
+  }
+  await Promise.all(Array.from({ length: Math.min(CHUNK_FETCH_CONCURRENCY, pending.length) }, worker));
+  console.log(`Package ${manifest.name}: ${(fetched / 1e6).toFixed(1)} MB downloaded, ` +
+              `${((total - fetched) / 1e6).toFixed(1)} MB from cache`);
+  return { graph: parts.graph, data: parts.data, dataPath: manifest.data.path, manifest };
+}
+
+async function hasChunkedPackage() {
+  try {
+    const probe = await fetch(CHUNK_MANIFEST_PATH, { method: 'HEAD' });
+    return probe.ok;
+  } catch (e) {
+    return false;
+  }
+}
+
 // Load model configuration
 async function loadConfig() {
   const response = await fetch('./model/ROOK-CLF-9m-transformersjs/config.json');
@@ -417,11 +520,23 @@ async function loadModelInternal() {
       }
     }
     
+    // Chunked package of the quantized model: only chunks missing from the chunk store are downloaded
+    const packaged = modelPath.endsWith('model.quant.onnx') && await hasChunkedPackage();
+
     // Try to load from cache first
     updateProgress(25, 'Checking cache...', 'Looking for cached model');
-    let cachedModel = await getCachedModel(modelPath);
+    let cachedModel = packaged ? null : await getCachedModel(modelPath);
     
-    if (cachedModel) {
+    if (packaged) {
+      console.log('Loading chunked model package');
+      const pkg = await loadChunkedModel(CHUNK_MANIFEST_PATH, (loaded, total) => {
+        updateProgress(30 + (loaded / total) * 50, 'Loading model package...',
+                       `${(loaded / 1024 / 1024).toFixed(1)} MB / ${(total / 1024 / 1024).toFixed(1)} MB`);
+      });
+      updateProgress(90, 'Initializing model...', 'Creating inference session');
+      session = await createSessionWithFallback(pkg.graph, executionProviders,
+                                                { externalData: [{ path: pkg.dataPath, data: pkg.data }] });
+    } else if (cachedModel) {
       console.log('Loading model from cache');
       updateProgress(50, 'Loading from cache...', 'Found cached model, loading');
       session = await createSessionWithFallback(cachedModel, executionProviders);
@@ -494,8 +609,19 @@ async function loadModelInternal() {
   }
 }
 
-// Run inference on a FEN position
-export async function runInference(fen) {
+// legal_mask input of a --topk --legal-mask export: true for labels in legalMoves (UCI), all true if none given
+function legalMaskTensor(legalMoves, config) {
+  const numLabels = Object.keys(config.id2label).length;
+  const mask = new Uint8Array(numLabels).fill(legalMoves ? 0 : 1);
+  for (const move of legalMoves || []) {
+    const id = config.label2id?.[move];
+    if (id !== undefined) mask[id] = 1;
+  }
+  return new ort.Tensor('bool', mask, [1, numLabels]);
+}
+
+// Run inference on a FEN position (legalMoves is only used by exports with a legal_mask input)
+export async function runInference(fen, legalMoves = null) {
   const { session, tokenizerData, config } = await ensureModelLoaded();
   
   const vocab = tokenizerData.model?.vocab || {};
@@ -517,11 +643,26 @@ export async function runInference(fen) {
   console.log('Tensor types - input:', inputIds.type, 'attention:', attentionMask.type);
   
   // Run inference
-  const results = await session.run({
+  const feeds = {
     input_ids: inputIds,
     attention_mask: attentionMask
-  });
-  
+  };
+  if (session.inputNames.includes('legal_mask')) {
+    feeds.legal_mask = legalMaskTensor(legalMoves, config);
+  }
+  const results = await session.run(feeds);
+
+  // Fused softmax + TopK export: ids come sorted by probability, masked labels have probability 0
+  if (results.top_ids && results.top_probs) {
+    const predictions = [];
+    for (let i = 0; i < results.top_ids.data.length; i++) {
+      const score = results.top_probs.data[i];
+      if (score <= 0) break;
+      predictions.push({ label: config.id2label[Number(results.top_ids.data[i])], score });
+    }
+    return predictions;
+  }
+
   // Process results
   const logitsOutput = results.logits || results.output || results[Object.keys(results)[0]];
   const logits = Array.from(logitsOutput.data);
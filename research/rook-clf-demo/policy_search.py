@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Batched shallow search on top of the ROOK-CLF policy.
+
+ROOK-CLF is normally used as a one-shot policy: argmax over the legal labels of a single
+position. At 9M parameters and a fixed 78-token input it is cheap to evaluate hundreds
+of positions per call, so this runs a policy-pruned minimax (beam search) instead:
+
+  ply 0   the root positions are evaluated; the argmax legal move is the baseline
+  ply d   every non-terminal node of the frontier keeps its widths[d] most probable
+          legal moves, children are played with python-chess
+
+Frontiers are searched level by level for a whole batch of roots at once. Each level
+encodes all frontier FENs (fen_encoder), builds their legal masks (legal_masks) and
+runs one batched ONNX call through IOBindingClassifier. Nodes at the last ply are
+leaves and need no network call.
+
+ROOK-CLF has no value head, so leaves are scored statically from the side to move:
+material plus the best capture that does not lose the capturing piece (a one-move
+exchange estimate), mate = MATE - ply, stalemate / draw = 0. Values are backed up with
+negamax over the expanded children; the root move with the best value wins, ties go
+to the higher policy probability.
+
+With an EvalCache (eval_cache.py, --cache / --cache-size) positions already evaluated
+in this or an earlier run (transpositions, shared puzzle lines) skip the network. Entries
+hold the top max(widths) moves, so a persisted cache is tagged with that width too and
+only reused by runs with the same maximum width.
+
+Budgets: node_budget caps the nodes created per root (the widths of later plies are
+cut when a root runs out), time_budget (seconds per root) stops deepening after the
+current level once exceeded. The baseline is always available.
+
+`--benchmark` reports nodes/s, network evaluations/s and top-1 accuracy of the
+baseline and the search on a benchmark file, split by puzzle rating.
+
+Usage
+  python policy_search.py --fen "<fen>" --widths 8,4,4
+  python policy_search.py --benchmark benchmarks/lichess_puzzles.json --limit 500 \
+      --widths 8,4,4 --node-budget 200 --time-budget 0.5
+"""
+
+import argparse
+import json
+import time
+from collections import defaultdict
+
+import chess
+import numpy as np
+
+from eval_cache import EvalCache, model_tag
+from fen_encoder import MODEL_DIR, encode_fens
+from iobinding_classifier import MODEL_PATH, IOBindingClassifier
+from legal_masks import LegalMaskGenerator, masked_logits
+
+MATE = 1000
+PIECE_VALUES = {chess.PAWN: 1, chess.KNIGHT: 3, chess.BISHOP: 3, chess.ROOK: 5, chess.QUEEN: 9, chess.KING: 0}
+RATING_BUCKETS = (1200, 1600, 2000, 2400)
+
+
+def encodable_fen(board):
+    """FEN with the move counters clamped to the ROOK-CLF fields (2 and 3 digits)."""
+    fen = board.fen()
+    if board.halfmove_clock <= 99 and board.fullmove_number <= 999:
+        return fen
+    return ' '.join(fen.split(' ')[:4] + [str(min(board.halfmove_clock, 99)), str(min(board.fullmove_number, 999))])
+
+
+def material(board):
+    """Material balance from the side to move."""
+    score = 0
+    for piece_type, value in PIECE_VALUES.items():
+        score += value * (len(board.pieces(piece_type, board.turn)) - len(board.pieces(piece_type, not board.turn)))
+    return score
+
+
+def leaf_value(board):
+    """Material plus the best capture available that does not hang the capturing piece."""
+    gain = 0
+    for move in board.generate_legal_captures():
+        captured = board.piece_type_at(move.to_square) or chess.PAWN  # en passant
+        risk = PIECE_VALUES[board.piece_type_at(move.from_square)] if board.is_attacked_by(
+            not board.turn, move.to_square) else 0
+        gain = max(gain, PIECE_VALUES[captured] - risk)
+    return material(board) + gain
+
+
+class Node:
+    __slots__ = ("board", "root", "ply", "move", "prior", "children", "terminal")
+
+    def __init__(self, board, root, ply=0, move=None, prior=1.0):
+        self.board = board
+        self.root = root
+        self.ply = ply
+        self.move = move
+        self.prior = prior
+        self.children = []
+        outcome = board.outcome()
+        # Value of finished games from the side to move (faster mates score higher)
+        self.terminal = None if outcome is None else (
+            -(MATE - ply) if outcome.termination == chess.Termination.CHECKMATE else 0)
+
+    def value(self):
+        if self.terminal is not None:
+            return self.terminal
+        if not self.children:
+            return leaf_value(self.board)
+        return max(-child.value() for child in self.children)
+
+
+class PolicySearch:
+    """Policy-pruned minimax over batches of positions with one ONNX call per search level."""
+
+    def __init__(self, model_path=MODEL_PATH, widths=(8, 4, 4), node_budget=None, time_budget=None,
+                 max_batch=1024, cache=None):
+        with open(MODEL_DIR / 'config.json', 'r') as f:
+            config = json.load(f)
+        self.labels = [chess.Move.from_uci(config["id2label"][str(i)]) for i in range(len(config["id2label"]))]
+        self.legal = LegalMaskGenerator(config["label2id"])
+        self.classifier = IOBindingClassifier(model_path, max_batch=max_batch)
+        self.widths = tuple(widths)
+        self.node_budget = node_budget
+        self.time_budget = time_budget
+        # EvalCache of top-max(widths) (label, probability) lists, shared by all widths
+        self.cache = cache
+        self.stats = defaultdict(float)
+
+    def priors(self, boards, width):
+        """Top `width` legal (move, probability) pairs per board; cache misses share one batched evaluation."""
+        results = [None] * len(boards)
+        keys = [self.cache.key(board) for board in boards] if self.cache is not None else None
+        if keys:
+            results = [self.cache.get(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            evaluated = self.evaluate([boards[i] for i in missing], max(self.widths) if keys else width)
+            for i, result in zip(missing, evaluated):
+                results[i] = result
+                if keys:
+                    self.cache.put(keys[i], result)
+        return [[(self.labels[label], prob) for label, prob in result[:width]] for result in results]
+
+    def evaluate(self, boards, width):
+        """Top `width` legal [label id, probability] pairs per board, from one batched ONNX call."""
+        fens = [encodable_fen(board) for board in boards]
+        legal = self.legal.masks(fens)
+        input_ids = encode_fens(fens)[0]
+        start = time.perf_counter()
+        if self.classifier.topk:
+            top_ids, top_probs = self.classifier.predict(input_ids, legal)
+            top_ids, top_probs = top_ids[:, :width], top_probs[:, :width]
+        else:
+            logits = masked_logits(self.classifier.predict(input_ids, legal), legal)
+            top_ids = np.argsort(-logits, axis=-1)[:, :width]
+            top = np.take_along_axis(logits, top_ids, axis=-1)
+            probs = np.exp(logits - logits.max(axis=-1, keepdims=True))
+            top_probs = np.exp(top - logits.max(axis=-1, keepdims=True)) / probs.sum(axis=-1, keepdims=True)
+        self.stats["model_seconds"] += time.perf_counter() - start
+        self.stats["evaluations"] += len(boards)
+        self.stats["batches"] += 1
+        rows = np.take_along_axis(legal, top_ids, axis=-1)  # fewer legal moves than width
+        return [[[int(label), float(prob)] for label, prob, ok in zip(ids, probs, keep) if ok]
+                for ids, probs, keep in zip(top_ids, top_probs, rows)]
+
+    def search(self, fens):
+        """Search a batch of FENs; returns one dict per FEN (baseline, move, value, nodes, ...)."""
+        start = time.perf_counter()
+        deadline = start + self.time_budget * len(fens) if self.time_budget else None
+        roots = [Node(chess.Board(fen), root) for root, fen in enumerate(fens)]
+        nodes = [1] * len(roots)
+        baselines = [None] * len(roots)
+        frontier = roots
+        depth = 0
+        for ply, width in enumerate(self.widths):
+            if ply and deadline and time.perf_counter() > deadline:
+                break
+            expand = [node for node in frontier if node.terminal is None]
+            if self.node_budget:
+                expand = [node for node in expand if nodes[node.root] < self.node_budget]
+            if not expand:
+                break
+            next_frontier = []
+            for node, moves in zip(expand, self.priors([node.board for node in expand], width)):
+                if ply == 0:
+                    baselines[node.root] = moves[0][0] if moves else None
+                if self.node_budget:
+                    moves = moves[:max(self.node_budget - nodes[node.root], 0)]
+                for move, prior in moves:
+                    board = node.board.copy(stack=False)
+                    board.push(move)
+                    node.children.append(Node(board, node.root, ply + 1, move, prior))
+                nodes[node.root] += len(moves)
+                next_frontier.extend(node.children)
+            frontier = next_frontier
+            depth = ply + 1
+
+        results = []
+        for root, baseline in zip(roots, baselines):
+            best, value = baseline, None
+            if root.children:
+                scored = [(-child.value(), child.prior, child.move) for child in root.children]
+                value, _, best = max(scored, key=lambda s: (s[0], s[1]))
+            results.append({
+                "fen": root.board.fen(),
+                "baseline": baseline.uci() if baseline else None,
+                "move": best.uci() if best else None,
+                "value": value,
+                "nodes": nodes[root.root],
+                "depth": depth,
+            })
+        self.stats["nodes"] += sum(nodes)
+        self.stats["positions"] += len(fens)
+        self.stats["seconds"] += time.perf_counter() - start
+        return results
+
+
+RATING_LABELS = [f"<{RATING_BUCKETS[0]}"] + [f"{low}-{high - 1}" for low, high in zip(RATING_BUCKETS, RATING_BUCKETS[1:])] \
+    + [f">={RATING_BUCKETS[-1]}"]
+
+
+def rating_bucket(rating):
+    if rating is None:
+        return "unrated"
+    return RATING_LABELS[int(np.searchsorted(RATING_BUCKETS, rating, side='right'))]
+
+
+def benchmark(searcher, path, limit=None, roots_per_batch=64):
+    with open(path, 'r') as f:
+        positions = json.load(f)["positions"][:limit]
+    results = []
+    for start in range(0, len(positions), roots_per_batch):
+        results.extend(searcher.search([p["fen"] for p in positions[start:start + roots_per_batch]]))
+
+    buckets = defaultdict(lambda: [0, 0, 0])
+    for position, result in zip(positions, results):
+        for key in ("all", rating_bucket(position.get("metadata", {}).get("rating"))):
+            buckets[key][0] += 1
+            buckets[key][1] += result["baseline"] == position["correct_move"]
+            buckets[key][2] += result["move"] == position["correct_move"]
+
+    stats = searcher.stats
+    print(f"{len(positions)} positions from {path}, widths {','.join(map(str, searcher.widths))}, "
+          f"node budget {searcher.node_budget or '-'}, time budget {searcher.time_budget or '-'} s/position")
+    print(f"  {stats['nodes'] / stats['seconds']:.0f} nodes/s, {stats['evaluations'] / stats['seconds']:.0f} "
+          f"network evaluations/s ({stats['evaluations'] / max(stats['batches'], 1):.0f} per ONNX batch, "
+          f"{100 * stats['model_seconds'] / stats['seconds']:.0f}% of time in the model), "
+          f"{stats['positions'] / stats['seconds']:.1f} positions/s")
+    print(f"  {'rating':>10} {'count':>6} {'baseline':>9} {'search':>9}")
+    for key in [k for k in ["all", *RATING_LABELS, "unrated"] if k in buckets]:
+        count, baseline, searched = buckets[key]
+        print(f"  {key:>10} {count:6d} {100 * baseline / count:8.1f}% {100 * searched / count:8.1f}%")
+    changed = sum(r["baseline"] != r["move"] for r in results)
+    print(f"  search changed the baseline move in {changed} positions")
+    if searcher.cache is not None:
+        cache = searcher.cache.stats()
+        print(f"  cache: {cache['hits']} hits, {cache['misses']} misses ({100 * cache['hit_rate']:.1f}%), "
+              f"{cache['entries']} entries, {cache['evictions']} evictions")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched shallow search on the ROOK-CLF policy")
+    parser.add_argument("--model", default=str(MODEL_PATH))
+    parser.add_argument("--fen", action="append", default=[], help="FEN(s) to search")
+    parser.add_argument("--benchmark", default=None, help="Benchmark JSON to evaluate against the baseline")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--widths", default="8,4,4", help="Moves kept per ply (number of entries = depth)")
+    parser.add_argument("--node-budget", type=int, default=None, help="Max nodes per root position")
+    parser.add_argument("--time-budget", type=float, default=None, help="Seconds per root position")
+    parser.add_argument("--roots-per-batch", type=int, default=64, help="Root positions searched together")
+    parser.add_argument("--max-batch", type=int, default=1024, help="Rows per ONNX call")
+    parser.add_argument("--cache", default=None, help="Persist classifier results in this EvalCache file")
+    parser.add_argument("--cache-size", type=int, default=0, help="In-memory EvalCache entries (0 = no cache)")
+    parser.add_argument("--cache-counters", action="store_true",
+                        help="Key the cache on move counters too (ROOK-CLF sees them)")
+    args = parser.parse_args()
+
+    widths = [int(w) for w in args.widths.split(',')]
+    cache = None
+    if args.cache or args.cache_size:
+        cache = EvalCache(args.cache_size or 1_000_000, ignore_counters=not args.cache_counters,
+                          tag=f"{model_tag(args.model)}:top{max(widths)}")
+        if args.cache:
+            print(f"Loaded {cache.load(args.cache)} cached evaluations from {args.cache}")
+    searcher = PolicySearch(args.model, widths, args.node_budget,
+                            args.time_budget, args.max_batch, cache)
+    if args.benchmark:
+        benchmark(searcher, args.benchmark, args.limit, args.roots_per_batch)
+    elif args.fen:
+        for result in searcher.search(args.fen):
+            print(f"{result['fen']}\n  baseline {result['baseline']}, search {result['move']} "
+                  f"(value {result['value']}, {result['nodes']} nodes, depth {result['depth']})")
+    else:
+        parser.error("give --fen or --benchmark")
+    if args.cache:
+        cache.save(args.cache)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+On-disk position index over all benchmark files, keyed by Zobrist hash.
+
+The benchmark JSONs overlap and answering "is this position in any benchmark?" or
+"what is the correct move here?" used to mean loading and scanning every file. This
+builds a single open-addressing hash table (linear probing, power-of-two capacity)
+of fixed 16-byte records and stores it in benchmarks/position_index.bin. Lookups
+memory-map the table and touch one or two records, so they are O(1) and cheap even
+from short-lived processes.
+
+Keys are Polyglot Zobrist hashes (python-chess), which cover pieces, side to move,
+castling rights and legal en passant squares, but not the halfmove/fullmove counters.
+The same position reached by different move orders or at a different move number
+therefore maps to the same key.
+
+Record layout (little endian):
+  key      uint64  Zobrist hash
+  move     uint16  correct move, from | to << 6 | promotion << 12
+  bench    uint8   benchmark id (255 = empty slot)
+  flags    uint8   FLAG_DUPLICATE / FLAG_CONFLICT
+  offset   uint32  index into the benchmark's "positions" array (metadata lookup)
+
+A key can be stored several times (once per occurrence); all occurrences lie on the
+same probe sequence. FLAG_DUPLICATE marks every occurrence after the first one in
+build order, so consumers can dedup across benchmarks by skipping flagged records.
+
+Usage
+  python position_index.py build                      # index benchmarks/*.json
+  python position_index.py lookup "<fen>"             # benchmarks + correct moves
+  python position_index.py dedup                      # overlap report
+"""
+
+import argparse
+import json
+from collections import Counter, defaultdict
+from pathlib import Path
+
+import chess
+import chess.polyglot
+import numpy as np
+
+INDEX_PATH = Path('benchmarks/position_index.bin')
+BENCHMARK_DIR = Path('benchmarks')
+MAGIC = b'ROOKPIX1'
+HEADER_ALIGN = 64
+EMPTY = 255
+
+FLAG_DUPLICATE = 1  # key already indexed earlier (same or other benchmark)
+FLAG_CONFLICT = 2   # key indexed elsewhere with a different correct move
+
+RECORD_DTYPE = np.dtype([
+    ("key", "<u8"),
+    ("move", "<u2"),
+    ("bench", "u1"),
+    ("flags", "u1"),
+    ("offset", "<u4"),
+])
+
+PROMOTIONS = [None, chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN]
+
+
+def position_key(fen):
+    """Zobrist key of a FEN, ignoring the move counters."""
+    return chess.polyglot.zobrist_hash(chess.Board(fen))
+
+
+def encode_move(uci):
+    move = chess.Move.from_uci(uci)
+    return move.from_square | (move.to_square << 6) | (PROMOTIONS.index(move.promotion) << 12)
+
+
+def decode_move(code):
+    code = int(code)
+    return chess.Move(code & 63, (code >> 6) & 63, PROMOTIONS[(code >> 12) & 7]).uci()
+
+
+def benchmark_files(benchmark_dir=BENCHMARK_DIR):
+    """Benchmark JSON files in a stable order (sorted by name, manifest excluded)."""
+    return [p for p in sorted(Path(benchmark_dir).glob('*.json')) if p.name != 'manifest.json']
+
+
+def build_index(files=None, output=INDEX_PATH, load_factor=0.5):
+    """Build the hash table from benchmark files and write it to `output`."""
+    files = benchmark_files() if files is None else [Path(f) for f in files]
+    if len(files) >= EMPTY:
+        raise ValueError(f"At most {EMPTY - 1} benchmark files can be indexed")
+
+    entries = []
+    first_move = {}
+    for bench_id, path in enumerate(files):
+        with open(path, 'r') as f:
+            positions = json.load(f)["positions"]
+        for offset, position in enumerate(positions):
+            try:
+                key = position_key(position["fen"])
+                move = encode_move(position["correct_move"])
+            except ValueError as e:
+                print(f"Skipping {path.name}[{offset}]: {e}")
+                continue
+            flags = 0
+            if key in first_move:
+                flags |= FLAG_DUPLICATE
+                if first_move[key] != move:
+                    flags |= FLAG_CONFLICT
+            else:
+                first_move[key] = move
+            entries.append((key, move, bench_id, flags, offset))
+
+    capacity = 1
+    while capacity * load_factor < max(len(entries), 1):
+        capacity <<= 1
+    mask = capacity - 1
+
+    table = np.zeros(capacity, dtype=RECORD_DTYPE)
+    table["bench"] = EMPTY
+    occupied = np.zeros(capacity, dtype=bool)
+    for key, move, bench_id, flags, offset in entries:
+        slot = key & mask
+        while occupied[slot]:
+            slot = (slot + 1) & mask
+        occupied[slot] = True
+        table[slot] = (key, move, bench_id, flags, offset)
+
+    header = {
+        "version": 1,
+        "capacity": capacity,
+        "count": len(entries),
+        "unique_positions": len(first_move),
+        "benchmarks": [str(p) for p in files],
+        "key": "polyglot_zobrist",
+    }
+    header_bytes = json.dumps(header).encode()
+    data_offset = -(-(len(MAGIC) + 4 + len(header_bytes)) // HEADER_ALIGN) * HEADER_ALIGN
+
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(header_bytes).to_bytes(4, 'little'))
+        f.write(header_bytes)
+        f.write(b'\0' * (data_offset - f.tell()))
+        f.write(table.tobytes())
+
+    print(f"Indexed {len(entries)} positions ({len(first_move)} unique) from {len(files)} benchmarks -> {output}")
+    return header
+
+
+class PositionIndex:
+    """Memory-mapped, read-only view of a position index file."""
+
+    def __init__(self, path=INDEX_PATH):
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a position index")
+            header_len = int.from_bytes(f.read(4), 'little')
+            self.header = json.loads(f.read(header_len))
+        data_offset = -(-(len(MAGIC) + 4 + header_len) // HEADER_ALIGN) * HEADER_ALIGN
+        self.table = np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=data_offset,
+                               shape=(self.header["capacity"],))
+        self.mask = self.header["capacity"] - 1
+        self.benchmarks = self.header["benchmarks"]
+        self._positions = {}
+
+    def __len__(self):
+        return self.header["count"]
+
+    def _probe(self, key):
+        slot = key & self.mask
+        while True:
+            record = self.table[slot]
+            if record["bench"] == EMPTY:
+                return
+            if int(record["key"]) == key:
+                yield record
+            slot = (slot + 1) & self.mask
+
+    def lookup(self, fen, include_duplicates=True):
+        """All benchmark occurrences of a position as dicts."""
+        key = position_key(fen) if isinstance(fen, str) else int(fen)
+        hits = []
+        for record in self._probe(key):
+            if not include_duplicates and record["flags"] & FLAG_DUPLICATE:
+                continue
+            hits.append({
+                "benchmark": self.benchmarks[record["bench"]],
+                "correct_move": decode_move(record["move"]),
+                "offset": int(record["offset"]),
+                "duplicate": bool(record["flags"] & FLAG_DUPLICATE),
+                "conflict": bool(record["flags"] & FLAG_CONFLICT),
+            })
+        return hits
+
+    def __contains__(self, fen):
+        key = position_key(fen) if isinstance(fen, str) else int(fen)
+        return next(self._probe(key), None) is not None
+
+    def correct_moves(self, fen):
+        """Distinct correct moves recorded for a position, in build order."""
+        return list(dict.fromkeys(hit["correct_move"] for hit in self.lookup(fen)))
+
+    def metadata(self, hit):
+        """Full benchmark entry for a lookup hit (loads that benchmark file once)."""
+        name = hit["benchmark"]
+        if name not in self._positions:
+            with open(name, 'r') as f:
+                self._positions[name] = json.load(f)["positions"]
+        return self._positions[name][hit["offset"]]
+
+    def records(self):
+        """All occupied records (numpy structured array)."""
+        return self.table[self.table["bench"] != EMPTY]
+
+
+def update_position_index(output=INDEX_PATH):
+    """Rebuild the index after a converter wrote a benchmark file."""
+    return build_index(output=output)
+
+
+def dedup_report(index):
+    records = index.records()
+    per_bench = Counter(records["bench"].tolist())
+    dup_bench = Counter(records["bench"][(records["flags"] & FLAG_DUPLICATE) != 0].tolist())
+    print(f"{len(records)} indexed positions, {index.header['unique_positions']} unique")
+    for bench_id, name in enumerate(index.benchmarks):
+        print(f"  {name}: {per_bench.get(bench_id, 0)} positions, {dup_bench.get(bench_id, 0)} already seen earlier")
+
+    # Overlap between benchmark pairs
+    keys_by_bench = defaultdict(set)
+    for key, bench_id in zip(records["key"].tolist(), records["bench"].tolist()):
+        keys_by_bench[bench_id].add(key)
+    for a in range(len(index.benchmarks)):
+        for b in range(a + 1, len(index.benchmarks)):
+            shared = len(keys_by_bench[a] & keys_by_bench[b])
+            if shared:
+                print(f"  overlap {Path(index.benchmarks[a]).stem} / {Path(index.benchmarks[b]).stem}: {shared}")
+    conflicts = int(((records["flags"] & FLAG_CONFLICT) != 0).sum())
+    print(f"  {conflicts} occurrences disagree with the first recorded correct move")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Zobrist-keyed position index over benchmark files")
+    parser.add_argument("--index", default=str(INDEX_PATH), help="Index file path")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="Index benchmark JSON files")
+    build.add_argument("files", nargs="*", help="Benchmark files (default: benchmarks/*.json)")
+
+    lookup = sub.add_parser("lookup", help="Look up a FEN")
+    lookup.add_argument("fen")
+    lookup.add_argument("--metadata", action="store_true", help="Print the full benchmark entries")
+
+    sub.add_parser("dedup", help="Report duplicates and overlap between benchmarks")
+
+    args = parser.parse_args()
+    if args.command == "build":
+        build_index(args.files or None, output=args.index)
+        return
+
+    index = PositionIndex(args.index)
+    if args.command == "lookup":
+        hits = index.lookup(args.fen)
+        if not hits:
+            print("Position not found in any benchmark")
+        for hit in hits:
+            print(f"{hit['benchmark']}[{hit['offset']}]: {hit['correct_move']}"
+                  + (" (duplicate)" if hit["duplicate"] else ""))
+            if args.metadata:
+                print(json.dumps(index.metadata(hit), indent=2))
+    else:
+        dedup_report(index)
+
+
+if __name__ == "__main__":
+    main()
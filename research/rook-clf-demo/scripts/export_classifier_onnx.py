@@ -5,6 +5,15 @@ Export ROOK-CLF to ONNX (classifier-only) with optional int32 inputs for WebGPU.
 Outputs:
  - logits: [batch, num_labels]
 
+or, with --topk K (softmax + TopK computed inside the graph):
+ - top_ids:   [batch, K] int64 label ids, most probable first
+ - top_probs: [batch, K] float probabilities
+
+--legal-mask adds a `legal_mask` input ([batch, num_labels] bool, True = legal). Masked
+labels get the lowest float logit before the softmax, so top_probs are renormalized over
+the legal moves. Consumers then receive a few values per position instead of 1968 logits
+and no longer sort or filter in JS/Python.
+
 This preserves the original forward pass (no attentions/hidden states) for efficiency.
 
 Usage
@@ -13,6 +22,12 @@ Usage
       --output ./ROOK-CLF-9m-webgpu.onnx \
       --seq-len 78 \
       --int32-inputs
+
+  python export_classifier_onnx.py --model jrahn/ROOK-CLF-9m \
+      --output ./ROOK-CLF-9m-top5.onnx --topk 5 --legal-mask
+
+--validate compares the export with the PyTorch model afterwards (validate_exports.py:
+max deviation, top-1 agreement, accuracy, latency) and exits non-zero if parity drops.
 """
 
 import argparse
@@ -21,6 +36,25 @@ from pathlib import Path
 import torch
 from transformers import AutoConfig, AutoModelForSequenceClassification
 
+from validate_exports import add_validation_arguments, validate
+
+
+class MaskedTopK(torch.nn.Module):
+    """Classifier logits -> (optionally legal-masked) softmax -> top-k label ids and probabilities."""
+
+    def __init__(self, core, k):
+        super().__init__()
+        self.core = core
+        self.k = k
+
+    def forward(self, input_ids, attention_mask, legal_mask=None):
+        logits = self.core(input_ids, attention_mask)
+        if legal_mask is not None:
+            logits = logits.masked_fill(~legal_mask.to(torch.bool), torch.finfo(logits.dtype).min)
+        probs = torch.softmax(logits, dim=-1)
+        top_probs, top_ids = torch.topk(probs, self.k, dim=-1)
+        return top_ids, top_probs
+
 
 def main():
     parser = argparse.ArgumentParser()
@@ -29,7 +63,14 @@ def main():
     parser.add_argument("--seq-len", type=int, default=78, help="Sequence length (e.g., 78 for ROOK-CLF)")
     parser.add_argument("--opset", type=int, default=17, help="ONNX opset version")
     parser.add_argument("--int32-inputs", action="store_true", help="Export with int32 inputs (cast to int64 internally)")
+    parser.add_argument("--topk", type=int, default=0, help="Return top-k label ids/probabilities instead of logits")
+    parser.add_argument("--legal-mask", action="store_true", help="Add a legal_mask [batch, num_labels] bool input (needs --topk)")
+    parser.add_argument("--validate", action="store_true",
+                        help="Compare the export with the PyTorch model on a benchmark sample (validate_exports.py)")
+    add_validation_arguments(parser)
     args = parser.parse_args()
+    if args.legal_mask and not args.topk:
+        parser.error("--legal-mask requires --topk")
 
     print(f"Loading model: {args.model}")
     config = AutoConfig.from_pretrained(args.model)
@@ -71,24 +112,46 @@ def main():
 
     export_module = CastInputsWrapper(core) if args.int32_inputs else core
 
+    inputs = (ids, mask)
+    input_names = ["input_ids", "attention_mask"]
+    output_names = ["logits"]
+    dynamic_axes = {
+        "input_ids": {0: "batch", 1: "sequence"},
+        "attention_mask": {0: "batch", 1: "sequence"},
+        "logits": {0: "batch"}
+    }
+    if args.topk:
+        export_module = MaskedTopK(export_module, args.topk)
+        output_names = ["top_ids", "top_probs"]
+        dynamic_axes.pop("logits")
+        dynamic_axes["top_ids"] = {0: "batch"}
+        dynamic_axes["top_probs"] = {0: "batch"}
+        if args.legal_mask:
+            inputs = inputs + (torch.ones((batch, config.num_labels), dtype=torch.bool),)
+            input_names.append("legal_mask")
+            dynamic_axes["legal_mask"] = {0: "batch"}
+
     Path(args.output).parent.mkdir(parents=True, exist_ok=True)
     print(f"Exporting to ONNX: {args.output}")
     torch.onnx.export(
         export_module,
-        (ids, mask),
+        inputs,
         args.output,
-        input_names=["input_ids", "attention_mask"],
-        output_names=["logits"],
-        dynamic_axes={
-            "input_ids": {0: "batch", 1: "sequence"},
-            "attention_mask": {0: "batch", 1: "sequence"},
-            "logits": {0: "batch"}
-        },
+        input_names=input_names,
+        output_names=output_names,
+        dynamic_axes=dynamic_axes,
         do_constant_folding=True,
         opset_version=args.opset,
     )
     print("Done.")
 
+    if args.validate:
+        ok = validate(args.model, [args.output], args.benchmark, args.limit, min_agreement=args.min_agreement,
+                      max_accuracy_drop=args.max_accuracy_drop, max_deviation=args.max_deviation,
+                      report=args.report)
+        if not ok:
+            raise SystemExit("Export validation failed")
+
 
 if __name__ == "__main__":
     main()
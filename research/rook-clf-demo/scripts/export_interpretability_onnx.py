@@ -23,6 +23,8 @@ Usage
 
 Or from a local checkpoint directory:
   python export_interpretability_onnx.py --model /path/to/checkpoint --output ./out.onnx
+
+Add --validate to check the logits output against the PyTorch model (validate_exports.py).
 """
 
 import argparse
@@ -31,6 +33,8 @@ from pathlib import Path
 import torch
 from transformers import AutoConfig, AutoModelForSequenceClassification, AutoTokenizer
 
+from validate_exports import add_validation_arguments, validate
+
 
 class InterpretabilityWrapper(torch.nn.Module):
     """Wraps a HF classifier to expose logits, decision token hidden state,
@@ -82,6 +86,9 @@ def main():
     parser.add_argument("--seq-len", type=int, default=78, help="Sequence length (e.g., 78 for ROOK-CLF)")
     parser.add_argument("--opset", type=int, default=15, help="ONNX opset version")
     parser.add_argument("--int32-inputs", action="store_true", help="Export with int32 inputs (cast to int64 internally)")
+    parser.add_argument("--validate", action="store_true",
+                        help="Compare the export with the PyTorch model on a benchmark sample (validate_exports.py)")
+    add_validation_arguments(parser)
     args = parser.parse_args()
 
     print(f"Loading model: {args.model}")
@@ -161,6 +168,13 @@ def main():
     for name in output_names:
         print(" -", name)
 
+    if args.validate:
+        ok = validate(args.model, [args.output], args.benchmark, args.limit, min_agreement=args.min_agreement,
+                      max_accuracy_drop=args.max_accuracy_drop, max_deviation=args.max_deviation,
+                      report=args.report)
+        if not ok:
+            raise SystemExit("Export validation failed")
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Validate ROOK-CLF ONNX exports against the PyTorch model on a fixed benchmark sample.
+
+Every variant (plain logits, --int32-inputs, --topk / --legal-mask, interpretability and
+quantized exports) is run on the first --limit positions of a benchmark file next to
+the PyTorch classifier, and reported side by side:
+
+  max_dev     max |logit difference| (logits exports) or max |probability difference|
+              at the returned ids (--topk exports) vs. PyTorch
+  top1        share of positions where the variant's best label equals PyTorch's
+  accuracy    best label == correct_move
+  latency     median batch-1 call in ms
+
+Exports with a legal_mask input get the legal masks of the positions, and are compared
+against the equally masked PyTorch logits. A variant fails if its top-1 agreement is
+below --min-agreement, its accuracy drops more than --max-accuracy-drop points below
+(masked) PyTorch, or (if given) its deviation exceeds --max-deviation; the script then exits
+with status 1. export_classifier_onnx.py and export_interpretability_onnx.py call
+validate() after exporting when run with --validate.
+
+Usage
+  python scripts/validate_exports.py --model jrahn/ROOK-CLF-9m \
+      --variant ./ROOK-CLF-9m.onnx --variant model/ROOK-CLF-9m-transformersjs/model.quant.onnx \
+      --benchmark benchmarks/lichess_puzzles.json --limit 500 --report validation.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+ORT_TO_NUMPY = {"tensor(int64)": np.int64, "tensor(int32)": np.int32, "tensor(bool)": np.bool_}
+
+
+def load_sample(benchmark, limit):
+    with open(benchmark, "r") as f:
+        positions = json.load(f)["positions"][:limit]
+    return [p["fen"] for p in positions], [p["correct_move"] for p in positions]
+
+
+def encode_sample(fens):
+    """ROOK-CLF input ids (move counters clamped to the 2/3 digit fields)."""
+    from fen_encoder import clamp_counters, encode_fens
+
+    return encode_fens([clamp_counters(fen) for fen in fens])[0].astype(np.int64)
+
+
+def median_latency_ms(run, input_ids, samples):
+    run(input_ids[:1])
+    times = []
+    for row in input_ids[:samples]:
+        start = time.perf_counter()
+        run(row[None])
+        times.append(time.perf_counter() - start)
+    return float(np.median(times) * 1000)
+
+
+class OnnxVariant:
+    """session.run over any ROOK-CLF export; returns logits or (top_ids, top_probs)."""
+
+    def __init__(self, path):
+        import onnxruntime as ort
+
+        self.path = path
+        self.session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+        self.inputs = {i.name: ORT_TO_NUMPY[i.type] for i in self.session.get_inputs()}
+        outputs = [o.name for o in self.session.get_outputs()]
+        self.topk = "top_ids" in outputs
+        self.output_names = ["top_ids", "top_probs"] if self.topk else ["logits"]
+        self.uses_legal_mask = "legal_mask" in self.inputs
+        self.num_labels = {i.name: i.shape[-1] for i in self.session.get_inputs()}.get("legal_mask")
+
+    def run(self, input_ids, legal_mask=None):
+        feed = {
+            "input_ids": input_ids.astype(self.inputs["input_ids"]),
+            "attention_mask": np.ones_like(input_ids, dtype=self.inputs["attention_mask"]),
+        }
+        if self.uses_legal_mask:
+            feed["legal_mask"] = legal_mask if legal_mask is not None else \
+                np.ones((len(input_ids), self.num_labels), dtype=np.bool_)
+        outputs = self.session.run(self.output_names, feed)
+        return tuple(outputs) if self.topk else outputs[0]
+
+
+def torch_logits(model, input_ids, batch_size=256):
+    import torch
+
+    out = []
+    with torch.no_grad():
+        for start in range(0, len(input_ids), batch_size):
+            ids = torch.from_numpy(input_ids[start:start + batch_size])
+            out.append(model(input_ids=ids, attention_mask=torch.ones_like(ids)).logits.numpy())
+    return np.concatenate(out)
+
+
+def softmax(logits):
+    exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+def compare_variant(variant, reference, masked_reference, input_ids, legal, labels, batch_size):
+    """Best labels, deviation and accuracy of one ONNX variant vs. the PyTorch logits."""
+    expected = masked_reference if variant.uses_legal_mask else reference
+    best, deviation = [], 0.0
+    for start in range(0, len(input_ids), batch_size):
+        rows = slice(start, start + batch_size)
+        out = variant.run(input_ids[rows], legal[rows] if variant.uses_legal_mask else None)
+        if variant.topk:
+            top_ids, top_probs = out
+            probs = np.take_along_axis(softmax(expected[rows]), top_ids.astype(np.int64), axis=-1)
+            deviation = max(deviation, float(np.abs(probs - top_probs).max()))
+            best.append(top_ids[:, 0])
+        else:
+            deviation = max(deviation, float(np.abs(out - expected[rows]).max()))
+            best.append(out.argmax(axis=-1))
+    best = np.concatenate(best)
+    return {
+        "kind": "topk" if variant.topk else "logits",
+        "max_dev": deviation,
+        "top1": float((best == expected.argmax(axis=-1)).mean()),
+        "accuracy": float((best == labels).mean() * 100),
+        "accuracy_drop": float(((expected.argmax(axis=-1) == labels).mean() - (best == labels).mean()) * 100),
+    }
+
+
+def validate(model_name, variants, benchmark="benchmarks/lichess_puzzles.json", limit=500, latency_samples=32,
+             batch_size=64, min_agreement=0.97, max_accuracy_drop=1.0, max_deviation=None, report=None):
+    """Run the matrix and print it; returns True if every variant keeps parity."""
+    import torch
+    from transformers import AutoModelForSequenceClassification
+    from legal_masks import LegalMaskGenerator
+
+    fens, moves = load_sample(benchmark, limit)
+    input_ids = encode_sample(fens)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name)
+    model.eval()
+    torch.set_grad_enabled(False)
+    label2id = model.config.label2id
+    labels = np.array([label2id.get(move, -1) for move in moves])
+    legal = LegalMaskGenerator(label2id).masks(fens, strict=False)
+
+    reference = torch_logits(model, input_ids)
+    masked_reference = np.where(legal, reference, np.finfo(np.float32).min)
+    rows = [{
+        "variant": "pytorch",
+        "kind": "logits",
+        "max_dev": 0.0,
+        "top1": 1.0,
+        "accuracy": float((reference.argmax(axis=-1) == labels).mean() * 100),
+        "latency_ms": median_latency_ms(lambda ids: torch_logits(model, ids), input_ids, latency_samples),
+        "passed": True,
+    }]
+    for path in variants:
+        variant = OnnxVariant(path)
+        row = {"variant": path, **compare_variant(variant, reference, masked_reference, input_ids, legal, labels,
+                                                  batch_size)}
+        row["latency_ms"] = median_latency_ms(variant.run, input_ids, latency_samples)
+        row["passed"] = (row["top1"] >= min_agreement and row["accuracy_drop"] <= max_accuracy_drop
+                         and (max_deviation is None or row["max_dev"] <= max_deviation))
+        rows.append(row)
+
+    print(f"\nExport validation on {len(fens)} positions of {benchmark}")
+    print(f"{'variant':<52} {'kind':<7} {'max_dev':>9} {'top1':>7} {'acc %':>7} {'ms':>7}")
+    for row in rows:
+        name = row["variant"] if len(row["variant"]) <= 52 else "..." + row["variant"][-49:]
+        print(f"{name:<52} {row['kind']:<7} {row['max_dev']:9.2e} {row['top1'] * 100:6.1f}% "
+              f"{row['accuracy']:7.2f} {row['latency_ms']:7.3f}{'' if row['passed'] else '  FAIL'}")
+    if report:
+        with open(report, "w") as f:
+            json.dump({"benchmark": benchmark, "positions": len(fens), "model": model_name,
+                       "thresholds": {"min_agreement": min_agreement, "max_accuracy_drop": max_accuracy_drop,
+                                      "max_deviation": max_deviation},
+                       "rows": rows}, f, indent=2)
+        print(f"Wrote {report}")
+    return all(row["passed"] for row in rows)
+
+
+def add_validation_arguments(parser):
+    parser.add_argument("--benchmark", default="benchmarks/lichess_puzzles.json", help="Benchmark JSON for the sample")
+    parser.add_argument("--limit", type=int, default=500, help="Positions in the sample")
+    parser.add_argument("--min-agreement", type=float, default=0.97, help="Minimum top-1 agreement with PyTorch")
+    parser.add_argument("--max-accuracy-drop", type=float, default=1.0, help="Maximum accuracy loss in points")
+    parser.add_argument("--max-deviation", type=float, default=None, help="Maximum logit/probability deviation")
+    parser.add_argument("--report", default=None, help="Write the matrix as JSON")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare ROOK-CLF ONNX exports with the PyTorch model")
+    parser.add_argument("--model", required=True, help="HF repo id or local checkpoint path")
+    parser.add_argument("--variant", action="append", required=True, help="Exported ONNX file (repeatable)")
+    add_validation_arguments(parser)
+    args = parser.parse_args()
+
+    ok = validate(args.model, args.variant, args.benchmark, args.limit, min_agreement=args.min_agreement,
+                  max_accuracy_drop=args.max_accuracy_drop, max_deviation=args.max_deviation, report=args.report)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
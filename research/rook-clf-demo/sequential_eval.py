@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Sequential benchmark evaluation for ROOK-CLF: stop scoring once the answer is known.
+
+A full run scores every position even when a few hundred already pin the accuracy down
+far enough to decide a comparison. Here positions are drawn in a randomized order,
+stratified by metadata.difficulty (each difficulty keeps its share of the benchmark),
+and scored in batches. After every batch the stratified accuracy estimate
+sum(w_h * p_h), with w_h the share of difficulty h in the whole benchmark, gets a
+confidence interval:
+
+  wilson      Wilson score interval at the effective sample size of the stratified
+              estimate (p(1-p) / variance)
+  bootstrap   percentile interval of a stratified bootstrap (--bootstrap-rounds)
+
+and the run stops as soon as one of the rules holds:
+
+  --ci-width W       the interval is at most W wide
+  --target           the interval lies completely above or below the benchmark's
+                     target_accuracy (or --target-accuracy)
+  --compare MODEL    paired comparison: both models score the same positions and the
+                     interval of the accuracy difference excludes 0
+
+Every look at the data uses alpha / (number of possible looks) (Bonferroni), so checking
+after every batch does not inflate the overall error rate beyond --alpha. --full also
+scores the rest of the benchmark to show the exact accuracy next to the estimate.
+
+Usage
+  python sequential_eval.py --benchmark benchmarks/lichess_puzzles.json --ci-width 0.05
+  python sequential_eval.py --benchmark benchmarks/gdm_searchless.json --target
+  python sequential_eval.py --model model/ROOK-CLF-9m-transformersjs/model.quant.onnx \
+      --compare ./ROOK-CLF-9m.onnx --benchmark benchmarks/lichess_puzzles.json
+"""
+
+import argparse
+import json
+import math
+from collections import defaultdict
+from statistics import NormalDist
+
+import numpy as np
+
+from fen_encoder import MODEL_DIR, clamp_counters, encode_fens
+from iobinding_classifier import IOBindingClassifier
+from legal_masks import LegalMaskGenerator
+
+MODEL_PATH = MODEL_DIR / 'model.quant.onnx'
+
+
+def stratified_order(positions, seed=0, key="difficulty"):
+    """Position indices in random order, interleaved so every prefix keeps the strata shares."""
+    rng = np.random.default_rng(seed)
+    strata = defaultdict(list)
+    for i, position in enumerate(positions):
+        strata[position.get("metadata", {}).get(key, "unknown")].append(i)
+    for indices in strata.values():
+        rng.shuffle(indices)
+    total = len(positions)
+    taken = {name: 0 for name in strata}
+    order = []
+    for step in range(1, total + 1):
+        # stratum furthest behind its proportional quota
+        name = max((n for n in strata if taken[n] < len(strata[n])),
+                   key=lambda n: len(strata[n]) * step / total - taken[n])
+        order.append(strata[name][taken[name]])
+        taken[name] += 1
+    weights = {name: len(indices) / total for name, indices in strata.items()}
+    return order, weights
+
+
+def wilson_interval(p, n, z):
+    if n <= 0:
+        return 0.0, 1.0
+    denominator = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denominator
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+def stratified_mean(samples, weights):
+    """Stratified mean and variance of per-stratum samples (strata without samples are skipped)."""
+    observed = {name: np.asarray(values, dtype=np.float64) for name, values in samples.items() if len(values)}
+    total = sum(weights[name] for name in observed)
+    mean = variance = 0.0
+    for name, values in observed.items():
+        w = weights[name] / total
+        mean += w * values.mean()
+        # (add-one smoothed for tiny strata whose sample variance is 0)
+        var = values.var(ddof=1) if len(values) > 1 else 0.25
+        variance += w * w * max(var, 1.0 / (len(values) + 2) ** 2) / len(values)
+    return mean, variance
+
+
+def bootstrap_interval(samples, weights, alpha, rounds, rng):
+    observed = {name: np.asarray(values, dtype=np.float64) for name, values in samples.items() if len(values)}
+    total = sum(weights[name] for name in observed)
+    estimates = np.zeros(rounds)
+    for name, values in observed.items():
+        draws = rng.integers(0, len(values), size=(rounds, len(values)))
+        estimates += weights[name] / total * values[draws].mean(axis=1)
+    return float(np.quantile(estimates, alpha / 2)), float(np.quantile(estimates, 1 - alpha / 2))
+
+
+def interval(samples, weights, alpha, method="wilson", paired=False, rounds=2000, rng=None):
+    """(estimate, low, high) of the stratified mean; paired differences use a normal interval."""
+    mean, variance = stratified_mean(samples, weights)
+    if method == "bootstrap":
+        low, high = bootstrap_interval(samples, weights, alpha, rounds, rng or np.random.default_rng(0))
+        return mean, low, high
+    z = NormalDist().inv_cdf(1 - alpha / 2)
+    if paired:
+        half = z * math.sqrt(variance)
+        return mean, mean - half, mean + half
+    n = sum(len(v) for v in samples.values())
+    n_effective = mean * (1 - mean) / variance if 0 < mean < 1 else n
+    low, high = wilson_interval(mean, n_effective, z)
+    return mean, low, high
+
+
+class Scorer:
+    """Top-1 correctness of a ROOK-CLF export on benchmark positions.
+
+    Illegal moves are masked out for every export type (IOBindingClassifier.best_labels:
+    masked logits, or the legal_mask input of --topk exports), so the accuracy is the
+    same legal-masked top-1 that bulk_pipeline.py and target_accuracy refer to.
+    """
+
+    def __init__(self, model_path, max_batch, label2id):
+        self.classifier = IOBindingClassifier(model_path, max_batch=max_batch)
+        self.label2id = label2id
+        self.masks = LegalMaskGenerator(label2id)
+
+    def __call__(self, positions):
+        fens = [clamp_counters(position["fen"]) for position in positions]
+        best = self.classifier.best_labels(encode_fens(fens, strict=False)[0], self.masks.masks(fens, strict=False))
+        labels = np.array([self.label2id.get(p["correct_move"], -1) for p in positions])
+        return best == labels
+
+
+def evaluate(positions, scorers, weights, order, args, target=None):
+    """Score batches in `order` until a stop rule holds; returns a summary dict."""
+    looks = math.ceil(len(order) / args.batch_size)
+    alpha = args.alpha / looks
+    rng = np.random.default_rng(args.seed)
+    strata = [positions[i].get("metadata", {}).get("difficulty", "unknown") for i in range(len(positions))]
+    samples = defaultdict(list)
+    scored = 0
+    reason = "exhausted"
+    estimate = low = high = None
+    for start in range(0, len(order), args.batch_size):
+        batch = order[start:start + args.batch_size]
+        results = [scorer([positions[i] for i in batch]) for scorer in scorers]
+        values = results[0].astype(np.float64) if len(scorers) == 1 else \
+            results[0].astype(np.float64) - results[1].astype(np.float64)
+        for i, value in zip(batch, values):
+            samples[strata[i]].append(value)
+        scored += len(batch)
+        if scored < args.min_samples:
+            continue
+        estimate, low, high = interval(samples, weights, alpha, args.interval, paired=len(scorers) > 1,
+                                       rounds=args.bootstrap_rounds, rng=rng)
+        if args.verbose:
+            print(f"  {scored:6d} positions: {estimate * 100:6.2f}% [{low * 100:6.2f}, {high * 100:6.2f}]")
+        if args.ci_width and high - low <= args.ci_width:
+            reason = f"interval width {(high - low) * 100:.2f} <= {args.ci_width * 100:.2f} points"
+            break
+        if target is not None and (low > target or high < target):
+            side = "above" if low > target else "below"
+            reason = f"{'difference' if len(scorers) > 1 else 'accuracy'} significantly {side} {target * 100:.2f}%"
+            break
+    if estimate is None:
+        estimate, low, high = interval(samples, weights, alpha, args.interval, paired=len(scorers) > 1,
+                                       rounds=args.bootstrap_rounds, rng=rng)
+    return {
+        "scored": scored,
+        "total": len(order),
+        "estimate": estimate,
+        "low": low,
+        "high": high,
+        "per_look_alpha": alpha,
+        "reason": reason,
+        "strata": {name: len(values) for name, values in samples.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sequential (early stopping) ROOK-CLF benchmark evaluation")
+    parser.add_argument("--model", default=str(MODEL_PATH))
+    parser.add_argument("--compare", default=None, help="Second model: estimate the accuracy difference")
+    parser.add_argument("--benchmark", default="benchmarks/lichess_puzzles.json")
+    parser.add_argument("--ci-width", type=float, default=None, help="Stop when the interval is this narrow (0-1)")
+    parser.add_argument("--target", action="store_true", help="Stop when significantly above/below target_accuracy")
+    parser.add_argument("--target-accuracy", type=float, default=None, help="Override target_accuracy (percent)")
+    parser.add_argument("--alpha", type=float, default=0.05, help="Overall error rate")
+    parser.add_argument("--interval", choices=["wilson", "bootstrap"], default="wilson")
+    parser.add_argument("--bootstrap-rounds", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=64, help="Positions scored between two looks")
+    parser.add_argument("--min-samples", type=int, default=128, help="Positions before the first look")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--full", action="store_true", help="Also score all positions for the exact accuracy")
+    parser.add_argument("--verbose", action="store_true", help="Print the interval after every look")
+    parser.add_argument("--output", default=None, help="Write the summary as JSON")
+    args = parser.parse_args()
+
+    with open(args.benchmark, "r") as f:
+        benchmark = json.load(f)
+    positions = benchmark["positions"]
+    with open(MODEL_DIR / 'config.json', 'r') as f:
+        label2id = json.load(f)["label2id"]
+    scorers = [Scorer(args.model, args.batch_size, label2id)]
+    target = None
+    if args.compare:
+        scorers.append(Scorer(args.compare, args.batch_size, label2id))
+        target = 0.0
+    elif args.target:
+        target = (args.target_accuracy if args.target_accuracy is not None else benchmark["target_accuracy"]) / 100
+    if not args.ci_width and target is None:
+        parser.error("give --ci-width, --target or --compare")
+
+    order, weights = stratified_order(positions, args.seed)
+    print(f"{benchmark.get('name', args.benchmark)}: {len(positions)} positions, strata "
+          + ", ".join(f"{name} {w * 100:.0f}%" for name, w in sorted(weights.items(), key=lambda kv: -kv[1])))
+    summary = evaluate(positions, scorers, weights, order, args, target)
+    label = "Accuracy difference" if args.compare else "Accuracy"
+    print(f"{label}: {summary['estimate'] * 100:.2f}% [{summary['low'] * 100:.2f}, {summary['high'] * 100:.2f}] "
+          f"after {summary['scored']}/{summary['total']} positions "
+          f"({(1 - summary['scored'] / summary['total']) * 100:.0f}% saved)")
+    print(f"Stopped: {summary['reason']}")
+
+    if args.full:
+        exact = [scorer(positions).mean() for scorer in scorers]
+        summary["exact"] = float(exact[0] - exact[1]) if args.compare else float(exact[0])
+        print(f"Exact {label.lower()} on all positions: {summary['exact'] * 100:.2f}%")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": args.benchmark, "model": args.model, "compare": args.compare, **summary}, f,
+                      indent=2)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+Sharded benchmark evaluation through a local work queue (no external service).
+
+Evaluating many checkpoints against the benchmark files is split into tasks: one per
+(model, benchmark, shard of --shard-size positions). The queue is either
+
+  a SQLite file (path ending in .db / .sqlite)     claims in BEGIN IMMEDIATE transactions
+  a directory (any other path)                      one JSON file per task, claimed by an
+                                                    atomic rename (safe on shared file
+                                                    systems where SQLite locking is not)
+
+so workers on several machines only need the same file system (and the same model and
+benchmark paths). A claim is a lease: a worker that dies leaves its task to be picked up
+again after --lease seconds, a task that raised is retried up to --max-attempts times.
+
+Workers are idempotent. Every task carries the sha256 of its model and benchmark; the
+result is written atomically to <results>/<task id>.json and a task whose result file
+already exists for the same content is marked done without re-running it, so running a
+shard twice (expired lease, restarted worker) is harmless.
+
+merge combines the shards in position order: per-shard metrics and combined metrics
+per model and benchmark, computed from the concatenated per-position records exactly as
+a single-node run (`local`) computes them.
+
+Usage
+  python sharded_eval.py init --queue eval.db --model a.onnx b.onnx \
+      --benchmark benchmarks/lichess_puzzles.json benchmarks/gdm_searchless.json --shard-size 500
+  python sharded_eval.py work --queue eval.db --results shards/        # on every machine
+  python sharded_eval.py status --queue eval.db
+  python sharded_eval.py merge --queue eval.db --results shards/ --output merged.json
+  python sharded_eval.py local --model a.onnx --benchmark benchmarks/lichess_puzzles.json --output single.json
+"""
+
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+from benchmark_manifest import file_sha256
+from fen_encoder import MODEL_DIR, clamp_counters, encode_fens
+from legal_masks import LegalMaskGenerator
+
+MODEL_PATH = MODEL_DIR / 'model.quant.onnx'
+# Stored with every shard result: results of an earlier scoring rule are run again
+SCORING = "legal-masked-top1"
+
+
+def task_id(model_sha256, benchmark_sha256, start):
+    return f"{model_sha256[:12]}-{benchmark_sha256[:12]}-{start:07d}"
+
+
+def make_tasks(models, benchmarks, shard_size):
+    tasks = []
+    for model in models:
+        model_sha256 = file_sha256(model)
+        for benchmark in benchmarks:
+            benchmark_sha256 = file_sha256(benchmark)
+            with open(benchmark, "r") as f:
+                count = len(json.load(f)["positions"])
+            for start in range(0, count, shard_size):
+                tasks.append({
+                    "id": task_id(model_sha256, benchmark_sha256, start),
+                    "model": str(model),
+                    "model_sha256": model_sha256,
+                    "benchmark": str(benchmark),
+                    "benchmark_sha256": benchmark_sha256,
+                    "start": start,
+                    "stop": min(start + shard_size, count),
+                })
+    return tasks
+
+
+class SqliteQueue:
+    """Task queue in one SQLite file."""
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.db.execute("CREATE TABLE IF NOT EXISTS tasks (id TEXT PRIMARY KEY, spec TEXT, state TEXT, "
+                        "worker TEXT, leased_until REAL, attempts INTEGER DEFAULT 0, error TEXT)")
+
+    def add(self, tasks):
+        self.db.execute("BEGIN IMMEDIATE")
+        before = self.db.total_changes
+        self.db.executemany("INSERT OR IGNORE INTO tasks (id, spec, state) VALUES (?, ?, 'pending')",
+                            [(t["id"], json.dumps(t)) for t in tasks])
+        added = self.db.total_changes - before
+        self.db.execute("COMMIT")
+        return added
+
+    def claim(self, worker, lease, max_attempts):
+        now = time.time()
+        self.db.execute("BEGIN IMMEDIATE")
+        row = self.db.execute("SELECT id, spec, attempts FROM tasks WHERE attempts < ? AND (state = 'pending' OR "
+                              "(state = 'running' AND leased_until < ?)) ORDER BY id LIMIT 1",
+                              (max_attempts, now)).fetchone()
+        if row:
+            self.db.execute("UPDATE tasks SET state = 'running', worker = ?, leased_until = ?, "
+                            "attempts = attempts + 1 WHERE id = ?", (worker, now + lease, row[0]))
+        self.db.execute("COMMIT")
+        return {**json.loads(row[1]), "attempts": row[2] + 1, "worker": worker} if row else None
+
+    def complete(self, task, worker):
+        self.db.execute("UPDATE tasks SET state = 'done', worker = ?, error = NULL WHERE id = ?", (worker, task["id"]))
+
+    def fail(self, task, error, max_attempts):
+        self.db.execute("UPDATE tasks SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                        "error = ? WHERE id = ?", (max_attempts, error, task["id"]))
+
+    def tasks(self):
+        rows = self.db.execute("SELECT spec, state, worker, attempts, error FROM tasks ORDER BY id").fetchall()
+        return [{**json.loads(spec), "state": state, "worker": worker, "attempts": attempts, "error": error}
+                for spec, state, worker, attempts, error in rows]
+
+
+class DirectoryQueue:
+    """Task queue as JSON files in pending/, running/, done/ and failed/ (moved by rename)."""
+
+    STATES = ("pending", "running", "done", "failed")
+
+    def __init__(self, path):
+        self.root = Path(path)
+        for state in self.STATES:
+            (self.root / state).mkdir(parents=True, exist_ok=True)
+
+    def _find(self, task_id):
+        for state in self.STATES:
+            path = self.root / state / f"{task_id}.json"
+            if path.exists():
+                return state, path
+        return None, None
+
+    def _write(self, path, entry):
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def add(self, tasks):
+        added = 0
+        for task in tasks:
+            if self._find(task["id"])[0] is None:
+                self._write(self.root / "pending" / f"{task['id']}.json", {**task, "attempts": 0})
+                added += 1
+        return added
+
+    def claim(self, worker, lease, max_attempts):
+        now = time.time()
+        candidates = sorted((self.root / "pending").glob("*.json"))
+        for path in sorted((self.root / "running").glob("*.json")):
+            try:
+                if path.stat().st_mtime + lease < now:  # expired lease (the file is touched on claim)
+                    candidates.append(path)
+            except FileNotFoundError:
+                continue
+        for path in candidates:
+            claimed = self.root / "running" / f".{path.stem}.{worker}"
+            try:
+                os.rename(path, claimed)  # only one worker wins the rename
+            except (FileNotFoundError, OSError):
+                continue
+            with open(claimed, "r") as f:
+                entry = json.load(f)
+            if entry.get("attempts", 0) >= max_attempts:
+                os.replace(claimed, self.root / "failed" / path.name)
+                continue
+            entry.update(attempts=entry.get("attempts", 0) + 1, worker=worker)
+            self._write(claimed, entry)
+            os.replace(claimed, self.root / "running" / path.name)
+            return entry
+        return None
+
+    def complete(self, task, worker):
+        state, path = self._find(task["id"])
+        if path is not None and state != "done":
+            os.replace(path, self.root / "done" / path.name)
+
+    def fail(self, task, error, max_attempts):
+        path = self.root / "running" / f"{task['id']}.json"
+        state = "failed" if task.get("attempts", 0) >= max_attempts else "pending"
+        try:
+            self._write(path, {**task, "error": error})
+            os.replace(path, self.root / state / path.name)
+        except FileNotFoundError:  # lease already taken over by another worker
+            pass
+
+    def tasks(self):
+        rows = []
+        for state in self.STATES:
+            for path in (self.root / state).glob("*.json"):
+                try:
+                    with open(path, "r") as f:
+                        rows.append({**json.load(f), "state": state})
+                except (FileNotFoundError, json.JSONDecodeError):
+                    continue
+        return sorted(rows, key=lambda t: t["id"])
+
+
+def open_queue(path):
+    return SqliteQueue(path) if str(path).endswith((".db", ".sqlite")) else DirectoryQueue(path)
+
+
+class ShardEvaluator:
+    """Legal-masked top-1 predictions of ROOK-CLF exports; one classifier per model file.
+
+    Masking works for logits and --topk exports alike (IOBindingClassifier.best_labels),
+    so the accuracy matches bulk_pipeline.py and sequential_eval.py.
+    """
+
+    def __init__(self, batch_size=256):
+        with open(MODEL_DIR / 'config.json', 'r') as f:
+            config = json.load(f)
+        self.label2id = config["label2id"]
+        self.id2label = config["id2label"]
+        self.masks = LegalMaskGenerator(self.label2id)
+        self.batch_size = batch_size
+        self._classifiers = {}
+
+    def classifier(self, model_path):
+        from iobinding_classifier import IOBindingClassifier
+
+        if model_path not in self._classifiers:
+            self._classifiers[model_path] = IOBindingClassifier(model_path, max_batch=self.batch_size)
+        return self._classifiers[model_path]
+
+    def records(self, model_path, positions):
+        fens = [clamp_counters(position["fen"]) for position in positions]
+        best = self.classifier(model_path).best_labels(encode_fens(fens, strict=False)[0],
+                                                      self.masks.masks(fens, strict=False))
+        return [{
+            "fen": position["fen"],
+            "difficulty": position.get("metadata", {}).get("difficulty", "unknown"),
+            "correct_move": position["correct_move"],
+            "predicted": self.id2label[str(int(label))],
+            "correct": self.id2label[str(int(label))] == position["correct_move"],
+        } for position, label in zip(positions, best)]
+
+
+def metrics(records):
+    """Counts and accuracy (percent), overall and per difficulty."""
+    def summary(rows):
+        correct = sum(r["correct"] for r in rows)
+        return {"positions": len(rows), "correct": correct,
+                "accuracy": correct / len(rows) * 100 if rows else 0.0}
+
+    difficulties = sorted({r["difficulty"] for r in records})
+    return {**summary(records),
+            "by_difficulty": {d: summary([r for r in records if r["difficulty"] == d]) for d in difficulties}}
+
+
+def result_path(results, task):
+    return Path(results) / f"{task['id']}.json"
+
+
+def load_result(results, task):
+    """The stored result of a task, or None if missing, partial, for other content or scoring."""
+    try:
+        with open(result_path(results, task), "r") as f:
+            result = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    stored = result.get("task", {})
+    keys = ("model_sha256", "benchmark_sha256", "start", "stop")
+    if result.get("scoring") != SCORING:
+        return None
+    return result if all(stored.get(k) == task[k] for k in keys) else None
+
+
+def run_task(task, evaluator, results, worker):
+    with open(task["benchmark"], "r") as f:
+        positions = json.load(f)["positions"][task["start"]:task["stop"]]
+    for key, path in (("model_sha256", task["model"]), ("benchmark_sha256", task["benchmark"])):
+        if file_sha256(path) != task[key]:
+            raise RuntimeError(f"{path} differs from the file the task was created for")
+    start = time.perf_counter()
+    records = evaluator.records(task["model"], positions)
+    spec = {k: v for k, v in task.items() if k not in ("state", "worker", "attempts", "error")}
+    result = {"task": spec, "scoring": SCORING, "worker": worker, "seconds": time.perf_counter() - start,
+              "metrics": metrics(records), "records": records}
+    path = result_path(results, task)
+    tmp_path = path.with_name(f".{path.name}.{worker}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(result, f)
+    os.replace(tmp_path, path)
+    return result
+
+
+def work(queue, results, worker, lease=600, max_attempts=3, batch_size=256, max_tasks=None):
+    """Claim and run tasks until the queue has nothing claimable left; returns tasks run."""
+    Path(results).mkdir(parents=True, exist_ok=True)
+    evaluator = ShardEvaluator(batch_size)
+    done = 0
+    while max_tasks is None or done < max_tasks:
+        task = queue.claim(worker, lease, max_attempts)
+        if task is None:
+            break
+        label = f"{task['id']} ({Path(task['model']).name}, {Path(task['benchmark']).name} " \
+                f"{task['start']}:{task['stop']})"
+        if load_result(results, task) is not None:
+            queue.complete(task, worker)
+            print(f"{label}: result exists, skipped")
+            continue
+        try:
+            result = run_task(task, evaluator, results, worker)
+        except Exception as e:
+            queue.fail(task, f"{type(e).__name__}: {e}", max_attempts)
+            print(f"{label}: failed (attempt {task.get('attempts', 1)}): {e}")
+            continue
+        queue.complete(task, worker)
+        done += 1
+        print(f"{label}: {result['metrics']['accuracy']:.2f}% in {result['seconds']:.1f}s")
+    return done
+
+
+def merge(tasks, results):
+    """Per-shard and combined metrics per (model, benchmark); also returns missing task ids."""
+    groups = {}
+    missing = []
+    for task in sorted(tasks, key=lambda t: (t["model"], t["benchmark"], t["start"])):
+        result = load_result(results, task)
+        if result is None:
+            missing.append(task["id"])
+            continue
+        group = groups.setdefault((task["model"], task["benchmark"]), {"shards": [], "records": []})
+        group["shards"].append({"id": task["id"], "start": task["start"], "stop": task["stop"],
+                                "worker": result["worker"], "seconds": result["seconds"], **result["metrics"]})
+        group["records"].extend(result["records"])
+    merged = []
+    for (model, benchmark), group in groups.items():
+        merged.append({"model": model, "benchmark": benchmark, "metrics": metrics(group["records"]),
+                       "shards": group["shards"], "records": group["records"]})
+    return merged, missing
+
+
+def print_metrics(model, benchmark, summary):
+    by_difficulty = ", ".join(f"{d} {m['accuracy']:.1f}%" for d, m in summary["by_difficulty"].items())
+    print(f"{Path(model).name} on {Path(benchmark).name}: {summary['accuracy']:.2f}% "
+          f"({summary['correct']}/{summary['positions']})  [{by_difficulty}]")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded ROOK-CLF benchmark evaluation through a local work queue")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    init = commands.add_parser("init", help="Split benchmarks into shard tasks and enqueue them")
+    init.add_argument("--queue", required=True, help="SQLite file (.db/.sqlite) or queue directory")
+    init.add_argument("--model", nargs="+", default=[str(MODEL_PATH)])
+    init.add_argument("--benchmark", nargs="+", default=["benchmarks/lichess_puzzles.json"])
+    init.add_argument("--shard-size", type=int, default=500)
+
+    worker = commands.add_parser("work", help="Run tasks until none is left")
+    worker.add_argument("--queue", required=True)
+    worker.add_argument("--results", default="benchmarks/results/shards")
+    worker.add_argument("--worker-id", default=f"{socket.gethostname()}-{os.getpid()}")
+    worker.add_argument("--lease", type=float, default=600, help="Seconds before a claimed task may be retaken")
+    worker.add_argument("--max-attempts", type=int, default=3)
+    worker.add_argument("--batch-size", type=int, default=256)
+    worker.add_argument("--max-tasks", type=int, default=None)
+
+    status = commands.add_parser("status", help="Task counts per state")
+    status.add_argument("--queue", required=True)
+
+    merger = commands.add_parser("merge", help="Combine shard results")
+    merger.add_argument("--queue", required=True)
+    merger.add_argument("--results", default="benchmarks/results/shards")
+    merger.add_argument("--output", default=None)
+
+    local = commands.add_parser("local", help="Single-node run of whole benchmarks (reference for merge)")
+    local.add_argument("--model", nargs="+", default=[str(MODEL_PATH)])
+    local.add_argument("--benchmark", nargs="+", default=["benchmarks/lichess_puzzles.json"])
+    local.add_argument("--batch-size", type=int, default=256)
+    local.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    if args.command == "init":
+        tasks = make_tasks(args.model, args.benchmark, args.shard_size)
+        added = open_queue(args.queue).add(tasks)
+        print(f"{len(tasks)} tasks ({added} new) in {args.queue}")
+    elif args.command == "work":
+        done = work(open_queue(args.queue), args.results, args.worker_id, args.lease, args.max_attempts,
+                    args.batch_size, args.max_tasks)
+        print(f"Worker {args.worker_id}: {done} task(s) run")
+    elif args.command == "status":
+        tasks = open_queue(args.queue).tasks()
+        counts = {state: sum(t["state"] == state for t in tasks) for state in DirectoryQueue.STATES}
+        print(", ".join(f"{state} {count}" for state, count in counts.items()))
+        for task in tasks:
+            if task["state"] == "failed" or (task["state"] == "pending" and task.get("error")):
+                print(f"  {task['id']} {task['state']} after {task['attempts']} attempt(s): {task.get('error')}")
+    elif args.command == "merge":
+        merged, missing = merge(open_queue(args.queue).tasks(), args.results)
+        for entry in merged:
+            print_metrics(entry["model"], entry["benchmark"], entry["metrics"])
+            for shard in entry["shards"]:
+                print(f"  {shard['start']:>7}:{shard['stop']:<7} {shard['accuracy']:6.2f}%  {shard['worker']}")
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({"runs": merged, "missing": missing}, f, indent=2)
+            print(f"Wrote {args.output}")
+        if missing:
+            print(f"{len(missing)} shard(s) without results: {', '.join(missing[:5])}{' ...' if len(missing) > 5 else ''}")
+            sys.exit(1)
+    else:
+        evaluator = ShardEvaluator(args.batch_size)
+        runs = []
+        for model in args.model:
+            for benchmark in args.benchmark:
+                with open(benchmark, "r") as f:
+                    records = evaluator.records(model, json.load(f)["positions"])
+                runs.append({"model": model, "benchmark": benchmark, "metrics": metrics(records),
+                             "records": records})
+                print_metrics(model, benchmark, runs[-1]["metrics"])
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({"runs": runs}, f, indent=2)
+            print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
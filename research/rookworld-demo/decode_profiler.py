@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Per-step profiling of the decode loops, with hooks and ONNX Runtime profiler summaries.
+
+A step of the reference loops (reference_implementation.py) interleaves building the
+input arrays, session.run, the argmax, tokenizer.decode and the stop-string check.
+DecodeProfiler times each of these stages inside each step:
+
+  with profiler.step(seq_len):
+      with profiler.stage("inputs"): ...
+      with profiler.stage("session_run"): ...
+
+The first step of a generation is the prefill (the whole prompt), every later step is
+a decode step. `summary()` reports per phase and stage the total / mean / p50 / p95
+time, time to first token and decode tokens/s. Hooks are callables hook(event, data)
+called for "stage", "step" and "generation" events, e.g. to stream progress or feed
+another collector; print_step_hook is a ready-made one.
+
+With ort_profile=True the session is created with ONNX Runtime's built-in profiler
+(`session_options()`), and `finish(session)` ends profiling and summarizes the JSON
+trace into per-op-type and per-node kernel time (summarize_ort_trace).
+
+`to_json` writes summary + per-step records + ORT hot spots, `to_csv` the per-step
+records, so runs can be compared over time.
+
+Usage
+  python decode_profiler.py --model ./assets/model_rookworld.onnx --task policy \
+      --ort-profile --json profile.json --csv steps.csv
+"""
+
+import argparse
+import csv
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
+
+STAGES = ("inputs", "session_run", "argmax", "decode", "stop_check")
+
+
+def print_step_hook(event, data):
+    """Hook printing one line per step."""
+    if event == "step":
+        stages = ", ".join(f"{name} {data[name] * 1000:.2f}" for name in STAGES if name in data)
+        print(f"  step {data['step']:3d} ({data['phase']}, {data['seq_len']} tokens): "
+              f"{data['total'] * 1000:.2f} ms [{stages}]")
+
+
+class DecodeProfiler:
+    """Stage timers for decode loops; see the module docstring."""
+
+    def __init__(self, hooks=(), ort_profile=False, ort_profile_prefix="ort_profile"):
+        self.hooks = list(hooks)
+        self.ort_profile = ort_profile
+        self.ort_profile_prefix = ort_profile_prefix
+        self.records = []
+        self.generations = []
+        self.ort_summary = None
+        self._step = None
+        self._generation = None
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def _emit(self, event, data):
+        for hook in self.hooks:
+            hook(event, data)
+
+    def session_options(self, options=None):
+        """SessionOptions with ORT profiling enabled (None if ort_profile is off and none given)."""
+        if not self.ort_profile:
+            return options
+        import onnxruntime as ort
+
+        options = options or ort.SessionOptions()
+        options.enable_profiling = True
+        options.profile_file_prefix = self.ort_profile_prefix
+        return options
+
+    def begin(self, prompt_tokens, label=None):
+        """Start a generation of a prompt with prompt_tokens tokens."""
+        self._generation = {"label": label, "prompt_tokens": prompt_tokens, "start": time.perf_counter(),
+                            "steps": 0, "first_token": None}
+
+    @contextmanager
+    def step(self, seq_len):
+        generation = self._generation
+        record = {
+            "generation": len(self.generations),
+            "step": generation["steps"],
+            "phase": "prefill" if generation["steps"] == 0 else "decode",
+            "seq_len": seq_len,
+        }
+        self._step = record
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["total"] = time.perf_counter() - start
+            generation["steps"] += 1
+            if generation["first_token"] is None:
+                generation["first_token"] = time.perf_counter() - generation["start"]
+            self.records.append(record)
+            self._step = None
+            self._emit("step", record)
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if self._step is not None:
+                self._step[name] = self._step.get(name, 0.0) + elapsed
+            self._emit("stage", {"stage": name, "seconds": elapsed, "step": self._step})
+
+    def end(self, new_tokens=None):
+        generation = self._generation
+        generation["seconds"] = time.perf_counter() - generation.pop("start")
+        generation["new_tokens"] = generation["steps"] if new_tokens is None else new_tokens
+        self.generations.append(generation)
+        self._generation = None
+        self._emit("generation", generation)
+
+    def finish(self, session):
+        """End ORT profiling of a session (if enabled) and summarize its trace."""
+        if not self.ort_profile:
+            return None
+        trace = session.end_profiling()
+        self.ort_summary = summarize_ort_trace(trace)
+        self.ort_summary["trace"] = trace
+        return self.ort_summary
+
+    def summary(self):
+        phases = {}
+        for phase in ("prefill", "decode"):
+            records = [r for r in self.records if r["phase"] == phase]
+            if not records:
+                continue
+            stages = {}
+            for name in ("total", *STAGES):
+                values = np.array([r[name] for r in records if name in r]) * 1000
+                if len(values):
+                    stages[name] = {
+                        "total_ms": float(values.sum()),
+                        "mean_ms": float(values.mean()),
+                        "p50_ms": float(np.percentile(values, 50)),
+                        "p95_ms": float(np.percentile(values, 95)),
+                    }
+            phases[phase] = {"steps": len(records), "stages": stages}
+
+        decode_seconds = sum(r["total"] for r in self.records if r["phase"] == "decode")
+        decode_steps = sum(1 for r in self.records if r["phase"] == "decode")
+        total_seconds = sum(g["seconds"] for g in self.generations)
+        new_tokens = sum(g["new_tokens"] for g in self.generations)
+        return {
+            "generations": len(self.generations),
+            "new_tokens": new_tokens,
+            "time_to_first_token_ms": float(np.mean([g["first_token"] for g in self.generations]) * 1000)
+            if self.generations else None,
+            "decode_tokens_per_second": decode_steps / decode_seconds if decode_seconds else None,
+            "tokens_per_second": new_tokens / total_seconds if total_seconds else None,
+            "phases": phases,
+        }
+
+    def print_summary(self):
+        summary = self.summary()
+        print(f"📊 {summary['generations']} generation(s), {summary['new_tokens']} new tokens, "
+              f"first token {summary['time_to_first_token_ms']:.1f} ms, "
+              f"{summary['decode_tokens_per_second'] or 0:.1f} decode tokens/s, "
+              f"{summary['tokens_per_second'] or 0:.1f} tokens/s overall")
+        for phase, info in summary["phases"].items():
+            total = info["stages"]["total"]["total_ms"]
+            print(f"  {phase} ({info['steps']} steps, {total:.1f} ms)")
+            for name in STAGES:
+                if name in info["stages"]:
+                    stage = info["stages"][name]
+                    print(f"    {name:<12} {stage['total_ms']:9.2f} ms {100 * stage['total_ms'] / total:5.1f}%  "
+                          f"mean {stage['mean_ms']:.3f} p95 {stage['p95_ms']:.3f} ms")
+        if self.ort_summary:
+            print_ort_summary(self.ort_summary)
+
+    def to_json(self, path, extra=None):
+        payload = {"summary": self.summary(), "steps": self.records, "ort": self.ort_summary, **(extra or {})}
+        with open(path, "w") as f:
+            json.dump(payload, f, indent=2)
+
+    def to_csv(self, path):
+        fields = ["generation", "step", "phase", "seq_len", "total", *STAGES]
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(self.records)
+
+
+class NullProfiler:
+    """Stand-in with the DecodeProfiler interface that records nothing."""
+
+    def session_options(self, options=None):
+        return options
+
+    def begin(self, prompt_tokens, label=None):
+        pass
+
+    def step(self, seq_len):
+        return nullcontext()
+
+    def stage(self, name):
+        return nullcontext()
+
+    def end(self, new_tokens=None):
+        pass
+
+    def finish(self, session):
+        return None
+
+
+def summarize_ort_trace(path, top=15):
+    """Kernel time per op type and the slowest nodes from an ORT profiler JSON trace."""
+    with open(path, "r") as f:
+        events = json.load(f)
+    by_op = defaultdict(lambda: {"total_us": 0, "calls": 0})
+    by_node = defaultdict(lambda: {"total_us": 0, "calls": 0, "op_type": None})
+    runs = []
+    for event in events:
+        if event.get("cat") == "Session" and event.get("name") == "model_run":
+            runs.append(event["dur"])
+        if event.get("cat") != "Node" or not event.get("name", "").endswith("_kernel_time"):
+            continue
+        op_type = event.get("args", {}).get("op_name", "?")
+        node = event["name"][:-len("_kernel_time")]
+        by_op[op_type]["total_us"] += event["dur"]
+        by_op[op_type]["calls"] += 1
+        by_node[node]["total_us"] += event["dur"]
+        by_node[node]["calls"] += 1
+        by_node[node]["op_type"] = op_type
+
+    kernel_total = sum(op["total_us"] for op in by_op.values()) or 1
+    ops = sorted(({"op_type": k, **v, "percent": 100 * v["total_us"] / kernel_total} for k, v in by_op.items()),
+                 key=lambda op: -op["total_us"])
+    nodes = sorted(({"node": k, **v, "percent": 100 * v["total_us"] / kernel_total} for k, v in by_node.items()),
+                   key=lambda node: -node["total_us"])[:top]
+    return {
+        "model_runs": len(runs),
+        "model_run_us": sum(runs),
+        "kernel_us": kernel_total,
+        "ops": ops,
+        "nodes": nodes,
+    }
+
+
+def print_ort_summary(summary, top=10):
+    print(f"  ORT trace: {summary['model_runs']} runs, {summary['model_run_us'] / 1000:.1f} ms in model_run, "
+          f"{summary['kernel_us'] / 1000:.1f} ms in kernels")
+    for op in summary["ops"][:top]:
+        print(f"    {op['op_type']:<24} {op['total_us'] / 1000:9.2f} ms {op['percent']:5.1f}%  ({op['calls']} calls)")
+    print("  Slowest nodes:")
+    for node in summary["nodes"][:top]:
+        print(f"    {node['node'][:48]:<48} {node['op_type']:<16} {node['total_us'] / 1000:8.2f} ms "
+              f"{node['percent']:5.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile the reference decode loops")
+    parser.add_argument("--model", default="./assets/model_rookworld.onnx")
+    parser.add_argument("--tokenizer", default="./assets/")
+    parser.add_argument("--task", choices=["rook-lm", "policy", "environment"], default="policy")
+    parser.add_argument("--ort-profile", action="store_true", help="Enable the ONNX Runtime profiler")
+    parser.add_argument("--ort-profile-prefix", default="ort_profile")
+    parser.add_argument("--steps", action="store_true", help="Print every step")
+    parser.add_argument("--json", default=None, help="Write summary, steps and ORT hot spots as JSON")
+    parser.add_argument("--csv", default=None, help="Write per-step records as CSV")
+    args = parser.parse_args()
+
+    import reference_implementation as reference
+
+    profiler = DecodeProfiler(hooks=[print_step_hook] if args.steps else [], ort_profile=args.ort_profile,
+                              ort_profile_prefix=args.ort_profile_prefix)
+    run = {
+        "rook-lm": reference.test_rook_lm_policy,
+        "policy": reference.test_rookworld_policy,
+        "environment": reference.test_rookworld_environment,
+    }[args.task]
+    run(args.tokenizer, args.model, profiler=profiler)
+    print()
+    profiler.print_summary()
+    if args.json:
+        profiler.to_json(args.json, extra={"model": os.path.abspath(args.model), "task": args.task})
+        print(f"✅ Wrote {args.json}")
+    if args.csv:
+        profiler.to_csv(args.csv)
+        print(f"✅ Wrote {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
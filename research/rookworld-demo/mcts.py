@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+MCTS for ROOK-LM / RookWorld-LM with batched policy decodes as leaf evaluations.
+
+A policy decode ("P: <fen>") already contains more than the best move:
+
+  M: e2e4 d2d4 g1f3 c2c4 g2g3 E: 0.3 0.3 0.2 0.1 0.0 B: e2e4
+
+The reference loop only keeps B:. Here every decode is a leaf evaluation of a PUCT
+search:
+
+  priors   legal M: moves, softmax over their E: evals / prior_temperature (rank-based
+           if evals are missing; B: is added if it is not in the list; uniform over all
+           legal moves if nothing parses)
+  value    best E: eval of the position, mapped from pawns to [-1, 1] with the Lichess
+           win-probability curve (E: is read from the side to move)
+
+Leaves are collected across the tree with virtual loss: each selection adds a
+pending loss to the edges it walks, so the next selection in the same batch goes
+elsewhere. Up to batch_size distinct leaves are then decoded together with
+IOBindingDecoder and backed up.
+
+Nodes live in a transposition table keyed by Polyglot Zobrist hash, so move orders
+that reach the same position share statistics, and the table is kept between moves:
+after a move is played, the subtree below the new root already has its visits
+(tree reuse). `prune` drops entries not reachable from the current root when the
+table grows beyond max_nodes. Repetitions on the selection path score as draws.
+With --cache, parsed decodes are also kept in an EvalCache file
+(../rook-clf-demo/eval_cache.py), so later runs skip decodes of known positions.
+
+Usage
+  python mcts.py --model ./assets/model_rookworld.onnx --fen "<fen>" --simulations 64
+  python mcts.py --model ./assets/model_rookworld.onnx --self-play 20 --simulations 64
+  python mcts.py --model ./assets/model_rookworld.onnx \
+      --benchmark ../rook-clf-demo/benchmarks/lichess_puzzles.json --limit 100 --simulations 32
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import sys
+import time
+
+import chess
+import chess.polyglot
+import numpy as np
+
+from iobinding_decoder import IOBindingDecoder
+from prompt_tokenizer import PromptTokenizer
+from worker_pool import PROMPT_FORMATS
+
+MOVE_PATTERN = re.compile(r"\b[a-h][1-8][a-h][1-8][qrbn]?\b", re.IGNORECASE)
+WIN_SCALE = 0.368208  # Lichess win% curve, per pawn
+
+
+def parse_policy_output(text):
+    """(moves, evals, best_move) of a policy decode (parseChessOutput in model-utils.js)."""
+    m = re.search(r"M:\s*(.*?)(?=\s*E:|$)", text, re.IGNORECASE | re.DOTALL)
+    e = re.search(r"E:\s*(.*?)(?=\s*B:|$)", text, re.IGNORECASE | re.DOTALL)
+    b = re.search(r"B:\s*([a-h][1-8][a-h][1-8][qrbn]?)", text, re.IGNORECASE)
+    moves = [move.lower() for move in MOVE_PATTERN.findall(m.group(1))] if m else []
+    evals = []
+    for token in re.split(r"[\s,]+", e.group(1).strip()) if e else []:
+        try:
+            evals.append(float(token))
+        except ValueError:
+            pass
+    return moves, evals, b.group(1).lower() if b else None
+
+
+def win_value(pawns):
+    """Eval in pawns -> expected score in [-1, 1]."""
+    return 2 / (1 + math.exp(-WIN_SCALE * pawns)) - 1
+
+
+def policy_done(text):
+    return "B:" in text and len(text.split("B:")[-1]) > 5
+
+
+class TreeNode:
+    """Edge statistics of one position (shared by every path that reaches it)."""
+
+    __slots__ = ("moves", "priors", "visits", "value_sum", "virtual", "value", "terminal")
+
+    def __init__(self, moves, priors, value, terminal=None):
+        self.moves = moves
+        self.priors = np.asarray(priors, dtype=np.float64)
+        self.visits = np.zeros(len(moves))
+        self.value_sum = np.zeros(len(moves))
+        self.virtual = np.zeros(len(moves))
+        self.value = value
+        self.terminal = terminal
+
+
+def terminal_value(board):
+    """Value of a finished game from the side to move, None if the game goes on."""
+    outcome = board.outcome()
+    if outcome is None:
+        return None
+    return -1.0 if outcome.termination == chess.Termination.CHECKMATE else 0.0
+
+
+class MCTS:
+    def __init__(self, model_path, tokenizer_path="./assets/", model_type="rookworld", batch_size=8,
+                 c_puct=1.5, virtual_loss=1.0, prior_temperature=0.5, max_new_tokens=100, max_nodes=200_000,
+                 session_options=None, cache=None):
+        from transformers import AutoTokenizer
+
+        self.tokenizer = PromptTokenizer(AutoTokenizer.from_pretrained(tokenizer_path))
+        self.template = PROMPT_FORMATS[model_type]
+        self.max_new_tokens = max_new_tokens
+        # Longest FEN prompt is < 60 tokens
+        self.decoder = IOBindingDecoder(model_path, max_length=64 + max_new_tokens, batch_size=batch_size,
+                                        session_options=session_options)
+        self.batch_size = batch_size
+        self.c_puct = c_puct
+        self.virtual_loss = virtual_loss
+        self.prior_temperature = prior_temperature
+        self.max_nodes = max_nodes
+        self.table = {}
+        # Optional EvalCache (../rook-clf-demo/eval_cache.py) of parsed decodes, kept across searches and runs
+        self.cache = cache
+        self.stats = {"evaluations": 0, "batches": 0, "tokens": 0, "decode_seconds": 0.0,
+                      "simulations": 0, "collisions": 0}
+
+    def evaluate(self, boards):
+        """Batched policy decodes -> one TreeNode per board (cached positions skip the decode)."""
+        parsed = [self.cache.get(board) if self.cache is not None else None for board in boards]
+        missing = [i for i, result in enumerate(parsed) if result is None]
+        if missing:
+            prompts = [self.tokenizer(self.template.format(fen=boards[i].fen()), add_special_tokens=False).input_ids
+                       for i in missing]
+            start = time.perf_counter()
+            generated = self.decoder.generate(prompts, self.max_new_tokens,
+                                              stop=lambda row, ids: policy_done(self.tokenizer.decode(ids)),
+                                              eos_token_id=self.tokenizer.eos_token_id)
+            self.stats["decode_seconds"] += time.perf_counter() - start
+            self.stats["evaluations"] += len(missing)
+            self.stats["batches"] += 1
+            self.stats["tokens"] += sum(map(len, generated))
+            for i, ids in zip(missing, generated):
+                parsed[i] = parse_policy_output(self.tokenizer.decode(ids))
+                if self.cache is not None:
+                    self.cache.put(boards[i], parsed[i])
+        return [self.node_from_output(board, *result) for board, result in zip(boards, parsed)]
+
+    def node_from_output(self, board, moves, evals, best):
+        """TreeNode from the parsed M:/E:/B: output of a decode."""
+        legal = {move.uci(): move for move in board.legal_moves}
+        kept, kept_evals = [], []
+        for i, uci in enumerate(moves):
+            if uci in legal and legal[uci] not in kept:
+                kept.append(legal[uci])
+                kept_evals.append(evals[i] if i < len(evals) else None)
+        if best in legal and legal[best] not in kept:
+            kept.insert(0, legal[best])
+            kept_evals.insert(0, None)
+        if not kept:
+            moves = list(legal.values())
+            return TreeNode(moves, np.full(len(moves), 1 / len(moves)), 0.0)
+
+        known = [e for e in kept_evals if e is not None]
+        if len(known) == len(kept):
+            logits = np.array(known) / self.prior_temperature
+        else:
+            logits = -np.log1p(np.arange(len(kept)))  # rank-based
+        priors = np.exp(logits - logits.max())
+        priors /= priors.sum()
+        value = win_value(max(known)) if known else 0.0
+        return TreeNode(kept, priors, value)
+
+    def _select(self, board):
+        """Walk down with PUCT + virtual loss; returns (board, path, key, leaf value or None)."""
+        path, seen = [], set()
+        while True:
+            key = chess.polyglot.zobrist_hash(board)
+            if key in seen:
+                return board, path, key, 0.0  # repetition
+            node = self.table.get(key)
+            if node is None:
+                return board, path, key, None
+            if node.terminal is not None:
+                return board, path, key, node.terminal
+            seen.add(key)
+
+            visits = node.visits + node.virtual * self.virtual_loss
+            value_sum = node.value_sum - node.virtual * self.virtual_loss
+            # Unvisited edges start from the position's own evaluation
+            q = np.where(visits > 0, value_sum / np.maximum(visits, 1e-9), node.value)
+            u = self.c_puct * node.priors * math.sqrt(visits.sum() + 1) / (1 + visits)
+            edge = int(np.argmax(q + u))
+            node.virtual[edge] += 1
+            path.append((node, edge))
+            board.push(node.moves[edge])
+
+    @staticmethod
+    def _backup(path, value):
+        """value is from the side to move at the leaf; edges store their mover's view."""
+        for node, edge in reversed(path):
+            value = -value
+            node.virtual[edge] -= 1
+            node.visits[edge] += 1
+            node.value_sum[edge] += value
+
+    def _add(self, board, key, node=None):
+        terminal = terminal_value(board)
+        if terminal is not None:
+            node = TreeNode([], [], terminal, terminal)
+        self.table[key] = node
+        return node
+
+    def search(self, board, simulations=64, time_budget=None):
+        """Run simulations from `board` (reusing the table); returns the root TreeNode."""
+        deadline = time.perf_counter() + time_budget if time_budget else None
+        root_key = chess.polyglot.zobrist_hash(board)
+        if root_key not in self.table:
+            terminal = terminal_value(board)
+            self._add(board, root_key, None if terminal is not None else self.evaluate([board])[0])
+        root = self.table[root_key]
+        if root.terminal is not None:
+            return root
+
+        done = 0
+        while done < simulations and not (deadline and time.perf_counter() > deadline):
+            leaves, pending = [], set()
+            while len(leaves) < min(self.batch_size, simulations - done):
+                leaf_board, path, key, value = self._select(board.copy(stack=False))
+                if value is None and key not in pending:
+                    terminal = terminal_value(leaf_board)
+                    if terminal is None:
+                        pending.add(key)
+                        leaves.append((leaf_board, path, key))
+                        continue
+                    value = self._add(leaf_board, key).terminal
+                if value is None:
+                    # Leaf already waiting for this batch: undo and evaluate what we have
+                    self.stats["collisions"] += 1
+                    for node, edge in path:
+                        node.virtual[edge] -= 1
+                    break
+                self._backup(path, value)
+                done += 1
+            if leaves:
+                for (leaf_board, path, key), node in zip(leaves, self.evaluate([leaf[0] for leaf in leaves])):
+                    self._add(leaf_board, key, node)
+                    self._backup(path, node.value)
+                done += len(leaves)
+        self.stats["simulations"] += done
+        if len(self.table) > self.max_nodes:
+            self.prune(board)
+        return root
+
+    def best_move(self, board, simulations=64, time_budget=None):
+        root = self.search(board, simulations, time_budget)
+        if not root.moves:
+            return None
+        return root.moves[int(np.argmax(root.visits + root.priors * 1e-6))]
+
+    def prune(self, board, limit=None):
+        """Keep only table entries reachable from `board` (breadth first, at most limit)."""
+        limit = limit or self.max_nodes // 2
+        kept = {}
+        queue = [board.copy(stack=False)]
+        while queue and len(kept) < limit:
+            current = queue.pop(0)
+            key = chess.polyglot.zobrist_hash(current)
+            node = self.table.get(key)
+            if node is None or key in kept:
+                continue
+            kept[key] = node
+            for move, visits in zip(node.moves, node.visits):
+                if visits > 0:
+                    child = current.copy(stack=False)
+                    child.push(move)
+                    queue.append(child)
+        self.table = kept
+
+
+def benchmark(mcts, path, limit, simulations):
+    with open(path, "r") as f:
+        positions = json.load(f)["positions"][:limit]
+    greedy_correct = search_correct = 0
+    start = time.perf_counter()
+    for position in positions:
+        board = chess.Board(position["fen"])
+        mcts.table.clear()
+        root = mcts.search(board, simulations)
+        # The root evaluation is exactly one greedy decode: its first prior is B: or the best M: move
+        greedy = root.moves[int(np.argmax(root.priors))] if root.moves else None
+        best = root.moves[int(np.argmax(root.visits + root.priors * 1e-6))] if root.moves else None
+        greedy_correct += greedy is not None and greedy.uci() == position["correct_move"]
+        search_correct += best is not None and best.uci() == position["correct_move"]
+    elapsed = time.perf_counter() - start
+    stats = mcts.stats
+    print(f"🔧 {len(positions)} positions, {simulations} simulations, batch {mcts.batch_size}")
+    print(f"  {stats['evaluations'] / elapsed:.1f} decodes/s ({stats['evaluations'] / max(stats['batches'], 1):.1f} "
+          f"per batch, {stats['tokens'] / max(stats['decode_seconds'], 1e-9):.0f} tokens/s), "
+          f"{stats['collisions']} virtual-loss collisions")
+    print(f"  greedy prior accuracy: {greedy_correct / len(positions):.3f}")
+    print(f"  MCTS accuracy:         {search_correct / len(positions):.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MCTS with batched RookWorld-LM / ROOK-LM policy decodes")
+    parser.add_argument("--model", default="./assets/model_rookworld.onnx")
+    parser.add_argument("--tokenizer", default="./assets/")
+    parser.add_argument("--model-type", choices=sorted(PROMPT_FORMATS), default="rookworld")
+    parser.add_argument("--fen", default=chess.STARTING_FEN)
+    parser.add_argument("--simulations", type=int, default=64)
+    parser.add_argument("--time-budget", type=float, default=None, help="Seconds per move")
+    parser.add_argument("--batch-size", type=int, default=8, help="Leaves decoded together")
+    parser.add_argument("--c-puct", type=float, default=1.5)
+    parser.add_argument("--virtual-loss", type=float, default=1.0)
+    parser.add_argument("--self-play", type=int, default=0, metavar="PLIES", help="Play PLIES moves with tree reuse")
+    parser.add_argument("--benchmark", default=None)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--cache", default=None, help="Persist parsed decodes in this EvalCache file")
+    args = parser.parse_args()
+
+    cache = None
+    if args.cache:
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "rook-clf-demo"))
+        from eval_cache import EvalCache, model_tag
+        cache = EvalCache(1_000_000, tag=model_tag(args.model))
+        print(f"🔧 Loaded {cache.load(args.cache)} cached decodes from {args.cache}")
+    mcts = MCTS(args.model, args.tokenizer, args.model_type, batch_size=args.batch_size, c_puct=args.c_puct,
+                virtual_loss=args.virtual_loss, cache=cache)
+    if args.benchmark:
+        benchmark(mcts, args.benchmark, args.limit, args.simulations)
+    else:
+        play(mcts, args)
+    if cache is not None:
+        stats = cache.stats()
+        print(f"📊 Cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries")
+        cache.save(args.cache)
+
+
+def play(mcts, args):
+    board = chess.Board(args.fen)
+    for _ in range(max(args.self_play, 1)):
+        reused = 0
+        key = chess.polyglot.zobrist_hash(board)
+        if key in mcts.table:
+            reused = int(mcts.table[key].visits.sum())
+        start = time.perf_counter()
+        root = mcts.search(board, args.simulations, args.time_budget)
+        if not root.moves:
+            print(f"🏁 Game over: {board.result()}")
+            break
+        order = np.argsort(-root.visits)[:5]
+        move = root.moves[int(order[0])]
+        print(f"{board.fen()}  ->  {move.uci()}  ({time.perf_counter() - start:.1f}s, {reused} reused visits; "
+              + ", ".join(f"{root.moves[i].uci()} {int(root.visits[i])}/{root.priors[i]:.2f}" for i in order) + ")")
+        if not args.self_play:
+            break
+        board.push(move)
+    print(f"📊 {mcts.stats['evaluations']} decodes in {mcts.stats['batches']} batches, "
+          f"{len(mcts.table)} table entries")
+
+
+if __name__ == "__main__":
+    main()
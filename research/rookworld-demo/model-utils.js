@@ -34,6 +34,9 @@ export const MODEL_CONFIGS = {
     tokenizerPath: USE_LOCAL
       ? './model/RookWorld-LM-124M/'
       : 'jrahn/RookWorld-LM-124M',
+    // vocab_map.json of a pruned-LM-head export (scripts/prune_vocab.py), e.g.
+    // './model/RookWorld-LM-124M/vocab_map.json'; null for full-vocabulary models
+    vocabMapPath: null,
     supportsEnvironment: true,
     usePrefix: true  // Uses "P: " prefix
   },
@@ -47,6 +50,9 @@ export const MODEL_CONFIGS = {
     tokenizerPath: USE_LOCAL
       ? './model/ROOK-LM-124M/'
       : 'jrahn/ROOK-LM-124M',
+    // vocab_map.json of a pruned-LM-head export (scripts/prune_vocab.py), e.g.
+    // './model/ROOK-LM-124M/vocab_map.json'; null for full-vocabulary models
+    vocabMapPath: null,
     supportsEnvironment: false,
     usePrefix: false  // No prefix, raw FEN
   }
@@ -56,6 +62,7 @@ export const MODEL_CONFIGS = {
 let currentModel = null;
 let onnxSession = null;
 let tokenizer = null;
+let keptIds = null;  // pruned logits index -> GPT-2 token id (null = full vocabulary)
 
 // Utility: create tensor with proper dtype (from test.html)
 function idsTensor(ids, dims, desiredType = 'int64') {
@@ -180,6 +187,13 @@ export async function initializeModel(modelType = 'rookworld', onProgress = null
       graphOptimizationLevel: 'all',
     });
 
+    keptIds = null;
+    if (config.vocabMapPath) {
+      const response = await fetch(config.vocabMapPath);
+      if (!response.ok) throw new Error(`Could not load vocab map ${config.vocabMapPath} (HTTP ${response.status})`);
+      keptIds = (await response.json()).kept_ids;
+    }
+
     if (onProgress) onProgress({ stage: 'model', progress: 100 });
 
     console.log(`Initialized ${config.name} successfully`);
@@ -277,9 +291,10 @@ export async function generateText(prompt, options = {}) {
     const outputs = await onnxSession.run(feeds);
 
     // Use sampling or greedy decoding based on options
-    const nextId = useGreedy ?
+    const nextIndex = useGreedy ?
       greedyNextId(outputs.logits) :
       sampleNextId(outputs.logits, temperature, topK);
+    const nextId = keptIds ? keptIds[nextIndex] : nextIndex;
 
     allIds.push(nextId);
 
@@ -439,6 +454,131 @@ export function parseEnvironmentOutput(text) {
   };
 }
 
+// Incremental parsers for the streaming event API (streaming.py in Python).
+// update(text) takes the generated text so far and returns the items completed since the
+// last call; an item is complete once whitespace, the next marker or '+' follows it.
+export function createPolicyEventParser() {
+  const consumed = { M: 0, E: 0 };
+  const parser = {
+    text: '',
+    moves: [],
+    evaluations: [],
+    bestMove: null,
+    done: false,
+    update(text, final = false) {
+      parser.text = text;
+      const events = [];
+      const markers = Array.from(text.matchAll(/(?:^|\s)([MEB]):/gi));
+      markers.forEach((marker, i) => {
+        const section = marker[1].toUpperCase();
+        const next = markers[i + 1];
+        const end = next ? next.index + next[0].length - 2 : text.length;
+        const content = text.slice(marker.index + marker[0].length, end);
+        let items = content.replace(/,/g, ' ').split(/\s+/).filter(Boolean);
+        if (items.length && !(final || next) && !/\s$/.test(content)) {
+          items = items.slice(0, -1); // last item may still grow
+        }
+        if (section === 'B') {
+          if (items.length && !parser.bestMove && /^[a-h][1-8][a-h][1-8][qrbn]?$/i.test(items[0])) {
+            parser.bestMove = items[0].toLowerCase();
+            parser.done = true;
+            events.push({ type: 'best', move: parser.bestMove });
+          }
+          return;
+        }
+        items.slice(consumed[section]).forEach(item => {
+          if (section === 'M' && /^[a-h][1-8][a-h][1-8][qrbn]?$/i.test(item)) {
+            parser.moves.push(item.toLowerCase());
+            events.push({ type: 'move', index: parser.moves.length - 1, move: item.toLowerCase() });
+          } else if (section === 'E' && !isNaN(parseFloat(item))) {
+            parser.evaluations.push(parseFloat(item));
+            events.push({ type: 'eval', index: parser.evaluations.length - 1, value: parseFloat(item) });
+          }
+        });
+        consumed[section] = Math.max(consumed[section], items.length);
+      });
+      return events;
+    }
+  };
+  return parser;
+}
+
+export function createEnvironmentEventParser() {
+  const names = ['state', 'reward', 'terminated', 'truncated'];
+  const parser = {
+    text: '',
+    fields: {},
+    done: false,
+    update(text, final = false) {
+      parser.text = text;
+      const parts = text.replace(/^[AS]:\s*/i, '').split('+');
+      const fields = (final ? parts : parts.slice(0, -1)).map(p => p.trim()).filter(p => p);
+      const events = [];
+      for (let i = Object.keys(parser.fields).length; i < Math.min(fields.length, names.length); i++) {
+        const name = names[i];
+        let value = fields[i];
+        if (name === 'reward') value = isNaN(parseFloat(value)) ? value : parseFloat(value);
+        if (name === 'terminated' || name === 'truncated') value = value === '1' || value.toLowerCase() === 'true';
+        parser.fields[name] = value;
+        events.push({ type: name, value });
+      }
+      parser.done = Object.keys(parser.fields).length === names.length;
+      return events;
+    }
+  };
+  return parser;
+}
+
+// Turn a callback-based generation into an async iterator of events:
+// { type: 'text', text } with the text so far after every token, the parser's events,
+// and finally { type: 'done', result } with the return value of the generation.
+async function* eventStream(start, parser) {
+  const queue = [];
+  let wake = null;
+  let finished = false;
+  let failure = null;
+  const push = (event) => {
+    queue.push(event);
+    if (wake) wake();
+  };
+
+  start((text) => {
+    push({ type: 'text', text });
+    parser.update(text).forEach(push);
+  })
+    .then((result) => {
+      parser.update(result.text ?? result.raw ?? parser.text, true).forEach(push);
+      push({ type: 'done', result });
+    })
+    .catch((error) => { failure = error; })
+    .finally(() => {
+      finished = true;
+      if (wake) wake();
+    });
+
+  while (true) {
+    if (queue.length) {
+      yield queue.shift();
+      continue;
+    }
+    if (failure) throw failure;
+    if (finished) return;
+    await new Promise(resolve => { wake = resolve; });
+    wake = null;
+  }
+}
+
+// for await (const event of streamPolicyEvents(fen)) { ... } - move / eval / best events
+export function streamPolicyEvents(prompt, options = {}) {
+  return eventStream(onToken => generateText(prompt, { ...options, onToken }), createPolicyEventParser());
+}
+
+// Environment fields (state / reward / terminated / truncated) as they are generated
+export function streamEnvironmentEvents(state, action, history = '', options = {}) {
+  return eventStream(onToken => generateEnvironment(state, action, history, { ...options, onToken }),
+    createEnvironmentEventParser());
+}
+
 // Switch between models
 export async function switchModel(modelType, onProgress = null) {
   if (currentModel === modelType && onnxSession) {
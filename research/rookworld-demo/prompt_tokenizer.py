@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+FEN-aware, memoizing prompt encoder with ids identical to the GPT-2 BPE tokenizer.
+
+Prompts are "P: <fen>", the raw FEN (ROOK-LM) or "A: <fen>+<action>+<history>+", so they
+are made of a small set of recurring fragments: rank strings, " w", " KQkq", " -",
+move counters, moves and the "+" / "/" separators. PromptTokenizer splits a prompt into
+such fragments, runs the BPE tokenizer once per distinct fragment and afterwards only
+concatenates memoized ids: a few dict lookups instead of pre-tokenization and BPE merges.
+
+This is exact because GPT-2 pre-tokenization never lets a pre-token cross a fragment
+boundary: fragments are split before a space (the space starts the next pre-token) and
+around "/" and "+", and letters, digits and punctuation always end up in separate
+pre-tokens. Prompts where this does not hold (two punctuation characters meeting at a
+boundary such as "++", inner runs of whitespace, apostrophes, special tokens, non-ASCII
+text) are encoded with the tokenizer itself and counted as fallbacks.
+
+PromptTokenizer wraps an AutoTokenizer and forwards everything else (decode,
+eos_token_id, ...), so it can be used in its place. `--verify` checks the ids against the
+BPE tokenizer for all benchmark prompts in every prompt format and exits 1 on a mismatch.
+
+Usage
+  python prompt_tokenizer.py --verify
+  python prompt_tokenizer.py --benchmark ../rook-clf-demo/benchmarks/gdm_searchless.json
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+FRAGMENT_PATTERN = re.compile(r" ?[^\s/+]+|[/+]|\s+")
+UNSAFE_PATTERN = re.compile(r"'|<\|")
+BENCHMARK_DIR = Path("../rook-clf-demo/benchmarks")
+
+
+def _punctuation(char):
+    return not (char.isalnum() or char.isspace())
+
+
+class PromptTokenizer:
+    """Memoized fragment encoder in front of a Hugging Face GPT-2 tokenizer."""
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.fragments = {}
+        self.prompts = 0
+        self.fallbacks = 0
+
+    def __getattr__(self, name):
+        return getattr(self.tokenizer, name)
+
+    def split(self, text):
+        """Fragments of text, or None if memoized fragments could differ from the tokenizer."""
+        if not text.isascii() or UNSAFE_PATTERN.search(text):
+            return None
+        fragments = FRAGMENT_PATTERN.findall(text)
+        for i, fragment in enumerate(fragments):
+            if fragment.isspace() and i + 1 < len(fragments):
+                return None
+            if i and _punctuation(fragments[i - 1][-1]) and _punctuation(fragment[0]):
+                return None
+        return fragments
+
+    def encode(self, text):
+        """Token ids of text (no special tokens)."""
+        self.prompts += 1
+        fragments = self.split(text)
+        if fragments is None:
+            self.fallbacks += 1
+            return self.tokenizer(text, add_special_tokens=False).input_ids
+        ids = []
+        memo = self.fragments
+        for fragment in fragments:
+            fragment_ids = memo.get(fragment)
+            if fragment_ids is None:
+                fragment_ids = memo[fragment] = self.tokenizer(fragment, add_special_tokens=False).input_ids
+            ids.extend(fragment_ids)
+        return ids
+
+    def __call__(self, text, add_special_tokens=False, **kwargs):
+        if kwargs or add_special_tokens:
+            return self.tokenizer(text, add_special_tokens=add_special_tokens, **kwargs)
+        if isinstance(text, str):
+            return SimpleNamespace(input_ids=self.encode(text))
+        return SimpleNamespace(input_ids=[self.encode(t) for t in text])
+
+    def stats(self):
+        return {"prompts": self.prompts, "fallbacks": self.fallbacks, "fragments": len(self.fragments)}
+
+
+def benchmark_prompts(paths=None):
+    """Prompts of every format for all benchmark positions: {format: [prompt, ...]}."""
+    prompts = {"rook-lm": [], "rookworld": [], "rookworld-space": [], "environment": []}
+    for path in paths or sorted(p for p in BENCHMARK_DIR.glob("*.json") if p.name != "manifest.json"):
+        with open(path, "r") as f:
+            data = json.load(f)
+        for position in data if isinstance(data, list) else data["positions"]:
+            fen, move = position["fen"], position.get("correct_move")
+            prompts["rook-lm"].append(fen)
+            prompts["rookworld"].append(f"P: {fen}")
+            prompts["rookworld-space"].append(f"P: {fen} ")
+            if move:
+                prompts["environment"].append(f"A: {fen}+{move}+{move}+")
+    return prompts
+
+
+def verify(tokenizer, prompts):
+    """Compare memoized and BPE ids for every prompt; returns the mismatching prompts."""
+    encoder = PromptTokenizer(tokenizer)
+    mismatches = []
+    for text in prompts:
+        if encoder.encode(text) != tokenizer(text, add_special_tokens=False).input_ids:
+            mismatches.append(text)
+    return mismatches, encoder.stats()
+
+
+def time_encoding(tokenizer, prompts, repeats=3):
+    """Best-of-repeats seconds for BPE and memoized encoding (memo warmed up first)."""
+    encoder = PromptTokenizer(tokenizer)
+    for text in prompts:
+        encoder.encode(text)
+    results = {}
+    for name, encode in (("bpe", lambda t: tokenizer(t, add_special_tokens=False).input_ids),
+                         ("memoized", encoder.encode)):
+        best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            for text in prompts:
+                encode(text)
+            best = min(best, time.perf_counter() - start)
+        results[name] = best
+    return results, encoder.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FEN-aware memoizing prompt tokenizer")
+    parser.add_argument("--tokenizer", default="./assets/")
+    parser.add_argument("--benchmark", nargs="+", default=None, help="Benchmark JSONs (default: all)")
+    parser.add_argument("--verify", action="store_true", help="Check ids against the BPE tokenizer")
+    args = parser.parse_args()
+
+    from transformers import AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+    prompts = benchmark_prompts(args.benchmark)
+
+    if args.verify:
+        failed = False
+        for name, texts in prompts.items():
+            mismatches, stats = verify(tokenizer, texts)
+            print(f"{name:<16} {len(texts):6d} prompts  {stats['fragments']:6d} fragments  "
+                  f"{stats['fallbacks']:5d} fallbacks  {len(mismatches)} mismatches")
+            for text in mismatches[:3]:
+                print(f"  mismatch: {text!r}")
+            failed |= bool(mismatches)
+        print("FAIL" if failed else "OK: identical ids for all prompts")
+        sys.exit(1 if failed else 0)
+
+    print(f"{'format':<16} {'prompts':>7} {'bpe ms':>9} {'memo ms':>9} {'speedup':>8}")
+    for name, texts in prompts.items():
+        seconds, stats = time_encoding(tokenizer, texts)
+        print(f"{name:<16} {len(texts):7d} {seconds['bpe'] * 1000:9.1f} {seconds['memoized'] * 1000:9.1f} "
+              f"{seconds['bpe'] / seconds['memoized']:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -21,17 +21,44 @@ RookWorld-LM (environment):
     Output: "[new_state]+[reward]+[terminated]+[truncated]+""
     Note: History MUST include the current move being made
 
+The decode loops read logits[0, -1, :], so they work with both the full-logits export
+and the last-position export (scripts/export_simple_onnx.py --logits last), which only
+computes the LM head for the final position.
+Models exported with a pruned LM head (--vocab-map, see scripts/prune_vocab.py) ship a
+vocab_map.json next to model.onnx; the argmax index is then mapped back to a GPT-2 id
+through its kept_ids.
+Each test function takes an optional profiler (decode_profiler.DecodeProfiler) that
+times the stages of every decode step; without one the loops run unchanged.
+
 Example usage:
     python reference_implementation.py
 """
 
+import json
 import os
 import onnxruntime as ort
 import numpy as np
 from transformers import AutoTokenizer
 
+from decode_profiler import NullProfiler
+
+
+def load_kept_ids(model_path):
+    """kept_ids of a pruned-vocab export (vocab_map.json next to the model), else None."""
+    map_path = os.path.join(os.path.dirname(model_path), "vocab_map.json")
+    if not os.path.exists(map_path):
+        return None
+    with open(map_path, "r") as f:
+        return np.array(json.load(f)["kept_ids"], dtype=np.int64)
+
 
-def test_rook_lm_policy(tokenizer_path="./assets/", model_path="./assets/model_rook.onnx"):
+def greedy_next_token(logits, kept_ids=None):
+    """Argmax over the last position, as a GPT-2 token id."""
+    index = int(np.argmax(logits[0, -1, :]))
+    return index if kept_ids is None else int(kept_ids[index])
+
+
+def test_rook_lm_policy(tokenizer_path="./assets/", model_path="./assets/model_rook.onnx", profiler=None):
     """Test ROOK-LM policy generation (raw FEN input)"""
     print("\n" + "="*60)
     print("Testing ROOK-LM (Policy Only)")
@@ -39,7 +66,9 @@ def test_rook_lm_policy(tokenizer_path="./assets/", model_path="./assets/model_r
 
     # Load tokenizer and model
     tokenizer = AutoTokenizer.from_pretrained(tokenizer_path)
-    session = ort.InferenceSession(model_path)
+    profiler = profiler or NullProfiler()
+    session = ort.InferenceSession(model_path, sess_options=profiler.session_options())
+    kept_ids = load_kept_ids(model_path)
 
     # ROOK-LM uses raw FEN without prefix
     fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
@@ -51,33 +80,43 @@ def test_rook_lm_policy(tokenizer_path="./assets/", model_path="./assets/model_r
 
     print("Generating response...")
     generated_text = ""
+    profiler.begin(len(generated_ids))
 
     for i in range(100):
-        # Prepare inputs
-        input_ids = np.array([generated_ids], dtype=np.int64)
-        attention_mask = np.ones((1, len(generated_ids)), dtype=np.int64)
-        position_ids = np.arange(0, len(generated_ids), dtype=np.int64).reshape(1, -1)
-
-        # Run inference
-        outputs = session.run(None, {
-            "input_ids": input_ids,
-            "attention_mask": attention_mask,
-            "position_ids": position_ids
-        })
-
-        # Get next token (greedy)
-        logits = outputs[0]
-        next_token_id = int(np.argmax(logits[0, -1, :]))
-        generated_ids.append(next_token_id)
-
-        # Decode new token
-        token_text = tokenizer.decode([next_token_id])
-        generated_text += token_text
-
-        # Stop after best move
-        if "B:" in generated_text and len(generated_text.split("B:")[-1]) > 5:
+        with profiler.step(len(generated_ids)):
+            # Prepare inputs
+            with profiler.stage("inputs"):
+                input_ids = np.array([generated_ids], dtype=np.int64)
+                attention_mask = np.ones((1, len(generated_ids)), dtype=np.int64)
+                position_ids = np.arange(0, len(generated_ids), dtype=np.int64).reshape(1, -1)
+
+            # Run inference
+            with profiler.stage("session_run"):
+                outputs = session.run(None, {
+                    "input_ids": input_ids,
+                    "attention_mask": attention_mask,
+                    "position_ids": position_ids
+                })
+
+            # Get next token (greedy)
+            with profiler.stage("argmax"):
+                logits = outputs[0]
+                next_token_id = greedy_next_token(logits, kept_ids)
+                generated_ids.append(next_token_id)
+
+            # Decode new token
+            with profiler.stage("decode"):
+                token_text = tokenizer.decode([next_token_id])
+                generated_text += token_text
+
+            # Stop after best move
+            with profiler.stage("stop_check"):
+                done = "B:" in generated_text and len(generated_text.split("B:")[-1]) > 5
+        if done:
             break
 
+    profiler.end()
+    profiler.finish(session)
     full_text = tokenizer.decode(generated_ids)
     print(f"\nOutput: {full_text}")
 
@@ -89,7 +128,7 @@ def test_rook_lm_policy(tokenizer_path="./assets/", model_path="./assets/model_r
     return full_text
 
 
-def test_rookworld_policy(tokenizer_path="./assets/", model_path="./assets/model_rookworld.onnx"):
+def test_rookworld_policy(tokenizer_path="./assets/", model_path="./assets/model_rookworld.onnx", profiler=None):
     """Test RookWorld-LM policy generation (P: prompt)"""
     print("\n" + "="*60)
     print("Testing RookWorld-LM (Policy Task)")
@@ -97,7 +136,9 @@ def test_rookworld_policy(tokenizer_path="./assets/", model_path="./assets/model
 
     # Load tokenizer and model
     tokenizer = AutoTokenizer.from_pretrained(tokenizer_path)
-    session = ort.InferenceSession(model_path)
+    profiler = profiler or NullProfiler()
+    session = ort.InferenceSession(model_path, sess_options=profiler.session_options())
+    kept_ids = load_kept_ids(model_path)
 
     # RookWorld-LM policy uses "P: " prefix
     fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
@@ -110,33 +151,43 @@ def test_rookworld_policy(tokenizer_path="./assets/", model_path="./assets/model
 
     print("Generating response...")
     generated_text = ""
+    profiler.begin(len(generated_ids))
 
     for i in range(100):
-        # Prepare inputs
-        input_ids = np.array([generated_ids], dtype=np.int64)
-        attention_mask = np.ones((1, len(generated_ids)), dtype=np.int64)
-        position_ids = np.arange(0, len(generated_ids), dtype=np.int64).reshape(1, -1)
-
-        # Run inference
-        outputs = session.run(None, {
-            "input_ids": input_ids,
-            "attention_mask": attention_mask,
-            "position_ids": position_ids
-        })
-
-        # Get next token (greedy)
-        logits = outputs[0]
-        next_token_id = int(np.argmax(logits[0, -1, :]))
-        generated_ids.append(next_token_id)
-
-        # Decode new token
-        token_text = tokenizer.decode([next_token_id])
-        generated_text += token_text
-
-        # Stop after best move
-        if "B:" in generated_text and len(generated_text.split("B:")[-1]) > 5:
+        with profiler.step(len(generated_ids)):
+            # Prepare inputs
+            with profiler.stage("inputs"):
+                input_ids = np.array([generated_ids], dtype=np.int64)
+                attention_mask = np.ones((1, len(generated_ids)), dtype=np.int64)
+                position_ids = np.arange(0, len(generated_ids), dtype=np.int64).reshape(1, -1)
+
+            # Run inference
+            with profiler.stage("session_run"):
+                outputs = session.run(None, {
+                    "input_ids": input_ids,
+                    "attention_mask": attention_mask,
+                    "position_ids": position_ids
+                })
+
+            # Get next token (greedy)
+            with profiler.stage("argmax"):
+                logits = outputs[0]
+                next_token_id = greedy_next_token(logits, kept_ids)
+                generated_ids.append(next_token_id)
+
+            # Decode new token
+            with profiler.stage("decode"):
+                token_text = tokenizer.decode([next_token_id])
+                generated_text += token_text
+
+            # Stop after best move
+            with profiler.stage("stop_check"):
+                done = "B:" in generated_text and len(generated_text.split("B:")[-1]) > 5
+        if done:
             break
 
+    profiler.end()
+    profiler.finish(session)
     full_text = tokenizer.decode(generated_ids)
     print(f"\nOutput: {full_text}")
 
@@ -148,7 +199,7 @@ def test_rookworld_policy(tokenizer_path="./assets/", model_path="./assets/model
     return full_text
 
 
-def test_rookworld_environment(tokenizer_path="./assets/", model_path="./assets/model_rookworld.onnx"):
+def test_rookworld_environment(tokenizer_path="./assets/", model_path="./assets/model_rookworld.onnx", profiler=None):
     """Test RookWorld-LM environment simulation (A: prompt)"""
     print("\n" + "="*60)
     print("Testing RookWorld-LM (Environment Task)")
@@ -156,7 +207,9 @@ def test_rookworld_environment(tokenizer_path="./assets/", model_path="./assets/
 
     # Load tokenizer and model
     tokenizer = AutoTokenizer.from_pretrained(tokenizer_path)
-    session = ort.InferenceSession(model_path)
+    profiler = profiler or NullProfiler()
+    session = ort.InferenceSession(model_path, sess_options=profiler.session_options())
+    kept_ids = load_kept_ids(model_path)
 
     # Environment task format
     state = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
@@ -173,36 +226,45 @@ def test_rookworld_environment(tokenizer_path="./assets/", model_path="./assets/
 
     print("\nGenerating response...")
     generated_text = ""
+    profiler.begin(len(generated_ids))
     plus_count = 0
 
     for i in range(150):
-        # Prepare inputs
-        input_ids = np.array([generated_ids], dtype=np.int64)
-        attention_mask = np.ones((1, len(generated_ids)), dtype=np.int64)
-        position_ids = np.arange(0, len(generated_ids), dtype=np.int64).reshape(1, -1)
-
-        # Run inference
-        outputs = session.run(None, {
-            "input_ids": input_ids,
-            "attention_mask": attention_mask,
-            "position_ids": position_ids
-        })
-
-        # Get next token (greedy)
-        logits = outputs[0]
-        next_token_id = int(np.argmax(logits[0, -1, :]))
-        generated_ids.append(next_token_id)
-
-        # Decode new token
-        token_text = tokenizer.decode([next_token_id])
-        generated_text += token_text
-
-        # Count '+' delimiters to know when to stop
-        if token_text == "+":
-            plus_count += 1
-            if plus_count >= 4:  # Stop after truncated field
-                break
+        with profiler.step(len(generated_ids)):
+            # Prepare inputs
+            with profiler.stage("inputs"):
+                input_ids = np.array([generated_ids], dtype=np.int64)
+                attention_mask = np.ones((1, len(generated_ids)), dtype=np.int64)
+                position_ids = np.arange(0, len(generated_ids), dtype=np.int64).reshape(1, -1)
+
+            # Run inference
+            with profiler.stage("session_run"):
+                outputs = session.run(None, {
+                    "input_ids": input_ids,
+                    "attention_mask": attention_mask,
+                    "position_ids": position_ids
+                })
+
+            # Get next token (greedy)
+            with profiler.stage("argmax"):
+                logits = outputs[0]
+                next_token_id = greedy_next_token(logits, kept_ids)
+                generated_ids.append(next_token_id)
+
+            # Decode new token
+            with profiler.stage("decode"):
+                token_text = tokenizer.decode([next_token_id])
+                generated_text += token_text
+
+            # Count '+' delimiters to know when to stop
+            with profiler.stage("stop_check"):
+                if token_text == "+":
+                    plus_count += 1
+        if plus_count >= 4:  # Stop after truncated field
+            break
 
+    profiler.end()
+    profiler.finish(session)
     full_text = tokenizer.decode(generated_ids)
     print(f"\nOutput: {full_text}")
 
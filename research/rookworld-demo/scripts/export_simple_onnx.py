@@ -2,17 +2,130 @@
 """
 Export simple ONNX models without KV cache for demo usage.
 This creates cleaner models with just input_ids -> logits.
+
+Logits modes (--logits):
+  full   logits [batch, seq, vocab] for every position (optimum export, default)
+  last   logits [batch, 1, vocab] for the last attended position of each row only
+  index  logits [batch, k, vocab] at the positions given by an extra
+         `logits_positions` [batch, k] int64 input
+
+In "last" and "index" mode the hidden states are sliced *before* the LM head, so the
+[hidden x 50257] projection and the output copy shrink by a factor of the sequence
+length. "last" keeps the rank-3 output, so consumers that read logits[0, -1, :]
+(reference_implementation.py, greedyNextId/sampleNextId in model-utils.js) work unchanged.
+
+--vocab-map vocab_map.json (from scripts/prune_vocab.py) additionally restricts the LM head
+to the kept token ids, so the last dimension of logits is len(kept_ids) instead of 50257.
+The map is copied next to model.onnx; decoders translate argmax indices with kept_ids.
+This always uses the torch export path ("full" then computes the pruned head for every
+position).
+
+--external-data packs the exported model.onnx in place with page-aligned external data
+(scripts/external_data.py), so sessions map the weights read-only and share them.
+
+--package DIR also writes content-addressed chunks and a manifest per model into DIR
+(scripts/package_chunks.py), so clients only fetch the tensors that changed.
+
+--validate compares every export with its PyTorch checkpoint afterwards
+(scripts/validate_exports.py: logit deviation, top-1 agreement, benchmark accuracy and
+latency) and exits non-zero if parity drops.
 """
 
+import argparse
+import json
 import os
+import shutil
 import torch
 from transformers import AutoModelForCausalLM, GPT2TokenizerFast
 from optimum.onnxruntime import ORTModelForCausalLM
 
-def export_simple_model(model_path, output_path, model_name):
+from external_data import pack_external_data
+from package_chunks import package_model
+from validate_exports import add_validation_arguments, validate
+
+
+class SelectedPositionLogits(torch.nn.Module):
+    """GPT-2 body with the LM head applied only at selected positions."""
+
+    def __init__(self, model, mode="last", kept_ids=None):
+        super().__init__()
+        self.transformer = model.transformer
+        self.lm_head = model.lm_head
+        if kept_ids is not None:
+            # Only the rows of the kept token ids (GPT-2 ties lm_head to wte)
+            weight = model.lm_head.weight.detach()[torch.as_tensor(kept_ids, dtype=torch.long)]
+            self.lm_head = torch.nn.Linear(weight.shape[1], weight.shape[0], bias=False)
+            self.lm_head.weight = torch.nn.Parameter(weight.clone())
+        self.mode = mode
+
+    def forward(self, input_ids, attention_mask, position_ids, logits_positions=None):
+        hidden = self.transformer(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            use_cache=False,
+            return_dict=True,
+        ).last_hidden_state  # [B, S, H]
+
+        if self.mode == "full":
+            return self.lm_head(hidden)  # [B, S, V]
+        if self.mode == "last":
+            # Last attended position per row (works for left and right padding)
+            seq = torch.arange(hidden.shape[1], device=hidden.device, dtype=torch.long)
+            logits_positions = (attention_mask.to(torch.long) * seq).max(dim=-1).values.unsqueeze(-1)  # [B, 1]
+
+        index = logits_positions.unsqueeze(-1).expand(-1, -1, hidden.shape[-1])  # [B, K, H]
+        return self.lm_head(torch.gather(hidden, 1, index))  # [B, K, V]
+
+
+def export_selected_logits_model(model, output_path, mode, opset=17, kept_ids=None):
+    """torch.onnx.export of SelectedPositionLogits to output_path/model.onnx."""
+    model.config.use_cache = False
+    model.eval()
+    wrapper = SelectedPositionLogits(model, mode, kept_ids)
+
+    ids = torch.zeros((1, 8), dtype=torch.long)
+    mask = torch.ones((1, 8), dtype=torch.long)
+    pos = torch.arange(8, dtype=torch.long).unsqueeze(0)
+    inputs = (ids, mask, pos)
+    input_names = ["input_ids", "attention_mask", "position_ids"]
+    dynamic_axes = {
+        "input_ids": {0: "batch", 1: "sequence"},
+        "attention_mask": {0: "batch", 1: "sequence"},
+        "position_ids": {0: "batch", 1: "sequence"},
+        "logits": {0: "batch"},
+    }
+    if mode == "full":
+        dynamic_axes["logits"][1] = "sequence"
+    if mode == "index":
+        inputs = inputs + (torch.tensor([[7]], dtype=torch.long),)
+        input_names.append("logits_positions")
+        dynamic_axes["logits_positions"] = {0: "batch", 1: "positions"}
+        dynamic_axes["logits"][1] = "positions"
+
+    with torch.no_grad():
+        torch.onnx.export(
+            wrapper,
+            inputs,
+            os.path.join(output_path, "model.onnx"),
+            input_names=input_names,
+            output_names=["logits"],
+            dynamic_axes=dynamic_axes,
+            do_constant_folding=True,
+            opset_version=opset,
+        )
+    model.config.save_pretrained(output_path)
+
+
+def export_simple_model(model_path, output_path, model_name, logits_mode="full", vocab_map=None, external_data=False):
     """Export model with use_cache=False for simpler inference."""
 
-    print(f"Exporting {model_name} without KV cache...")
+    kept_ids = None
+    if vocab_map:
+        with open(vocab_map, 'r') as f:
+            kept_ids = json.load(f)["kept_ids"]
+    print(f"Exporting {model_name} without KV cache (logits: {logits_mode}"
+          + (f", LM head pruned to {len(kept_ids)} ids" if kept_ids else "") + ")...")
 
     # Load model
     model = AutoModelForCausalLM.from_pretrained(model_path, local_files_only=True)
@@ -29,18 +142,25 @@ def export_simple_model(model_path, output_path, model_name):
 
     print(f"Model config after setting: use_cache = {model.config.use_cache}")
 
-    # Export with optimum (should respect use_cache=False)
-    ort_model = ORTModelForCausalLM.from_pretrained(
-        model_path,
-        export=True,
-        use_cache=False,
-        local_files_only=True
-    )
-
-    # Save the simplified model
     os.makedirs(output_path, exist_ok=True)
-    ort_model.save_pretrained(output_path)
+    if logits_mode == "full" and kept_ids is None:
+        # Export with optimum (should respect use_cache=False)
+        ort_model = ORTModelForCausalLM.from_pretrained(
+            model_path,
+            export=True,
+            use_cache=False,
+            local_files_only=True
+        )
+
+        # Save the simplified model
+        ort_model.save_pretrained(output_path)
+    else:
+        export_selected_logits_model(model, output_path, logits_mode, kept_ids=kept_ids)
+    if vocab_map:
+        shutil.copyfile(vocab_map, os.path.join(output_path, "vocab_map.json"))
     tokenizer.save_pretrained(output_path)
+    if external_data:
+        pack_external_data(os.path.join(output_path, "model.onnx"))
 
     print(f"✅ Exported to {output_path}")
 
@@ -48,37 +168,71 @@ def export_simple_model(model_path, output_path, model_name):
     import onnxruntime as ort
     sess = ort.InferenceSession(os.path.join(output_path, "model.onnx"))
     print(f"Exported model inputs: {[inp.name for inp in sess.get_inputs()]}")
-    print(f"Exported model outputs: {[out.name for out in sess.get_outputs()]}")
+    print(f"Exported model outputs: {[(out.name, out.shape) for out in sess.get_outputs()]}")
 
     return output_path
 
 def main():
+    parser = argparse.ArgumentParser(description="Export ROOK-LM / RookWorld-LM to ONNX without KV cache")
+    parser.add_argument("--logits", choices=["full", "last", "index"], default="full",
+                        help="Which positions get logits: all (default), last attended position, or given by a logits_positions input")
+    parser.add_argument("--vocab-map", default=None,
+                        help="vocab_map.json from scripts/prune_vocab.py: restrict the LM head to its kept ids")
+    parser.add_argument("--external-data", action="store_true",
+                        help="Store weights as page-aligned external data (model.onnx.data) for shared mmap loading")
+    parser.add_argument("--package", default=None,
+                        help="Also write content-addressed chunks + manifest per model into this directory")
+    parser.add_argument("--output-root", default="./model_simple", help="Directory that receives one folder per model")
+    parser.add_argument("--validate", action="store_true",
+                        help="Compare each export with the PyTorch model on a benchmark sample")
+    add_validation_arguments(parser)
+    args = parser.parse_args()
+
     models = [
         {
             'name': 'RookWorld-LM-124M-Simple',
+            'task': 'rookworld',
             'input_path': './temp_models/RookWorld-LM-124M',
-            'output_path': './model_simple/RookWorld-LM-124M'
+            'output_path': os.path.join(args.output_root, 'RookWorld-LM-124M')
         },
         {
             'name': 'ROOK-LM-124M-Simple',
+            'task': 'rook-lm',
             'input_path': './temp_models/ROOK-LM-124M',
-            'output_path': './model_simple/ROOK-LM-124M'
+            'output_path': os.path.join(args.output_root, 'ROOK-LM-124M')
         }
     ]
 
+    failed = []
     for model_info in models:
         try:
             export_simple_model(
                 model_info['input_path'],
                 model_info['output_path'],
-                model_info['name']
+                model_info['name'],
+                logits_mode=args.logits,
+                vocab_map=args.vocab_map,
+                external_data=args.external_data
             )
         except Exception as e:
             print(f"❌ Failed to export {model_info['name']}: {e}")
+            continue
+        if args.package:
+            package_model(os.path.join(model_info['output_path'], 'model.onnx'), args.package,
+                          name=os.path.basename(model_info['output_path']))
+        if args.validate:
+            ok = validate(model_info['input_path'], [os.path.join(model_info['output_path'], 'model.onnx')],
+                          model_info['task'], args.benchmark, args.limit, args.max_new_tokens,
+                          args.min_agreement, args.max_accuracy_drop, args.max_deviation,
+                          args.report and f"{os.path.splitext(args.report)[0]}_{model_info['task']}.json")
+            if not ok:
+                failed.append(model_info['name'])
 
     print("\n🎯 To use simple models, update MODEL_CONFIGS in model-utils.js:")
     print("Change modelPath from './model/RookWorld-LM-124M/model.onnx'")
-    print("to './model_simple/RookWorld-LM-124M/model.onnx'")
+    print(f"to '{args.output_root}/RookWorld-LM-124M/model.onnx'")
+    if failed:
+        raise SystemExit(f"❌ Export validation failed: {', '.join(failed)}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
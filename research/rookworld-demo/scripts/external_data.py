@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Page-aligned ONNX external-data packaging and a loader that maps the weights read-only.
+
+A monolithic model.onnx is parsed and every initializer is copied into the private
+memory of each process that opens it (~500 MB per process for the 124M LMs). This
+stores the graph in a small model.onnx and all initializers in model.onnx.data, each
+tensor starting at a multiple of ALIGN (64 KiB: page size on Linux, allocation
+granularity on Windows). ONNX Runtime memory-maps such external data instead of reading
+it. When weight pre-packing is also disabled (pre-packed weights are private re-layouts),
+the kernels run directly on the mapped pages:
+
+  - sessions in several processes share one copy of the weights in the page cache
+  - session creation reads the small graph and maps the data file, no parse/copy of weights
+
+`load_session` creates such a session (checks the layout and sets
+session.disable_prepacking). `measure` opens a model in a fresh process and reports how
+much of its memory is file-backed (shareable) vs anonymous (private).
+
+Usage
+  python scripts/external_data.py pack model_simple/RookWorld-LM-124M/model.onnx   # in place
+  python scripts/external_data.py pack model.onnx --output packed/model.onnx
+  python scripts/external_data.py inspect packed/model.onnx
+  python scripts/external_data.py measure packed/model.onnx
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import onnx
+from onnx import numpy_helper
+from onnx.external_data_helper import set_external_data
+
+ALIGN = 64 * 1024
+SIZE_THRESHOLD = 1024  # smaller tensors stay inline in the graph
+
+
+def _initializers(graph):
+    """Initializers of a graph and all its subgraphs."""
+    yield from graph.initializer
+    for node in graph.node:
+        for attribute in node.attribute:
+            if attribute.type == onnx.AttributeProto.GRAPH:
+                yield from _initializers(attribute.g)
+            elif attribute.type == onnx.AttributeProto.GRAPHS:
+                for subgraph in attribute.graphs:
+                    yield from _initializers(subgraph)
+
+
+def _clear_data_fields(tensor):
+    for field in ("raw_data", "float_data", "int32_data", "int64_data", "double_data", "uint64_data", "string_data"):
+        tensor.ClearField(field)
+
+
+def pack_external_data(model_path, output_path=None, align=ALIGN, size_threshold=SIZE_THRESHOLD):
+    """Write model + page-aligned <output>.data; returns the output model path."""
+    output_path = output_path or model_path
+    model = onnx.load(model_path)  # loads existing external data into memory
+    location = os.path.basename(output_path) + ".data"
+    data_path = os.path.join(os.path.dirname(os.path.abspath(output_path)), location)
+    os.makedirs(os.path.dirname(data_path), exist_ok=True)
+
+    tensors = 0
+    with open(data_path + ".tmp", "wb") as f:
+        for tensor in _initializers(model.graph):
+            raw = tensor.raw_data if tensor.HasField("raw_data") else numpy_helper.to_array(tensor).tobytes()
+            if len(raw) < size_threshold or tensor.data_type == onnx.TensorProto.STRING:
+                continue
+            offset = -(-f.tell() // align) * align
+            f.write(b"\0" * (offset - f.tell()))
+            f.write(raw)
+            tensor.raw_data = raw
+            set_external_data(tensor, location, offset, len(raw))
+            _clear_data_fields(tensor)
+            tensor.data_location = onnx.TensorProto.EXTERNAL
+            tensors += 1
+
+    os.replace(data_path + ".tmp", data_path)
+    onnx.save(model, output_path)
+    print(f"✅ Packed {tensors} initializers ({os.path.getsize(data_path) / 1e6:.1f} MB, {align}-byte aligned) "
+          f"-> {output_path} + {location}")
+    return output_path
+
+
+def inspect_layout(model_path):
+    """External tensors of a model as dicts (name, location, offset, length, aligned)."""
+    model = onnx.load(model_path, load_external_data=False)
+    tensors = []
+    for tensor in _initializers(model.graph):
+        if tensor.data_location != onnx.TensorProto.EXTERNAL:
+            continue
+        info = {entry.key: entry.value for entry in tensor.external_data}
+        offset = int(info.get("offset", 0))
+        tensors.append({
+            "name": tensor.name,
+            "location": info["location"],
+            "offset": offset,
+            "length": int(info.get("length", 0)),
+            "aligned": offset % ALIGN == 0,
+        })
+    return tensors
+
+
+def is_packed(model_path):
+    """True if all large initializers are external and page aligned."""
+    model = onnx.load(model_path, load_external_data=False)
+    inline = [t for t in _initializers(model.graph)
+              if t.data_location != onnx.TensorProto.EXTERNAL and len(t.raw_data) >= SIZE_THRESHOLD]
+    tensors = inspect_layout(model_path)
+    return bool(tensors) and not inline and all(t["aligned"] for t in tensors)
+
+
+def shared_weights_options(options=None):
+    """SessionOptions that keep initializers on the mapped external data file."""
+    import onnxruntime as ort
+
+    options = options or ort.SessionOptions()
+    options.add_session_config_entry("session.disable_prepacking", "1")
+    return options
+
+
+def load_session(model_path, session_options=None, providers=None, require_packed=True):
+    """InferenceSession whose weights are mapped read-only from the external data file."""
+    import onnxruntime as ort
+
+    if require_packed and not is_packed(model_path):
+        raise ValueError(f"{model_path} is not packed with page-aligned external data "
+                         f"(run: python scripts/external_data.py pack {model_path})")
+    return ort.InferenceSession(model_path, sess_options=shared_weights_options(session_options),
+                                providers=providers or ["CPUExecutionProvider"])
+
+
+def _memory_mb():
+    fields = {}
+    with open("/proc/self/smaps_rollup", "r") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if value.strip().endswith("kB"):
+                fields[key] = int(value.split()[0]) / 1024
+    return {
+        "rss": fields.get("Rss", 0.0),
+        "anonymous": fields.get("Anonymous", 0.0),
+        "file_backed": fields.get("Rss", 0.0) - fields.get("Anonymous", 0.0),
+    }
+
+
+def _measure_child(model_path, shared):
+    import onnxruntime as ort
+
+    before = _memory_mb()
+    start = time.perf_counter()
+    options = shared_weights_options() if shared else ort.SessionOptions()
+    session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+    load_time = time.perf_counter() - start
+    # One run with dummy inputs (dynamic dims = 1) so mapped weights are actually paged in
+    dtypes = {"tensor(int64)": np.int64, "tensor(int32)": np.int32, "tensor(float)": np.float32}
+    session.run(None, {i.name: np.zeros([d if isinstance(d, int) else 1 for d in i.shape], dtype=dtypes[i.type])
+                       for i in session.get_inputs()})
+    after = _memory_mb()
+    print(json.dumps({key: after[key] - before[key] for key in after} | {"load_seconds": load_time}))
+
+
+def measure(model_path, shared=True):
+    """Session memory of a model in a fresh process: anonymous (private) vs file-backed (shareable)."""
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "_measure", model_path] + ([] if shared else ["--private"]),
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Page-aligned ONNX external data for shared, memory-mapped weights")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    pack = sub.add_parser("pack", help="Move initializers to a page-aligned .data file")
+    pack.add_argument("model")
+    pack.add_argument("--output", default=None, help="Output model path (default: in place)")
+    pack.add_argument("--align", type=int, default=ALIGN)
+
+    inspect = sub.add_parser("inspect", help="List external tensors and their alignment")
+    inspect.add_argument("model")
+
+    measure_cmd = sub.add_parser("measure", help="Session memory in a fresh process")
+    measure_cmd.add_argument("model")
+    measure_cmd.add_argument("--private", action="store_true", help="Keep ORT weight pre-packing enabled")
+
+    child = sub.add_parser("_measure")
+    child.add_argument("model")
+    child.add_argument("--private", action="store_true")
+
+    args = parser.parse_args()
+    if args.command == "pack":
+        pack_external_data(args.model, args.output, align=args.align)
+    elif args.command == "inspect":
+        tensors = inspect_layout(args.model)
+        for t in tensors:
+            print(f"  {t['name']:<60} {t['location']} @ {t['offset']:>12} ({t['length'] / 1e6:8.2f} MB)"
+                  + ("" if t["aligned"] else "  UNALIGNED"))
+        total = sum(t["length"] for t in tensors)
+        print(f"{len(tensors)} external tensors, {total / 1e6:.1f} MB, packed: {is_packed(args.model)}")
+    elif args.command == "measure":
+        stats = measure(args.model, shared=not args.private)
+        print(f"Session memory for {args.model}: {stats['rss']:.0f} MB resident, "
+              f"{stats['anonymous']:.0f} MB private (anonymous), {stats['file_backed']:.0f} MB file-backed/shareable, "
+              f"created in {stats['load_seconds']:.2f}s")
+    else:
+        _measure_child(args.model, shared=not args.private)
+
+
+if __name__ == "__main__":
+    main()
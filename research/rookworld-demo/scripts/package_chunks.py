@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Content-addressed, chunked packaging of ONNX models for delta updates and parallel fetch.
+
+A cached model blob is all or nothing: any new export is downloaded again in full. This
+packs a model with page-aligned external data (scripts/external_data.py) and splits it
+into chunks named by their sha256:
+
+  <output>/chunks/<sha256>          chunk content (written once, shared by all versions)
+  <output>/<name>.manifest.json     graph and data file: size, sha256, chunk list with
+                                    offsets; tensors: name, byte range, chunk range
+
+The graph (model.onnx without weights) is chunked as a whole. The weights are chunked per
+tensor: every initializer starts a new chunk and is cut into --chunk-size pieces, so a
+chunk never spans two tensors and its hash does not depend on where the tensor ends up
+in the data file. Re-exporting a model with some changed tensors (fine-tune of the head,
+new quantization of one layer) leaves the chunks of all other tensors unchanged, and
+publishing both versions into the same output directory stores them once.
+
+A client reads the manifest, fetches the chunks it does not have yet in parallel,
+checks each chunk's sha256 as it arrives, writes it at its offset into a zero-filled
+buffer (alignment gaps stay zero) and passes the graph plus the data buffer to ONNX
+Runtime. `fetch` is that client in Python (local directory or http(s) base URL, with a
+chunk cache directory); model-utils.js of the ROOK-CLF demo does the same in the browser
+with an IndexedDB chunk store. `diff` shows how much of a new version can be reused.
+
+Usage
+  python scripts/package_chunks.py package model_simple/RookWorld-LM-124M/model.onnx --output packages/ --name rookworld-v2
+  python scripts/package_chunks.py diff packages/rookworld-v1.manifest.json packages/rookworld-v2.manifest.json
+  python scripts/package_chunks.py fetch packages/rookworld-v2.manifest.json --output fetched/ --cache chunk_cache/
+  python scripts/package_chunks.py verify packages/rookworld-v2.manifest.json
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from external_data import ALIGN, inspect_layout, pack_external_data
+
+CHUNK_SIZE = 4 * 1024 * 1024
+MANIFEST_VERSION = 1
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _store_chunk(chunks_dir, data):
+    digest = _sha256(data)
+    path = chunks_dir / digest
+    if not path.exists():
+        tmp_path = chunks_dir / f".{digest}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return digest
+
+
+def _split(data, base, chunk_size, chunks_dir, new):
+    chunks = []
+    for start in range(0, len(data), chunk_size):
+        piece = data[start:start + chunk_size]
+        existed = (chunks_dir / _sha256(piece)).exists()
+        chunks.append({"sha256": _store_chunk(chunks_dir, piece), "size": len(piece), "offset": base + start})
+        new[0] += 0 if existed else len(piece)
+    return chunks
+
+
+def package_model(model_path, output_dir, name=None, chunk_size=CHUNK_SIZE, align=ALIGN):
+    """Write the chunks of a model into output_dir/chunks and its manifest; returns the manifest path."""
+    output_dir = Path(output_dir)
+    chunks_dir = output_dir / "chunks"
+    chunks_dir.mkdir(parents=True, exist_ok=True)
+    name = name or Path(model_path).parent.name or Path(model_path).stem
+    new = [0]
+    with tempfile.TemporaryDirectory() as tmp:
+        packed = pack_external_data(model_path, os.path.join(tmp, "model.onnx"), align=align)
+        with open(packed, "rb") as f:
+            graph = f.read()
+        with open(packed + ".data", "rb") as f:
+            data = f.read()
+        layout = sorted(inspect_layout(packed), key=lambda t: t["offset"])
+
+    tensors, data_chunks = [], []
+    for tensor in layout:
+        first = len(data_chunks)
+        piece = data[tensor["offset"]:tensor["offset"] + tensor["length"]]
+        data_chunks.extend(_split(piece, tensor["offset"], chunk_size, chunks_dir, new))
+        tensors.append({"name": tensor["name"], "offset": tensor["offset"], "length": tensor["length"],
+                        "chunks": [first, len(data_chunks)]})
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "name": name,
+        "source": os.path.basename(model_path),
+        "chunk_size": chunk_size,
+        "align": align,
+        "graph": {"path": "model.onnx", "size": len(graph), "sha256": _sha256(graph),
+                  "chunks": _split(graph, 0, chunk_size, chunks_dir, new)},
+        "data": {"path": "model.onnx.data", "size": len(data), "sha256": _sha256(data), "chunks": data_chunks},
+        "tensors": tensors,
+    }
+    manifest_path = output_dir / f"{name}.manifest.json"
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=1)
+
+    total = sum(c["size"] for c in manifest["graph"]["chunks"] + data_chunks)
+    print(f"📦 {name}: {len(data_chunks) + len(manifest['graph']['chunks'])} chunks, {total / 1e6:.1f} MB "
+          f"({new[0] / 1e6:.1f} MB new in {chunks_dir}) -> {manifest_path}")
+    return manifest_path
+
+
+def load_manifest(source):
+    """Manifest from a local path or http(s) URL."""
+    if str(source).startswith(("http://", "https://")):
+        with urllib.request.urlopen(source) as response:
+            return json.load(response)
+    with open(source, "r") as f:
+        return json.load(f)
+
+
+def _chunk_base(source):
+    source = str(source)
+    if source.startswith(("http://", "https://")):
+        return source.rsplit("/", 1)[0] + "/chunks/"
+    return str(Path(source).parent / "chunks") + os.sep
+
+
+def diff_manifests(old, new):
+    """Bytes of new that are already available from old's chunks, and bytes to fetch."""
+    have = {c["sha256"] for part in ("graph", "data") for c in old[part]["chunks"]}
+    unique = {}
+    for part in ("graph", "data"):
+        for chunk in new[part]["chunks"]:
+            unique[chunk["sha256"]] = chunk["size"]
+    reused = sum(size for digest, size in unique.items() if digest in have)
+    changed = [t["name"] for t in new["tensors"]
+               if any(c["sha256"] not in have for c in new["data"]["chunks"][t["chunks"][0]:t["chunks"][1]])]
+    return {"total": sum(unique.values()), "reused": reused, "fetch": sum(unique.values()) - reused,
+            "changed_tensors": changed}
+
+
+def fetch_package(source, output_dir, cache_dir=None, workers=8):
+    """Assemble model.onnx + model.onnx.data from a manifest; chunks are verified and cached."""
+    manifest = load_manifest(source)
+    base = _chunk_base(source)
+    cache = Path(cache_dir) if cache_dir else None
+    if cache:
+        cache.mkdir(parents=True, exist_ok=True)
+    stats = {"fetched": 0, "cached": 0}
+
+    def get(digest):
+        if cache and (cache / digest).exists():
+            with open(cache / digest, "rb") as f:
+                data = f.read()
+            if _sha256(data) == digest:
+                stats["cached"] += len(data)
+                return digest, data
+        url = base + digest
+        if url.startswith(("http://", "https://")):
+            with urllib.request.urlopen(url) as response:
+                data = response.read()
+        else:
+            with open(url, "rb") as f:
+                data = f.read()
+        if _sha256(data) != digest:
+            raise ValueError(f"Chunk {digest} failed verification")
+        stats["fetched"] += len(data)
+        if cache:
+            _store_chunk(cache, data)
+        return digest, data
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    digests = list(dict.fromkeys(c["sha256"] for part in ("graph", "data") for c in manifest[part]["chunks"]))
+    with ThreadPoolExecutor(workers) as pool:
+        chunks = dict(pool.map(get, digests))
+    for part in ("graph", "data"):
+        entry = manifest[part]
+        buffer = bytearray(entry["size"])
+        for chunk in entry["chunks"]:
+            buffer[chunk["offset"]:chunk["offset"] + chunk["size"]] = chunks[chunk["sha256"]]
+        if _sha256(buffer) != entry["sha256"]:
+            raise ValueError(f"Assembled {entry['path']} does not match the manifest")
+        tmp_path = output_dir / f".{entry['path']}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(buffer)
+        os.replace(tmp_path, output_dir / entry["path"])
+    print(f"✅ {manifest['name']}: {stats['fetched'] / 1e6:.1f} MB fetched, {stats['cached'] / 1e6:.1f} MB from "
+          f"cache -> {output_dir / manifest['graph']['path']}")
+    return output_dir / manifest["graph"]["path"]
+
+
+def verify_package(manifest_path):
+    """Re-hash every chunk of a manifest; returns the missing or corrupt digests."""
+    manifest = load_manifest(manifest_path)
+    chunks_dir = Path(_chunk_base(manifest_path))
+    bad = []
+    for chunk in manifest["graph"]["chunks"] + manifest["data"]["chunks"]:
+        path = chunks_dir / chunk["sha256"]
+        if not path.exists() or path.stat().st_size != chunk["size"] or _sha256(path.read_bytes()) != chunk["sha256"]:
+            bad.append(chunk["sha256"])
+    return bad
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Content-addressed chunked ONNX packages")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    package = sub.add_parser("package", help="Split a model into content-addressed chunks")
+    package.add_argument("model")
+    package.add_argument("--output", required=True, help="Package directory (shared by all versions)")
+    package.add_argument("--name", default=None, help="Manifest name (default: model directory name)")
+    package.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    diff = sub.add_parser("diff", help="Chunks of NEW already present in OLD")
+    diff.add_argument("old")
+    diff.add_argument("new")
+
+    fetch = sub.add_parser("fetch", help="Assemble a model from a manifest (path or URL)")
+    fetch.add_argument("manifest")
+    fetch.add_argument("--output", required=True)
+    fetch.add_argument("--cache", default=None, help="Chunk cache directory")
+    fetch.add_argument("--workers", type=int, default=8)
+
+    verify = sub.add_parser("verify", help="Re-hash all chunks of a manifest")
+    verify.add_argument("manifest")
+
+    args = parser.parse_args()
+    if args.command == "package":
+        package_model(args.model, args.output, args.name, args.chunk_size)
+    elif args.command == "diff":
+        result = diff_manifests(load_manifest(args.old), load_manifest(args.new))
+        print(f"{result['total'] / 1e6:.1f} MB total, {result['reused'] / 1e6:.1f} MB reused, "
+              f"{result['fetch'] / 1e6:.1f} MB to fetch")
+        for name in result["changed_tensors"]:
+            print(f"  changed: {name}")
+    elif args.command == "fetch":
+        fetch_package(args.manifest, args.output, args.cache, args.workers)
+    else:
+        bad = verify_package(args.manifest)
+        print(f"❌ {len(bad)} missing or corrupt chunks" if bad else "✅ All chunks verified")
+        if bad:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
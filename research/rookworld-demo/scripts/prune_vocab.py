@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Find the GPT-2 token ids ROOK-LM / RookWorld-LM can actually emit and write a vocab map.
+
+Both 124M models project onto the full 50257-token GPT-2 vocabulary at every decode
+step, but their outputs only ever contain FEN, UCI, eval and environment text. This
+script builds a corpus in the training-format grammar and tokenizes it with the
+model tokenizer:
+
+  ROOK-LM     <fen>, then "P: <fen><pad to col 92> M: <moves> E: <evals> B: <move>"
+  RookWorld   "P: <fen>" with the same policy completion
+  RookWorld   "A: <fen>+<move>+<history>+<new fen>+<reward>+<terminated>+<truncated>+"
+
+FENs come from the rook-clf-demo benchmarks and chess_positions.json; moves are legal
+moves (python-chess), evals and rewards are random numbers in the formats the models
+print. Whole strings are tokenized (BPE merges depend on context), and the union of
+ids is kept together with every whitespace-run token (padding) and eos. With
+--all-numbers every digit token is kept as well, which makes numeric fields safe
+regardless of their value range at the cost of ~1700 extra columns.
+
+The result is vocab_map.json:
+
+  {"kept_ids": [...],   # pruned index -> GPT-2 id, sorted
+   "base_vocab_size": 50257, "tokenizer_sha256": ..., ...}
+
+`scripts/export_simple_onnx.py --vocab-map vocab_map.json` exports models whose LM head
+only has these rows and copies the map next to model.onnx, where
+reference_implementation.py and model-utils.js pick it up to map argmax indices back to
+GPT-2 ids. Prompts are unaffected: the input embedding keeps the full vocabulary.
+
+Usage
+  python scripts/prune_vocab.py                         # -> vocab_map.json
+  python scripts/prune_vocab.py --check outputs.txt     # report tokens outside the map
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+from pathlib import Path
+
+import chess
+from transformers import AutoTokenizer
+
+TOKENIZER_DIR = Path('./assets')
+BENCHMARK_DIR = Path('../rook-clf-demo/benchmarks')
+POSITIONS_JSON = Path('../rook-clf-demo/chess_positions.json')
+PAD_COLUMN = 92
+REWARDS = ["0.001", "-0.001", "0", "0.5", "-0.5", "1", "-1", "1.0", "-1.0", "0.0"]
+FLAGS = ["0", "1", "True", "False", "true", "false"]
+
+
+def load_fens(benchmark_dir=BENCHMARK_DIR, positions_json=POSITIONS_JSON):
+    fens = []
+    for path in sorted(Path(benchmark_dir).glob('*.json')):
+        if path.name == 'manifest.json':
+            continue
+        with open(path, 'r') as f:
+            fens.extend(p["fen"] for p in json.load(f)["positions"])
+    if Path(positions_json).exists():
+        with open(positions_json, 'r') as f:
+            fens.extend(p["fen"] for p in json.load(f))
+    return list(dict.fromkeys(fens))
+
+
+def format_eval(rng):
+    """A random eval in one of the number formats the models print."""
+    value = rng.choice([rng.uniform(-3, 3), rng.uniform(-30, 30), rng.uniform(-300, 300)])
+    text = rng.choice(["{:.2f}", "{:.1f}", "{:.0f}"]).format(value)
+    if '.' in text and rng.random() < 0.5:
+        text = text.rstrip('0').rstrip('.')
+    return "0" if text in ("-0", "") else text
+
+
+def policy_completion(board, rng, max_moves=5):
+    moves = [m.uci() for m in board.legal_moves]
+    rng.shuffle(moves)
+    moves = moves[:rng.randint(1, max_moves)]
+    evals = [format_eval(rng) for _ in moves]
+    return f"M: {' '.join(moves)} E: {' '.join(evals)} B: {moves[0]}"
+
+
+def random_history(board, rng, max_plies=12):
+    board = board.copy(stack=False)
+    history = []
+    for _ in range(rng.randint(0, max_plies)):
+        moves = list(board.legal_moves)
+        if not moves:
+            break
+        move = rng.choice(moves)
+        history.append(move.uci())
+        board.push(move)
+    return history
+
+
+def grammar_samples(fen, rng):
+    """Training-format strings for one position (policy and environment)."""
+    board = chess.Board(fen)
+    samples = [fen, f"P: {fen}", f"P: {fen} "]
+    if any(board.legal_moves):
+        completion = policy_completion(board, rng)
+        samples.append(f"P: {fen}".ljust(PAD_COLUMN) + " " + completion)
+        samples.append(f"P: {fen} " + completion)
+
+        move = rng.choice(list(board.legal_moves))
+        history = random_history(board, rng) + [move.uci()]
+        after = board.copy(stack=False)
+        after.push(move)
+        samples.append(
+            f"A: {fen}+{move.uci()}+{' '.join(history)}+{after.fen()}+"
+            f"{rng.choice(REWARDS)}+{rng.choice(FLAGS)}+{rng.choice(FLAGS)}+"
+        )
+    return samples
+
+
+def closure_ids(tokenizer, all_numbers=False):
+    """Tokens the corpus may miss by chance: whitespace runs, optionally all numbers."""
+    pattern = re.compile(r'\s+|\s?-?\d+|\.\d+|-' if all_numbers else r'\s+')
+    ids = {tokenizer.eos_token_id}
+    for token, token_id in tokenizer.get_vocab().items():
+        if pattern.fullmatch(tokenizer.convert_tokens_to_string([token])):
+            ids.add(token_id)
+    return ids
+
+
+def scan_vocab(fens, tokenizer, samples_per_fen=4, all_numbers=False, seed=0):
+    rng = random.Random(seed)
+    corpus_ids = set()
+    texts = 0
+    batch = []
+    for i, fen in enumerate(fens):
+        for _ in range(samples_per_fen):
+            batch.extend(grammar_samples(fen, rng))
+        if len(batch) >= 4096 or i == len(fens) - 1:
+            for ids in tokenizer(batch, add_special_tokens=False).input_ids:
+                corpus_ids.update(ids)
+            texts += len(batch)
+            batch = []
+    extra_ids = closure_ids(tokenizer, all_numbers)
+    return sorted(corpus_ids | extra_ids), {
+        "positions": len(fens),
+        "texts": texts,
+        "corpus_ids": len(corpus_ids),
+        "closure_ids": len(extra_ids - corpus_ids),
+    }
+
+
+def load_vocab_map(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def check_coverage(vocab_map, tokenizer, text_path):
+    """Report tokens of real model outputs (one per line) that the map cannot emit."""
+    kept = set(vocab_map["kept_ids"])
+    missing = {}
+    with open(text_path, 'r') as f:
+        lines = [line.rstrip('\n') for line in f if line.strip()]
+    for line in lines:
+        for token_id in tokenizer(line, add_special_tokens=False).input_ids:
+            if token_id not in kept:
+                missing[token_id] = missing.get(token_id, 0) + 1
+    print(f"Checked {len(lines)} lines against {len(kept)} kept ids: {len(missing)} ids missing")
+    for token_id, count in sorted(missing.items(), key=lambda x: -x[1])[:20]:
+        print(f"  {token_id:>6} {tokenizer.decode([token_id])!r}: {count}")
+    return missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan the ROOK/RookWorld output grammar for reachable GPT-2 token ids")
+    parser.add_argument("--tokenizer", default=str(TOKENIZER_DIR), help="GPT-2 tokenizer directory")
+    parser.add_argument("--benchmark-dir", default=str(BENCHMARK_DIR))
+    parser.add_argument("--positions", default=str(POSITIONS_JSON))
+    parser.add_argument("--samples-per-fen", type=int, default=4)
+    parser.add_argument("--all-numbers", action="store_true", help="Keep every digit token, not just the ones seen")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="vocab_map.json")
+    parser.add_argument("--check", default=None, help="Only check a file of model outputs against an existing --output map")
+    args = parser.parse_args()
+
+    tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+    if args.check:
+        check_coverage(load_vocab_map(args.output), tokenizer, args.check)
+        return
+
+    fens = load_fens(args.benchmark_dir, args.positions)
+    if not fens:
+        raise SystemExit(f"No FENs found in {args.benchmark_dir} or {args.positions}")
+    print(f"🔍 Scanning {len(fens)} positions x {args.samples_per_fen} samples...")
+    kept_ids, stats = scan_vocab(fens, tokenizer, args.samples_per_fen, args.all_numbers, args.seed)
+
+    base = len(tokenizer)
+    vocab_map = {
+        "version": 1,
+        "base_vocab_size": base,
+        "tokenizer_sha256": hashlib.sha256((Path(args.tokenizer) / 'tokenizer.json').read_bytes()).hexdigest(),
+        "eos_token_id": tokenizer.eos_token_id,
+        "all_numbers": args.all_numbers,
+        "stats": stats,
+        "kept_ids": kept_ids,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(vocab_map, f)
+
+    print(f"✅ Kept {len(kept_ids)} of {base} ids ({stats['corpus_ids']} from {stats['texts']} texts, "
+          f"{stats['closure_ids']} whitespace/number tokens) -> {args.output}")
+    print(f"   LM head: {base} -> {len(kept_ids)} columns ({base / len(kept_ids):.0f}x fewer)")
+
+
+if __name__ == "__main__":
+    main()
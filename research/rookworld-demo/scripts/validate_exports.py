@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Validate ROOK-LM / RookWorld-LM ONNX exports against the PyTorch model on a benchmark sample.
+
+The PyTorch model decodes the first --limit positions of a benchmark greedily (the
+reference loop: full recompute, logits of the last position). Every ONNX variant
+(--logits full / last / index, pruned vocab, external data, quantized ...) is then
+teacher-forced along the same tokens with IOBindingDecoder and also decodes freely:
+
+  max_dev     max |logit difference| at the generated positions (over kept_ids for
+              pruned-vocab exports)
+  top1        share of generated positions where the greedy token equals PyTorch's
+  accuracy    free-running greedy best move (B:) == correct_move
+  latency     median decode step in ms (batch 1)
+
+A variant fails if its top-1 agreement is below --min-agreement, its accuracy drops
+more than --max-accuracy-drop points below PyTorch, or (if given) its deviation exceeds
+--max-deviation; the script then exits with status 1. export_simple_onnx.py --validate
+runs this after every export.
+
+Usage
+  python scripts/validate_exports.py --model ./temp_models/RookWorld-LM-124M --task rookworld \
+      --variant ./model_simple/RookWorld-LM-124M/model.onnx --variant ./assets/model_rookworld.onnx \
+      --benchmark ../rook-clf-demo/benchmarks/lichess_puzzles.json --limit 50 --report validation.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def load_prompts(benchmark, limit, task):
+    with open(benchmark, "r") as f:
+        positions = json.load(f)["positions"][:limit]
+    prefix = "P: " if task == "rookworld" else ""
+    return [prefix + p["fen"] for p in positions], [p["correct_move"] for p in positions]
+
+
+def best_move(text):
+    if "B:" not in text:
+        return None
+    fields = text.split("B:")[-1].strip().split()
+    return fields[0] if fields else None
+
+
+def torch_decode(model, prompt, max_new_tokens, stop):
+    """Greedy reference decode; returns new ids, the logits they were picked from and step times."""
+    import torch
+
+    ids = list(prompt)
+    new_ids, logits, times = [], [], []
+    for _ in range(max_new_tokens):
+        start = time.perf_counter()
+        input_ids = torch.tensor([ids])
+        out = model(input_ids=input_ids, attention_mask=torch.ones_like(input_ids),
+                    position_ids=torch.arange(len(ids)).unsqueeze(0)).logits[0, -1].numpy()
+        token = int(out.argmax())
+        times.append(time.perf_counter() - start)
+        logits.append(out)
+        ids.append(token)
+        new_ids.append(token)
+        if stop(0, new_ids):
+            break
+    return new_ids, np.stack(logits), times
+
+
+def compare_variant(path, prompts, references, moves, tokenizer, max_new_tokens):
+    """Teacher-forced parity and free-running accuracy of one ONNX export."""
+    from iobinding_decoder import IOBindingDecoder
+    from worker_pool import best_move_stop
+
+    longest = max(len(p) + len(r[0]) for p, r in zip(prompts, references))
+    decoder = IOBindingDecoder(path, max_length=max(longest, max(len(p) for p in prompts) + max_new_tokens) + 1)
+    kept_ids = decoder.kept_ids
+    deviation, agree, steps, times, correct = 0.0, 0, 0, [], 0
+    for prompt, (new_ids, ref_logits, _), move in zip(prompts, references, moves):
+        decoder.reset([prompt])
+        for token, ref in zip(new_ids, ref_logits):
+            start = time.perf_counter()
+            logits = decoder.forward()
+            predicted = int(decoder.next_tokens(logits)[0])
+            times.append(time.perf_counter() - start)
+            expected = ref if kept_ids is None else ref[kept_ids]
+            deviation = max(deviation, float(np.abs(logits[0] - expected).max()))
+            agree += predicted == int(ref.argmax())
+            steps += 1
+            decoder.append(np.array([token]))
+        generated = decoder.generate([prompt], max_new_tokens, stop=best_move_stop(tokenizer),
+                                     eos_token_id=tokenizer.eos_token_id)[0]
+        correct += best_move(tokenizer.decode(generated)) == move
+    return {
+        "max_dev": deviation,
+        "top1": agree / steps if steps else 0.0,
+        "accuracy": correct / len(prompts) * 100,
+        "latency_ms": float(np.median(times) * 1000),
+    }
+
+
+def validate(model_path, variants, task="rookworld", benchmark="../rook-clf-demo/benchmarks/lichess_puzzles.json",
+             limit=50, max_new_tokens=100, min_agreement=0.97, max_accuracy_drop=2.0, max_deviation=None,
+             report=None):
+    """Run the matrix and print it; returns True if every variant keeps parity."""
+    import torch
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+    from worker_pool import best_move_stop
+
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    model = AutoModelForCausalLM.from_pretrained(model_path)
+    model.config.use_cache = False
+    model.eval()
+    torch.set_grad_enabled(False)
+
+    texts, moves = load_prompts(benchmark, limit, task)
+    prompts = [tokenizer(text, add_special_tokens=False).input_ids for text in texts]
+    print(f"Decoding {len(prompts)} prompts with PyTorch...")
+    stop = best_move_stop(tokenizer)
+    references = [torch_decode(model, prompt, max_new_tokens, stop) for prompt in prompts]
+    rows = [{
+        "variant": "pytorch",
+        "max_dev": 0.0,
+        "top1": 1.0,
+        "accuracy": sum(best_move(tokenizer.decode(r[0])) == move for r, move in zip(references, moves))
+        / len(prompts) * 100,
+        "latency_ms": float(np.median([t for r in references for t in r[2]]) * 1000),
+        "passed": True,
+    }]
+    for path in variants:
+        print(f"Validating {path}...")
+        row = {"variant": path, **compare_variant(path, prompts, references, moves, tokenizer, max_new_tokens)}
+        row["accuracy_drop"] = rows[0]["accuracy"] - row["accuracy"]
+        row["passed"] = (row["top1"] >= min_agreement and row["accuracy_drop"] <= max_accuracy_drop
+                         and (max_deviation is None or row["max_dev"] <= max_deviation))
+        rows.append(row)
+
+    print(f"\nExport validation on {len(prompts)} positions of {benchmark} ({task})")
+    print(f"{'variant':<52} {'max_dev':>9} {'top1':>7} {'acc %':>7} {'ms':>8}")
+    for row in rows:
+        name = row["variant"] if len(row["variant"]) <= 52 else "..." + row["variant"][-49:]
+        print(f"{name:<52} {row['max_dev']:9.2e} {row['top1'] * 100:6.1f}% {row['accuracy']:7.2f} "
+              f"{row['latency_ms']:8.3f}{'' if row['passed'] else '  FAIL'}")
+    if report:
+        with open(report, "w") as f:
+            json.dump({"benchmark": benchmark, "positions": len(prompts), "model": model_path, "task": task,
+                       "thresholds": {"min_agreement": min_agreement, "max_accuracy_drop": max_accuracy_drop,
+                                      "max_deviation": max_deviation},
+                       "rows": rows}, f, indent=2)
+        print(f"Wrote {report}")
+    return all(row["passed"] for row in rows)
+
+
+def add_validation_arguments(parser):
+    parser.add_argument("--benchmark", default="../rook-clf-demo/benchmarks/lichess_puzzles.json",
+                        help="Benchmark JSON for the sample")
+    parser.add_argument("--limit", type=int, default=50, help="Positions in the sample")
+    parser.add_argument("--max-new-tokens", type=int, default=100)
+    parser.add_argument("--min-agreement", type=float, default=0.97, help="Minimum top-1 agreement with PyTorch")
+    parser.add_argument("--max-accuracy-drop", type=float, default=2.0, help="Maximum accuracy loss in points")
+    parser.add_argument("--max-deviation", type=float, default=None, help="Maximum logit deviation")
+    parser.add_argument("--report", default=None, help="Write the matrix as JSON")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare ROOK-LM / RookWorld-LM ONNX exports with the PyTorch model")
+    parser.add_argument("--model", required=True, help="Local checkpoint directory (model + tokenizer)")
+    parser.add_argument("--task", choices=["rookworld", "rook-lm"], default="rookworld",
+                        help="Prompt format: 'P: <fen>' (RookWorld-LM) or the raw FEN (ROOK-LM)")
+    parser.add_argument("--variant", action="append", required=True, help="Exported model.onnx (repeatable)")
+    add_validation_arguments(parser)
+    args = parser.parse_args()
+
+    ok = validate(args.model, args.variant, args.task, args.benchmark, args.limit, args.max_new_tokens,
+                  args.min_agreement, args.max_accuracy_drop, args.max_deviation, args.report)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Streaming generation API: parsed events while ROOK-LM / RookWorld-LM decode.
+
+The reference functions return after the whole sequence is generated. StreamingGenerator
+instead yields events as tokens arrive, so a client can render the first candidate
+moves after a few tokens:
+
+  {"type": "token", "id": 362, "text": " e"}        every generated token
+  {"type": "move", "index": 0, "move": "e2e4"}      each M: candidate
+  {"type": "eval", "index": 0, "value": 0.31}       each E: evaluation
+  {"type": "best", "move": "e2e4"}                  the B: move (ends the policy stream)
+  {"type": "state" | "reward" | "terminated" | "truncated", "value": ...}
+                                                    environment fields (A: prompts)
+  {"type": "done", "text": ..., "tokens": n, "result": {...}}
+
+An item is emitted once it is complete, i.e. followed by whitespace, the next section
+marker or '+' (so "e7e8" is not reported before a possible promotion piece). The
+parsers (PolicyEventParser, EnvironmentEventParser) are incremental and can also be
+fed text from any other decoder. Decoding uses IOBindingDecoder, so every export of
+scripts/export_simple_onnx.py works.
+
+`policy()` / `environment()` are generators; `apolicy()` / `aenvironment()` are async
+iterators over the same events, stepping the decoder in a worker thread so the event
+loop of a server stays responsive. One StreamingGenerator runs one stream at a time.
+
+Usage
+  python streaming.py --model ./assets/model_rookworld.onnx --fen "<fen>"
+  python streaming.py --model ./assets/model_rookworld.onnx --fen "<fen>" --action e2e4 --history e2e4
+"""
+
+import argparse
+import asyncio
+import re
+import time
+
+from iobinding_decoder import IOBindingDecoder
+
+MOVE_PATTERN = re.compile(r"^[a-h][1-8][a-h][1-8][qrbn]?$", re.IGNORECASE)
+SECTION_PATTERN = re.compile(r"(?:^|\s)([MEB]):", re.IGNORECASE)
+ENV_FIELDS = ("state", "reward", "terminated", "truncated")
+
+
+class PolicyEventParser:
+    """Incremental parser of "M: <moves> E: <evals> B: <move>" text."""
+
+    def __init__(self):
+        self.text = ""
+        self.moves = []
+        self.evals = []
+        self.best = None
+        self.done = False
+        self._consumed = {"M": 0, "E": 0}
+
+    def feed(self, delta):
+        self.text += delta
+        return self._events(final=False)
+
+    def finish(self):
+        return self._events(final=True)
+
+    def _events(self, final):
+        events = []
+        markers = list(SECTION_PATTERN.finditer(self.text))
+        for i, marker in enumerate(markers):
+            section = marker.group(1).upper()
+            closed = final or i + 1 < len(markers)
+            content = self.text[marker.end():markers[i + 1].start(1) if i + 1 < len(markers) else len(self.text)]
+            items = content.replace(",", " ").split()
+            if items and not (closed or content[-1].isspace()):
+                items = items[:-1]  # last item may still grow
+            if section == "B":
+                if items and self.best is None and MOVE_PATTERN.match(items[0]):
+                    self.best = items[0].lower()
+                    self.done = True
+                    events.append({"type": "best", "move": self.best})
+                continue
+            for item in items[self._consumed[section]:]:
+                if section == "M" and MOVE_PATTERN.match(item):
+                    self.moves.append(item.lower())
+                    events.append({"type": "move", "index": len(self.moves) - 1, "move": self.moves[-1]})
+                elif section == "E":
+                    try:
+                        value = float(item)
+                    except ValueError:
+                        continue
+                    self.evals.append(value)
+                    events.append({"type": "eval", "index": len(self.evals) - 1, "value": value})
+            self._consumed[section] = max(self._consumed[section], len(items))
+        return events
+
+    def result(self):
+        return {"moves": self.moves, "evals": self.evals, "best": self.best}
+
+
+def _env_value(name, field):
+    if name == "state":
+        return field
+    if name == "reward":
+        try:
+            return float(field)
+        except ValueError:
+            return field
+    return field.lower() in ("1", "true")
+
+
+class EnvironmentEventParser:
+    """Incremental parser of "<state>+<reward>+<terminated>+<truncated>+" text."""
+
+    def __init__(self):
+        self.text = ""
+        self.fields = {}
+        self.done = False
+
+    def feed(self, delta):
+        self.text += delta
+        return self._events(final=False)
+
+    def finish(self):
+        return self._events(final=True)
+
+    def _events(self, final):
+        parts = self.text.split("+")
+        complete = parts if final else parts[:-1]
+        fields = [part.strip() for part in complete if part.strip()]
+        events = []
+        for name, field in zip(ENV_FIELDS[len(self.fields):], fields[len(self.fields):]):
+            self.fields[name] = _env_value(name, field)
+            events.append({"type": name, "value": self.fields[name]})
+        self.done = len(self.fields) == len(ENV_FIELDS)
+        return events
+
+    def result(self):
+        return dict(self.fields)
+
+
+async def aiterate(events):
+    """Async iterator over a blocking event generator (each step runs in a worker thread)."""
+    loop = asyncio.get_running_loop()
+    end = object()
+    while True:
+        event = await loop.run_in_executor(None, next, events, end)
+        if event is end:
+            return
+        yield event
+
+
+class StreamingGenerator:
+    """Policy / environment generation as a stream of parsed events."""
+
+    def __init__(self, model_path, tokenizer, max_length=256, session_options=None):
+        self.decoder = IOBindingDecoder(model_path, max_length=max_length, session_options=session_options)
+        self.tokenizer = tokenizer
+
+    def stream(self, prompt, parser, max_new_tokens=144, temperature=0.0, top_k=10, rng=None):
+        """Decode prompt, yielding token events and the events of parser; stops when parser is done."""
+        decoder, tokenizer = self.decoder, self.tokenizer
+        decoder.reset([tokenizer(prompt, add_special_tokens=False).input_ids])
+        tokens = 0
+        for _ in range(max_new_tokens):
+            if decoder.lengths[0] >= decoder.max_length:
+                break
+            token = decoder.next_tokens(decoder.forward(), temperature, top_k, rng)
+            token_id = int(token[0])
+            if token_id == tokenizer.eos_token_id:
+                break
+            decoder.append(token)
+            tokens += 1
+            text = tokenizer.decode([token_id])
+            yield {"type": "token", "id": token_id, "text": text}
+            yield from parser.feed(text)
+            if parser.done:
+                break
+        yield from parser.finish()
+        yield {"type": "done", "text": parser.text, "tokens": tokens, "result": parser.result()}
+
+    def policy(self, fen, model_type="rookworld", **kwargs):
+        """Events of a policy decode ("P: <fen>" for RookWorld-LM, the raw FEN for ROOK-LM)."""
+        prompt = f"P: {fen}" if model_type == "rookworld" else fen
+        return self.stream(prompt, PolicyEventParser(), **kwargs)
+
+    def environment(self, state, action, history, **kwargs):
+        """Events of an environment step (history must include the current action)."""
+        return self.stream(f"A: {state}+{action}+{history}+", EnvironmentEventParser(), **kwargs)
+
+    def apolicy(self, fen, model_type="rookworld", **kwargs):
+        return aiterate(self.policy(fen, model_type, **kwargs))
+
+    def aenvironment(self, state, action, history, **kwargs):
+        return aiterate(self.environment(state, action, history, **kwargs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream parsed ROOK-LM / RookWorld-LM events")
+    parser.add_argument("--model", default="./assets/model_rookworld.onnx")
+    parser.add_argument("--tokenizer", default="./assets/")
+    parser.add_argument("--model-type", choices=["rookworld", "rook"], default="rookworld")
+    parser.add_argument("--fen", default="rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1")
+    parser.add_argument("--action", default=None, help="Run an environment step for this move instead")
+    parser.add_argument("--history", default=None, help="Move history including --action")
+    parser.add_argument("--max-new-tokens", type=int, default=144)
+    parser.add_argument("--tokens", action="store_true", help="Also print token events")
+    args = parser.parse_args()
+
+    from transformers import AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+    generator = StreamingGenerator(args.model, tokenizer, max_length=128 + args.max_new_tokens)
+
+    if args.action:
+        events = generator.environment(args.fen, args.action, args.history or args.action,
+                                       max_new_tokens=args.max_new_tokens)
+    else:
+        events = generator.policy(args.fen, args.model_type, max_new_tokens=args.max_new_tokens)
+    start = time.perf_counter()
+    for event in events:
+        if event["type"] == "token" and not args.tokens:
+            continue
+        elapsed = (time.perf_counter() - start) * 1000
+        details = {k: v for k, v in event.items() if k not in ("type", "text")} if event["type"] == "done" else \
+            {k: v for k, v in event.items() if k != "type"}
+        print(f"{elapsed:8.1f} ms  {event['type']:<10} {details}")
+
+
+if __name__ == "__main__":
+    main()
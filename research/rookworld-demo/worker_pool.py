@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Multi-process evaluation of ROOK-LM / RookWorld-LM: a pool of pinned ONNX Runtime sessions.
+
+One InferenceSession with default threading stops scaling long before a 64-core host
+is busy: per-op parallelism of a 124M model at batch 1 is limited, and the Python
+decode loop is single threaded. SessionPool instead starts N worker processes, each
+with its own session configured with
+
+  intra_op_num_threads   threads per operator (per worker)
+  inter_op_num_threads   1 by default (sequential execution)
+  CPU affinity           optional: worker i is pinned to its own slice of cores
+
+Batches of prompts are dispatched from a central queue, so fast workers take more work.
+Each worker decodes with IOBindingDecoder (iobinding_decoder.py).
+
+Weights: with a monolithic model.onnx every process parses and keeps a private copy of
+all initializers (~500 MB for 124M params). With share_weights=True the model is first
+packed once to page-aligned external data (scripts/external_data.py, stored in
+<model dir>/external/ unless the model already is packed, together with the
+vocab_map.json of pruned-vocabulary exports) and workers load it with pre-packing
+disabled, so initializers stay on the memory-mapped data file and are shared through
+the page cache.
+
+`--scaling` runs the same benchmark prompts under several workers x threads
+configurations and reports throughput (positions/s, tokens/s) and best-move accuracy.
+`--verify N` also decodes the first N prompts in-process with the original model and
+exits 1 if the pool generated different text for any of them.
+
+Usage
+  python worker_pool.py --model ./assets/model_rookworld.onnx \
+      --benchmark ../rook-clf-demo/benchmarks/lichess_puzzles.json --limit 256 \
+      --scaling 1x8,2x4,4x2,8x1 --pin
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import shutil
+import time
+import traceback
+
+import numpy as np
+
+from prompt_tokenizer import PromptTokenizer
+from scripts.external_data import is_packed, pack_external_data, shared_weights_options
+
+PROMPT_FORMATS = {
+    "rookworld": "P: {fen}",
+    "rook-lm": "{fen}",
+}
+
+
+def shared_weights_model(model_path, output_dir=None):
+    """Page-aligned external-data copy of a model (packed once, reused while up to date)."""
+    if is_packed(model_path):
+        return model_path
+    output_dir = output_dir or os.path.join(os.path.dirname(model_path), "external")
+    output = os.path.join(output_dir, os.path.basename(model_path))
+    if not (os.path.exists(output) and os.path.getmtime(output) >= os.path.getmtime(model_path)):
+        pack_external_data(model_path, output)
+    # IOBindingDecoder looks for the vocab map of pruned-head exports next to the model
+    vocab_map = os.path.join(os.path.dirname(model_path), "vocab_map.json")
+    if os.path.exists(vocab_map):
+        shutil.copyfile(vocab_map, os.path.join(output_dir, "vocab_map.json"))
+    return output
+
+
+def session_options(intra_op_threads, inter_op_threads=1, share_weights=False):
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = intra_op_threads
+    options.inter_op_num_threads = inter_op_threads
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    return shared_weights_options(options) if share_weights else options
+
+
+def worker_cores(worker_id, threads, available=None):
+    """Disjoint slice of the available cores for one worker (wraps around if oversubscribed)."""
+    available = sorted(available if available is not None else os.sched_getaffinity(0))
+    start = (worker_id * threads) % len(available)
+    return [available[(start + i) % len(available)] for i in range(min(threads, len(available)))]
+
+
+def parse_best_move(text):
+    if "B:" not in text:
+        return None
+    parts = text.split("B:")[-1].split()
+    return parts[0] if parts else None
+
+
+def best_move_stop(tokenizer):
+    """Stop rule for generate(): the best move after "B:" is complete."""
+    def best_move_done(row, ids):
+        text = tokenizer.decode(ids)
+        return "B:" in text and len(text.split("B:")[-1]) > 5
+    return best_move_done
+
+
+def _worker(worker_id, config, tasks, results):
+    try:
+        if config["pin"] and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, worker_cores(worker_id, config["intra_op_threads"], config["cores"]))
+
+        from transformers import AutoTokenizer
+        from iobinding_decoder import IOBindingDecoder
+
+        start = time.perf_counter()
+        tokenizer = AutoTokenizer.from_pretrained(config["tokenizer"])
+        decoder = IOBindingDecoder(
+            config["model"], max_length=config["max_length"], batch_size=config["batch_size"],
+            session_options=session_options(config["intra_op_threads"], config["inter_op_threads"],
+                                            config["share_weights"]),
+        )
+        results.put(("ready", worker_id, time.perf_counter() - start))
+
+        best_move_done = best_move_stop(tokenizer)
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            batch_id, prompts = task
+            start = time.perf_counter()
+            generated = decoder.generate(prompts, config["max_new_tokens"], stop=best_move_done,
+                                         eos_token_id=tokenizer.eos_token_id)
+            texts = [tokenizer.decode(ids) for ids in generated]
+            results.put(("done", batch_id, worker_id, texts, sum(map(len, generated)),
+                         time.perf_counter() - start))
+    except Exception:
+        results.put(("error", worker_id, traceback.format_exc()))
+
+
+class SessionPool:
+    """N worker processes, each with one ORT session, fed from a central batch queue."""
+
+    def __init__(self, model_path, tokenizer_path="./assets/", workers=1, intra_op_threads=1,
+                 inter_op_threads=1, pin=False, share_weights=True, batch_size=1,
+                 max_length=192, max_new_tokens=100):
+        if share_weights:
+            model_path = shared_weights_model(model_path)
+        self.config = {
+            "model": model_path,
+            "tokenizer": tokenizer_path,
+            "intra_op_threads": intra_op_threads,
+            "inter_op_threads": inter_op_threads,
+            "pin": pin,
+            "cores": sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else [],
+            "share_weights": share_weights,
+            "batch_size": batch_size,
+            "max_length": max_length,
+            "max_new_tokens": max_new_tokens,
+        }
+        self.workers = workers
+        context = mp.get_context("spawn")
+        self.tasks = context.Queue()
+        self.results = context.Queue()
+        self.processes = [context.Process(target=_worker, args=(i, self.config, self.tasks, self.results), daemon=True)
+                          for i in range(workers)]
+        for process in self.processes:
+            process.start()
+
+        self.load_times = []
+        while len(self.load_times) < workers:
+            message = self._get()
+            self.load_times.append(message[2])
+
+    def _get(self):
+        message = self.results.get()
+        if message[0] == "error":
+            self.close()
+            raise RuntimeError(f"Worker {message[1]} failed:\n{message[2]}")
+        return message
+
+    def map(self, prompts):
+        """Generate for all prompts (lists of token ids); returns (texts, stats) in input order."""
+        batch_size = self.config["batch_size"]
+        batches = [prompts[i:i + batch_size] for i in range(0, len(prompts), batch_size)]
+        start = time.perf_counter()
+        for batch_id, batch in enumerate(batches):
+            self.tasks.put((batch_id, batch))
+
+        texts = [None] * len(batches)
+        tokens = 0
+        per_worker = [0] * self.workers
+        for _ in batches:
+            _, batch_id, worker_id, batch_texts, batch_tokens, _ = self._get()
+            texts[batch_id] = batch_texts
+            tokens += batch_tokens
+            per_worker[worker_id] += len(batch_texts)
+        elapsed = time.perf_counter() - start
+        stats = {"seconds": elapsed, "tokens": tokens, "positions": len(prompts), "per_worker": per_worker}
+        return [text for batch in texts for text in batch], stats
+
+    def close(self):
+        for _ in self.processes:
+            self.tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_benchmark_prompts(path, tokenizer, model_type="rookworld", limit=None):
+    with open(path, "r") as f:
+        positions = json.load(f)["positions"][:limit]
+    template = PROMPT_FORMATS[model_type]
+    encoder = PromptTokenizer(tokenizer)
+    prompts = [encoder.encode(template.format(fen=p["fen"])) for p in positions]
+    return prompts, [p["correct_move"] for p in positions]
+
+
+def direct_texts(model_path, tokenizer, prompts, max_length, max_new_tokens):
+    """Texts decoded in-process by IOBindingDecoder on the original model (reference for --verify)."""
+    from iobinding_decoder import IOBindingDecoder
+
+    decoder = IOBindingDecoder(model_path, max_length=max_length)
+    best_move_done = best_move_stop(tokenizer)
+    return [tokenizer.decode(decoder.generate([prompt], max_new_tokens, stop=best_move_done,
+                                              eos_token_id=tokenizer.eos_token_id)[0])
+            for prompt in prompts]
+
+
+def parse_configs(spec):
+    """'1x8,2x4' -> [(1, 8), (2, 4)] (workers x intra-op threads)."""
+    configs = []
+    for item in spec.split(","):
+        workers, threads = item.lower().split("x")
+        configs.append((int(workers), int(threads)))
+    return configs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process pool of pinned ORT sessions for LM evaluation")
+    parser.add_argument("--model", default="./assets/model_rookworld.onnx")
+    parser.add_argument("--tokenizer", default="./assets/")
+    parser.add_argument("--model-type", choices=sorted(PROMPT_FORMATS), default="rookworld")
+    parser.add_argument("--benchmark", default="../rook-clf-demo/benchmarks/lichess_puzzles.json")
+    parser.add_argument("--limit", type=int, default=64, help="Positions to evaluate")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--threads", type=int, default=1, help="intra_op_num_threads per worker")
+    parser.add_argument("--inter-op-threads", type=int, default=1)
+    parser.add_argument("--scaling", default=None, help="Comma-separated WORKERSxTHREADS configs, e.g. 1x8,2x4,8x1")
+    parser.add_argument("--batch-size", type=int, default=1, help="Prompts per dispatched batch")
+    parser.add_argument("--max-new-tokens", type=int, default=100)
+    parser.add_argument("--pin", action="store_true", help="Pin each worker to its own cores")
+    parser.add_argument("--no-share-weights", action="store_true", help="Load the monolithic model in every worker")
+    parser.add_argument("--verify", type=int, default=0, metavar="N",
+                        help="Compare the first N pool outputs with in-process decoding of the original model")
+    parser.add_argument("--output", default=None, help="Write scaling results as JSON")
+    args = parser.parse_args()
+
+    from transformers import AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+    prompts, correct = load_benchmark_prompts(args.benchmark, tokenizer, args.model_type, args.limit)
+    max_length = max(map(len, prompts)) + args.max_new_tokens + 1
+    configs = parse_configs(args.scaling) if args.scaling else [(args.workers, args.threads)]
+    print(f"🔧 {len(prompts)} positions from {args.benchmark}, {os.cpu_count()} CPUs")
+
+    reference = direct_texts(args.model, tokenizer, prompts[:args.verify], max_length,
+                             args.max_new_tokens) if args.verify else []
+    rows = []
+    mismatched = False
+    for workers, threads in configs:
+        with SessionPool(args.model, args.tokenizer, workers=workers, intra_op_threads=threads,
+                         inter_op_threads=args.inter_op_threads, pin=args.pin,
+                         share_weights=not args.no_share_weights, batch_size=args.batch_size,
+                         max_length=max_length, max_new_tokens=args.max_new_tokens) as pool:
+            texts, stats = pool.map(prompts)
+        moves = [parse_best_move(text) for text in texts]
+        accuracy = float(np.mean([m == c for m, c in zip(moves, correct)]))
+        row = {
+            "workers": workers,
+            "intra_op_threads": threads,
+            "inter_op_threads": args.inter_op_threads,
+            "positions_per_second": stats["positions"] / stats["seconds"],
+            "tokens_per_second": stats["tokens"] / stats["seconds"],
+            "seconds": stats["seconds"],
+            "max_load_seconds": max(pool.load_times),
+            "accuracy": accuracy,
+            "per_worker": stats["per_worker"],
+        }
+        rows.append(row)
+        print(f"  {workers:>3} workers x {threads:>2} threads: {row['positions_per_second']:7.2f} positions/s, "
+              f"{row['tokens_per_second']:8.1f} tokens/s, accuracy {accuracy:.3f} "
+              f"(load {row['max_load_seconds']:.1f}s)")
+        mismatches = [i for i, text in enumerate(reference) if texts[i] != text]
+        if reference:
+            print(f"     verify: {len(reference) - len(mismatches)}/{len(reference)} identical to direct decoding")
+        for i in mismatches[:3]:
+            print(f"     ❌ prompt {i}: pool {texts[i]!r} != direct {reference[i]!r}")
+        mismatched |= bool(mismatches)
+
+    if len(rows) > 1:
+        base = rows[0]["positions_per_second"]
+        print("📈 Speedup vs first config: " + ", ".join(
+            f"{r['workers']}x{r['intra_op_threads']}: {r['positions_per_second'] / base:.2f}x" for r in rows))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"model": args.model, "benchmark": args.benchmark, "cpus": os.cpu_count(),
+                       "pin": args.pin, "results": rows}, f, indent=2)
+        print(f"✅ Wrote {args.output}")
+    if mismatched:
+        raise SystemExit("❌ Pool outputs differ from direct decoding")
+
+
+if __name__ == "__main__":
+    main()